@@ -0,0 +1,537 @@
+"""
+The API the frontend talks to. It logs people in, lists the tabs, and keeps track of
+downloads, which are all quick. Anything slow (downloading activities, or working out
+the data for a tab) is done by the worker (see backend.worker), which is deployed as a
+separate lambda, so that starting this one up doesn't have to load any of that.
+
+Locally, run it together with the worker with `fastapi run backend/main.py`, or by
+itself with `fastapi run backend/api.py`.
+"""
+
+import dataclasses
+import datetime as dt
+import json
+import logging
+import os
+import secrets
+from typing import Any, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from mangum import Mangum
+from requests.exceptions import HTTPError
+from stravalib.client import Client
+from stravalib.exc import RateLimitExceeded
+from stravalib.model import DetailedAthlete
+
+from backend.gui.gui import tab_tree
+from backend.tabs.tab_group import TabGroup
+from backend.tabs.tabs import Tab
+from backend.utils.download_lease import try_acquire_download_lease
+from backend.utils.download_progress import stream_download_progress
+from backend.utils.download_scheduler import (
+    DownloadScheduler,
+    SyncJob,
+    SyncPriority,
+    estimate_requests_for_download,
+)
+from backend.utils.dynamodb import (
+    DownloadStatusItem,
+    add_pending_webhook_event_to_dynamo,
+    delete_download_status_from_dynamo,
+    get_download_status_item_from_dynamo,
+    release_webhook_flush_in_dynamo,
+    save_download_status_to_dynamo,
+    save_user_data_to_dynamo,
+)
+from backend.utils.environment_variables import evm
+from backend.utils.jobs import (
+    ApplyWebhookEventsJob,
+    DownloadJob,
+)
+from backend.utils.resources import (
+    add_cors_middleware,
+    download_status_table,
+    get_frontend_base_url,
+    get_strava_rate_limiter,
+    get_strava_session,
+    is_dev,
+    job_dispatcher,
+    s3_client,
+    shared_strava_quota,
+    strava_quota,
+    sync_job_queue,
+    user_table,
+)
+from backend.utils.routes import unauthorized_if_no_session_token
+from backend.utils.s3 import (
+    delete_athlete_data,
+    is_there_any_data_for_athlete,
+)
+from backend.utils.sessions import (
+    SESSION_DURATION,
+    Session,
+    create_session_token,
+    get_session,
+)
+from backend.utils.webhooks import (
+    StravaWebhookEvent,
+)
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(debug=not evm.is_production())
+add_cors_middleware(app)
+
+# All athletes share the app's Strava quota, so downloads are queued and started only
+# when there's enough quota left for them.
+download_scheduler = DownloadScheduler(
+    sync_job_queue, strava_quota, shared_strava_quota
+)
+
+# Logging someone in takes a request to swap the code for a token, and another to get
+# the athlete.
+AUTHENTICATION_REQUESTS = 2
+
+
+@app.get("/api/example_chart_data")
+async def chart_data(request: Request) -> JSONResponse:
+    current_file_dir_path = os.path.dirname(os.path.realpath(__file__))
+    example_chart_data_path = os.path.join(
+        current_file_dir_path, "static", "example_charts", "polyline_animation.json"
+    )
+    # Read the example file
+    with open(example_chart_data_path, "r") as f:
+        json_data = f.read()
+
+    return json.loads(json_data)
+
+
+@app.get("/api/authenticate")
+async def authenticate(request: Request) -> Any:
+    # Retrieve query parameters
+    code: str = request.query_params["code"]
+    scope: str = request.query_params["scope"]
+
+    # Do some terrible scope checking.
+    # If we aren't given permission to read activities, just return to index.
+    if scope != "read,activity:read":
+        return RedirectResponse("/?scope_incorrect=true")
+
+    # If the whole app is out of quota, there's no point trying.
+    now = dt.datetime.now(dt.timezone.utc)
+    if shared_strava_quota.get_remaining(now) < AUTHENTICATION_REQUESTS:
+        return RedirectResponse("/?rate_limit_exceeded=true")
+
+    # Try the following. It can fail in a couple different ways, all due to
+    # hitting the Strava rate limit.
+    try:
+        client = Client(
+            rate_limiter=get_strava_rate_limiter(),
+            requests_session=get_strava_session(),
+        )
+        token_response = client.exchange_code_for_token(
+            client_id=evm.get_strava_client_id(),
+            client_secret=evm.get_strava_client_secret(),
+            code=code,
+        )
+        # Get the access token and immediately use that to get the athlete id.
+        client.access_token = token_response["access_token"]
+        athlete: DetailedAthlete = client.get_athlete()
+
+        # Create a unique session id.
+        session_id = secrets.token_urlsafe(32)
+
+        # Save all these important secrets to dynamodb
+        save_user_data_to_dynamo(user_table, session_id, athlete.id, token_response)
+
+        # If we can, sign the athlete's id into their cookie so we don't need to look
+        # it up on every request.
+        session_token = create_session_token(
+            session_id, athlete.id, evm.get_session_signing_secret(), now
+        )
+
+        # Redirect to home while setting cookies.
+        redirect_url = f"{get_frontend_base_url()}/home" if is_dev else "/home"
+        response = RedirectResponse(url=redirect_url)
+        response.set_cookie(
+            key="session_token",
+            value=session_token,
+            max_age=int(SESSION_DURATION.total_seconds()),
+            httponly=True,
+            secure=True,  # Ensure HTTPS is used in production.
+        )
+    except (HTTPError, RateLimitExceeded) as _:
+        return RedirectResponse("/?rate_limit_exceeded=true")
+
+    response.set_cookie(
+        key="logged_in",
+        value="true",
+        max_age=int(SESSION_DURATION.total_seconds()),
+        secure=True,  # Ensure HTTPS is used in production.
+    )
+    return response
+
+
+@dataclasses.dataclass
+class SideMenuTabs:
+    name: str
+    key: str
+    type: str
+    items: list[Any]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "key": self.key,
+            "type": self.type,
+            "items": self.items,
+        }
+
+
+@app.get("/api/tabs", dependencies=[Depends(unauthorized_if_no_session_token)])
+async def get_tabs(request: Request) -> list[Any]:
+    def expand_tabs(tabs: list[Tab | TabGroup]) -> list[Any]:
+        json_tabs = []
+        for tab in tabs:
+            if isinstance(tab, TabGroup):
+                json_tabs.append(tab_to_dict(tab, items=expand_tabs(tab.children)))
+            else:
+                json_tabs.append(tab_to_dict(tab, items=[]))
+        return json_tabs
+
+    def tab_to_dict(tab: Tab | TabGroup, items: list[Any] = []) -> dict[str, Any]:
+        return SideMenuTabs(
+            name=tab.name, key=tab.get_key(), type=tab.get_type(), items=items
+        ).to_dict()
+
+    return expand_tabs(tab_tree)
+
+
+# The data status connection is a websocket
+@app.get("/api/data_status", dependencies=[Depends(unauthorized_if_no_session_token)])
+async def data_status(request: Request) -> JSONResponse:
+    session = get_request_session(request)
+    session_token, athlete_id = session.session_id, session.athlete_id
+    download_status_item = get_download_status_item_from_dynamo(
+        download_status_table, athlete_id
+    )
+
+    if not download_status_item:
+        # Their status might have expired while their data is still around, in which
+        # case they can use it while we get them a fresh copy.
+        return start_download(
+            athlete_id,
+            session_token,
+            SyncPriority.INTERACTIVE,
+            None,
+            "Starting data download...",
+            refreshing=is_there_any_data_for_athlete(s3_client, athlete_id),
+        )
+
+    if download_status_item.error:
+        if download_status_item.rate_limited:
+            strava_quota.mark_exhausted(download_status_item.last_download_time)
+        return start_download(
+            athlete_id,
+            session_token,
+            SyncPriority.INTERACTIVE,
+            download_status_item.estimated_total_activities,
+            "Attempting to redownload data after an error.",
+            resume=download_status_item.has_checkpoint(),
+            refreshing=download_status_item.refreshing,
+        )
+
+    # If we last downloaded over a week ago, download their data again in the
+    # background. They can keep using their old data until the new data is ready.
+    threshold = download_status_item.last_download_time + dt.timedelta(weeks=1)
+    if download_status_item.complete and dt.datetime.now(dt.timezone.utc) > threshold:
+        return start_download(
+            athlete_id,
+            session_token,
+            SyncPriority.BACKGROUND,
+            download_status_item.estimated_total_activities,
+            "Welcome back, refreshing your data.",
+            refreshing=True,
+        )
+
+    if download_status_item.complete:
+        return {"message": "Data downloaded.", "downloaded": True}
+
+    # Downloads waiting in the queue only start when someone checks on them.
+    dispatch_queued_downloads()
+    queued_message = get_queued_download_message(athlete_id)
+    if queued_message is not None:
+        return with_refreshing(queued_message, download_status_item.refreshing)
+
+    # If a download's lease has run out, the lambda running it was probably killed, so
+    # pick it back up from where it got to.
+    if download_status_item.is_lease_expired(dt.datetime.now(dt.timezone.utc)):
+        return start_download(
+            athlete_id,
+            session_token,
+            SyncPriority.INTERACTIVE,
+            download_status_item.estimated_total_activities,
+            "Resuming your download.",
+            resume=download_status_item.has_checkpoint(),
+            refreshing=download_status_item.refreshing,
+        )
+
+    return with_refreshing(
+        {"message": download_status_item.status, "downloaded": False},
+        download_status_item.refreshing,
+    )
+
+
+def get_request_session(request: Request) -> Session:
+    return get_session(
+        user_table,
+        request.cookies["session_token"],
+        evm.get_session_signing_secret(),
+        dt.datetime.now(dt.timezone.utc),
+    )
+
+
+def with_refreshing(message: dict[str, Any], refreshing: bool) -> dict[str, Any]:
+    """
+    While a download is replacing data the athlete already has, they can carry on
+    using the old data, so as far as the frontend is concerned it's downloaded. It's
+    just told that a refresh is happening too.
+    """
+    if not refreshing:
+        return message
+    return {**message, "downloaded": True, "refreshing": True}
+
+
+def start_download(
+    athlete_id: int,
+    session_token: str,
+    priority: SyncPriority,
+    estimated_total_activities: Optional[int],
+    message: str,
+    resume: bool = False,
+    refreshing: bool = False,
+) -> dict[str, Any]:
+    """
+    Takes the lease on the athlete's download, and schedules it. If someone else got
+    the lease first, their download is already on its way, so we just report on it.
+
+    Nothing is deleted first. Downloads only replace the athlete's data once they've
+    finished, so if they already have data (refreshing is True), they can keep using
+    it until then.
+    """
+    lease_owner = try_acquire_download_lease(
+        download_status_table,
+        athlete_id,
+        dt.datetime.now(dt.timezone.utc),
+        message,
+        refreshing=refreshing,
+    )
+    if lease_owner is None:
+        return get_download_in_progress_message(athlete_id)
+
+    return with_refreshing(
+        schedule_download(
+            athlete_id,
+            session_token,
+            priority,
+            estimated_total_activities,
+            message,
+            resume=resume,
+            lease_owner=lease_owner,
+            refreshing=refreshing,
+        ),
+        refreshing,
+    )
+
+
+def get_download_in_progress_message(athlete_id: int) -> dict[str, Any]:
+    download_status_item = get_download_status_item_from_dynamo(
+        download_status_table, athlete_id
+    )
+    refreshing = download_status_item is not None and download_status_item.refreshing
+
+    queued_message = get_queued_download_message(athlete_id)
+    if queued_message is not None:
+        return with_refreshing(queued_message, refreshing)
+
+    if download_status_item is None:
+        return {"message": "Starting data download...", "downloaded": False}
+    return with_refreshing(
+        {"message": download_status_item.status, "downloaded": False}, refreshing
+    )
+
+
+def schedule_download(
+    athlete_id: int,
+    session_token: str,
+    priority: SyncPriority,
+    estimated_total_activities: Optional[int],
+    message: str,
+    resume: bool = False,
+    lease_owner: Optional[str] = None,
+    refreshing: bool = False,
+) -> dict[str, Any]:
+    """
+    Queues a download for the athlete, and starts it straight away if there's enough
+    Strava quota. Otherwise they're told roughly when it will start.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    download_scheduler.submit(
+        SyncJob(
+            athlete_id=athlete_id,
+            session_token=session_token,
+            priority=priority,
+            enqueued_at=now,
+            estimated_requests=estimate_requests_for_download(
+                estimated_total_activities
+            ),
+            resume=resume,
+            lease_owner=lease_owner,
+        )
+    )
+    dispatch_queued_downloads()
+
+    queued_message = get_queued_download_message(athlete_id)
+    if queued_message is None:
+        return {"message": message, "downloaded": False}
+
+    save_download_status_to_dynamo(
+        download_status_table,
+        athlete_id,
+        now,
+        queued_message["message"],
+        error=False,
+        complete=False,
+        estimated_total_activities=estimated_total_activities,
+        refreshing=refreshing,
+    )
+    return queued_message
+
+
+def dispatch_queued_downloads() -> None:
+    if len(download_scheduler.queue) == 0:
+        return
+
+    now = dt.datetime.now(dt.timezone.utc)
+    # Other containers have probably been spending quota too since we last looked.
+    strava_quota.refresh_usage(shared_strava_quota.get_usage, now)
+    download_scheduler.dispatch_ready_jobs(
+        lambda sync_job: job_dispatcher.dispatch(
+            DownloadJob(
+                athlete_id=sync_job.athlete_id,
+                session_token=sync_job.session_token,
+                resume=sync_job.resume,
+                lease_owner=sync_job.lease_owner,
+                reserved_requests=sync_job.reserved_requests,
+            )
+        ),
+        now,
+    )
+
+
+def get_queued_download_message(athlete_id: int) -> Optional[dict[str, Any]]:
+    """
+    If the athlete's download is waiting in the queue, returns a message saying
+    roughly when it will start. Otherwise returns None.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    estimated_start_time = download_scheduler.get_estimated_start_time(athlete_id, now)
+    if estimated_start_time is None:
+        return None
+
+    return {
+        "message": (
+            "Lots of people are downloading their data right now. Your download "
+            f"should start at around {estimated_start_time:%H:%M} UTC, but that's "
+            "only a rough guess, and it could be sooner or later."
+        ),
+        "downloaded": False,
+        "estimated_start_time": estimated_start_time.isoformat(),
+    }
+
+
+@app.get(
+    "/api/data_status_stream",
+    dependencies=[Depends(unauthorized_if_no_session_token)],
+)
+async def data_status_stream(request: Request) -> StreamingResponse:
+    """
+    A push based alternative to polling /api/data_status. The session is resolved
+    once, and then download progress is streamed as server-sent events until the
+    download completes. This doesn't start downloads, so the frontend should still
+    hit /api/data_status once first.
+
+    It's only served locally, because API Gateway can't stream responses (see
+    backend.utils.download_progress).
+    """
+    if evm.is_production():
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    athlete_id = get_request_session(request).athlete_id
+
+    def get_download_status_item() -> Optional[DownloadStatusItem]:
+        # Downloads waiting in the queue only start when someone checks on them.
+        dispatch_queued_downloads()
+        return get_download_status_item_from_dynamo(download_status_table, athlete_id)
+
+    return StreamingResponse(
+        stream_download_progress(get_download_status_item),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/api/strava_webhook")
+async def validate_strava_webhook(request: Request) -> JSONResponse:
+    """
+    When subscribing to webhooks, Strava checks that we own this endpoint by sending
+    it the verify token we gave them, and expects the challenge echoed back.
+    """
+    verify_token = evm.get_strava_webhook_verify_token()
+    if (
+        verify_token is None
+        or request.query_params.get("hub.mode") != "subscribe"
+        or request.query_params.get("hub.verify_token") != verify_token
+    ):
+        return JSONResponse({"message": "Forbidden"}, status_code=403)
+    return JSONResponse({"hub.challenge": request.query_params.get("hub.challenge")})
+
+
+@app.post("/api/strava_webhook")
+async def strava_webhook(event: StravaWebhookEvent) -> None:
+    """
+    Strava needs to hear back from us within 2 seconds, so all we do here is save the
+    event, and start a job to apply it if there isn't one coming already.
+    """
+    if not event.is_from_subscription(evm.get_strava_webhook_subscription_id()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    if event.is_deauthorization():
+        # They don't want us to have their data anymore.
+        delete_athlete_data(s3_client, event.owner_id)
+        delete_download_status_from_dynamo(download_status_table, event.owner_id)
+        return
+
+    if event.object_type != "activity":
+        return
+
+    now = dt.datetime.now(dt.timezone.utc)
+    if add_pending_webhook_event_to_dynamo(
+        download_status_table, event.owner_id, event.model_dump(), now
+    ):
+        try:
+            job_dispatcher.dispatch(ApplyWebhookEventsJob(athlete_id=event.owner_id))
+        except Exception:
+            # Strava sends the event again if we fail, and it can claim the job then.
+            release_webhook_flush_in_dynamo(download_status_table, event.owner_id, now)
+            raise
+
+
+@app.get("/api/test_2")
+async def test_2(request: Request) -> None:
+    raise Exception("This is for testing sentry later ;)")
+
+
+# The API lambda's entry point.
+handler = Mangum(app)
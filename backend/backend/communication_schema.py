@@ -3,6 +3,7 @@ A file that defines messages sent between the front-end and the backend.
 """
 
 import dataclasses
+from typing import Optional
 
 
 @dataclasses.dataclass
@@ -14,6 +15,10 @@ class DataStatusMessage:
 
     message: str
     downloaded: bool
+    estimated_start_time: Optional[str] = None
+    # True while their data is being downloaded again. They can keep using the data
+    # they already have until it's done.
+    refreshing: bool = False
 
 
 @dataclasses.dataclass
@@ -24,3 +29,18 @@ class RefreshStatusMessage:
 
     message: str
     refresh_accepted: bool
+
+
+@dataclasses.dataclass
+class DownloadProgressMessage:
+    """
+    A single event sent down the download progress stream. It's a superset of the
+    DataStatusMessage so the frontend can treat both the same way.
+    """
+
+    message: str
+    downloaded: bool
+    error: bool
+    activities_downloaded: int
+    estimated_total_activities: Optional[int]
+    percent_complete: Optional[int]
@@ -12,7 +12,9 @@ from backend.gui.tabs import (
     min_and_max_distance_activities_tab,
     min_and_max_elevation_activities_tab,
     pace_timeline_tab,
+    percentiles_tab,
     polyline_grid_tab,
+    streaks_tab,
     top_100_longest_rides_tab,
     top_100_longest_runs_tab,
 )
@@ -45,6 +47,8 @@ tab_tree: list[Tab | TabGroup] = [
                     min_and_max_distance_activities_tab,
                     min_and_max_elevation_activities_tab,
                     general_trivia_tab,
+                    streaks_tab,
+                    percentiles_tab,
                     flagged_activities_tab,
                     top_100_longest_runs_tab,
                     top_100_longest_rides_tab,
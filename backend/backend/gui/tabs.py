@@ -1,80 +1,111 @@
-from backend.statistics.images import polyline_grid
-from backend.statistics.plots import (
-    average_heartrate_by_average_speed,
-    cumulative_anything,
-    github_style_activities,
-    histogram_of_activity_time,
-    pace_timeline,
-)
-from backend.statistics.tables import top_hundred
-from backend.statistics.tables.flagged_activities import (
-    flagged_activities_table,
-)
-from backend.statistics.trivia.min_max_summary_trivia import (
-    min_and_max_distance_trivia_processor,
-    min_and_max_elevation_trivia_processor,
-)
-from backend.statistics.trivia.summary_trivia import general_trivia
+"""
+Every tab the app has. Nothing a tab needs to work out its data is imported until the
+tab is first used (see backend.utils.lazy), so that requests which only need the list
+of tabs don't have to wait for plotly and pandas to load.
+"""
+
 from backend.tabs.animated_polyline_grid_tab import AnimatedPolylineGridTab
-from backend.tabs.plot_tabs import PlotTab
+from backend.tabs.plot_tabs import (
+    PlotTab,
+    SharedPlotFunction,
+    SharedPlots,
+    SharedPlotTab,
+)
 from backend.tabs.polyline_grid_tab import PolylineGridTab
-from backend.tabs.table_tab import TableTab
+from backend.tabs.table_tab import TableFunction, TableTab
 from backend.tabs.trivia_tabs import TriviaTab
+from backend.utils.lazy import Lazy, lazy_attribute
+
+
+def get_cumulative_plot_function() -> SharedPlotFunction:
+    from backend.statistics.plots import cumulative_anything
+
+    return cumulative_anything.get_shared_plot_function(
+        {
+            "time": cumulative_anything.CumulativePlot(
+                "moving_time",
+                cumulative_anything.conversion_function_for_timedeltas,
+                "Hours",
+                cumulative_anything.get_title_for_cumulative_time_plot,
+            ),
+            "distance": cumulative_anything.CumulativePlot(
+                "distance",
+                cumulative_anything.conversion_function_for_distance_to_km,
+                "Kilometers",
+                cumulative_anything.get_title_for_cumulative_distance_plot,
+            ),
+            "elevation": cumulative_anything.CumulativePlot(
+                "total_elevation_gain",
+                cumulative_anything.conversion_function_for_distance_to_m,
+                "Meters",
+                cumulative_anything.get_title_for_cumulative_elevation_plot,
+            ),
+            "kudos": cumulative_anything.CumulativePlot(
+                "kudos_count",
+                cumulative_anything.conversion_function_for_int,
+                "Kudos",
+                cumulative_anything.get_title_for_cumulative_kudos_plot,
+            ),
+        }
+    )
+
+
+def get_top_hundred_table_function(activity_type: str) -> Lazy[TableFunction]:
+    def get_table_function() -> TableFunction:
+        from backend.statistics.tables import top_hundred
+
+        return top_hundred.get_top_hundred_table_function(
+            activity_type,
+            "distance",
+            "Distance (km)",
+            top_hundred.distance_conversion_function_to_km,
+        )
+
+    return Lazy(get_table_function)
+
 
-cumulative_time_tab = PlotTab(
+# All the cumulative plots bucket up the activities in exactly the same way, so they
+# share one plot function, but each tab only makes its own plot.
+cumulative_plots = SharedPlots(Lazy(get_cumulative_plot_function))
+
+cumulative_time_tab = SharedPlotTab(
     name="Cumulative Time",
     description=(
         "A cumulative plot of how much time you've logged on Strava for each of your "
         "activity types."
     ),
-    plot_function=cumulative_anything.get_plot_function(
-        "moving_time",
-        cumulative_anything.conversion_function_for_timedeltas,
-        "Hours",
-        cumulative_anything.get_title_for_cumulative_time_plot,
-    ),
+    shared_plots=cumulative_plots,
+    plot_key="time",
     detailed=False,
 )
 
-cumulative_distance_tab = PlotTab(
+cumulative_distance_tab = SharedPlotTab(
     name="Cumulative Distance",
     description=(
         "A cumulative plot of the total distance you've travelled from the activities "
         "that you've logged on Strava."
     ),
-    plot_function=cumulative_anything.get_plot_function(
-        "distance",
-        cumulative_anything.conversion_function_for_distance_to_km,
-        "Kilometers",
-        cumulative_anything.get_title_for_cumulative_distance_plot,
-    ),
+    shared_plots=cumulative_plots,
+    plot_key="distance",
     detailed=False,
 )
 
-cumulative_elevation_tab = PlotTab(
+cumulative_elevation_tab = SharedPlotTab(
     name="Cumulative Elevation",
     description=(
         "A cumulative plot of the total elevation you've climbed from the activities "
         "that you've logged on Strava."
     ),
-    plot_function=cumulative_anything.get_plot_function(
-        "total_elevation_gain",
-        cumulative_anything.conversion_function_for_distance_to_m,
-        "Meters",
-        cumulative_anything.get_title_for_cumulative_elevation_plot,
-    ),
+    shared_plots=cumulative_plots,
+    plot_key="elevation",
     detailed=False,
 )
 
-cumulative_kudos_tab = PlotTab(
+cumulative_kudos_tab = SharedPlotTab(
     name="Cumulative Kudos",
     description="A cumulative plot of the total kudos you've received each year.",
-    plot_function=cumulative_anything.get_plot_function(
-        "kudos_count",
-        cumulative_anything.conversion_function_for_int,
-        "Kudos",
-        cumulative_anything.get_title_for_cumulative_kudos_plot,
-    ),
+    shared_plots=cumulative_plots,
+    plot_key="kudos",
     detailed=False,
 )
 
@@ -85,7 +116,9 @@ calendar_tab = PlotTab(
         "This plot draws inspiration from the GitHub contributions plot to show how "
         "much you're running over a calendar year."
     ),
-    plot_function=github_style_activities.plot,
+    plot_function=lazy_attribute(
+        "backend.statistics.plots.github_style_activities", "plot"
+    ),
     detailed=False,
 )
 
@@ -97,7 +130,9 @@ average_hr_by_average_speed_tab = PlotTab(
         "don't record your heartrate with your activities, then this plot will be "
         "blank."
     ),
-    plot_function=average_heartrate_by_average_speed.plot,
+    plot_function=lazy_attribute(
+        "backend.statistics.plots.average_heartrate_by_average_speed", "plot"
+    ),
     detailed=False,
 )
 
@@ -108,7 +143,7 @@ pace_timeline_tab = PlotTab(
         "30-day moving average line. At any point on this line, the value is the "
         "average pace of all runs 15 days in front and behind it."
     ),
-    plot_function=pace_timeline.plot,
+    plot_function=lazy_attribute("backend.statistics.plots.pace_timeline", "plot"),
     detailed=False,
 )
 
@@ -116,7 +151,9 @@ pace_timeline_tab = PlotTab(
 histogram_of_activity_times_tab = PlotTab(
     name="Histogram of Activity Times",
     description="This is a histogram of all your activity start times.",
-    plot_function=histogram_of_activity_time.plot,
+    plot_function=lazy_attribute(
+        "backend.statistics.plots.histogram_of_activity_time", "plot"
+    ),
     detailed=False,
 )
 
@@ -124,21 +161,56 @@ min_and_max_distance_activities_tab = TriviaTab(
     name="Min and Max Distance Activities",
     detailed=False,
     description="Some Trivia about your longest and shortest Strava activities.",
-    trivia_processor=min_and_max_distance_trivia_processor,
+    trivia_processor=lazy_attribute(
+        "backend.statistics.trivia.min_max_summary_trivia",
+        "min_and_max_distance_trivia_processor",
+    ),
 )
 
 min_and_max_elevation_activities_tab = TriviaTab(
     name="Min and Max Elevation Activities",
     detailed=False,
     description="Some Trivia about your hilliest and flattest Strava activities.",
-    trivia_processor=min_and_max_elevation_trivia_processor,
+    trivia_processor=lazy_attribute(
+        "backend.statistics.trivia.min_max_summary_trivia",
+        "min_and_max_elevation_trivia_processor",
+    ),
 )
 
 general_trivia_tab = TriviaTab(
     name="General Trivia",
     detailed=False,
     description="Some miscellaneous trivia about your Strava activities.",
-    trivia_processor=general_trivia,
+    trivia_processor=lazy_attribute(
+        "backend.statistics.trivia.summary_trivia", "general_trivia"
+    ),
+)
+
+streaks_tab = TriviaTab(
+    name="Streaks",
+    detailed=False,
+    description=(
+        "Your longest streaks of consecutive days (and weeks) with activities, any "
+        "streaks you've currently got going, and your longest breaks."
+    ),
+    trivia_processor=lazy_attribute(
+        "backend.statistics.trivia.streak_trivia", "streak_trivia"
+    ),
+    # The current streaks depend on what day it is.
+    date_dependent=True,
+)
+
+percentiles_tab = TriviaTab(
+    name="Percentiles",
+    detailed=False,
+    description=(
+        "Your typical pace, heart rate and distance for each type of activity. The "
+        "middle number is the median, and 80% of your activities are somewhere "
+        "between the other two."
+    ),
+    trivia_processor=lazy_attribute(
+        "backend.statistics.trivia.percentile_trivia", "percentile_trivia"
+    ),
 )
 
 flagged_activities_tab = TableTab(
@@ -148,30 +220,22 @@ flagged_activities_tab = TableTab(
         "If any of your activities have been flagged for cheating on Strava, "
         "they will be displayed in a table below."
     ),
-    table_function=flagged_activities_table,
+    table_function=lazy_attribute(
+        "backend.statistics.tables.flagged_activities", "flagged_activities_table"
+    ),
 )
 
 top_100_longest_runs_tab = TableTab(
     name="Top 100 Longest Runs",
     description="Shows the top 100 longest runs you've ever done.",
-    table_function=top_hundred.get_top_hundred_table_function(
-        "Run",
-        "distance",
-        "Distance (km)",
-        top_hundred.distance_conversion_function_to_km,
-    ),
+    table_function=get_top_hundred_table_function("Run"),
     detailed=False,
 )
 
 top_100_longest_rides_tab = TableTab(
     name="Top 100 Longest Rides",
     description="Shows the top 100 longest rides you've ever done.",
-    table_function=top_hundred.get_top_hundred_table_function(
-        "Ride",
-        "distance",
-        "Distance (km)",
-        top_hundred.distance_conversion_function_to_km,
-    ),
+    table_function=get_top_hundred_table_function("Ride"),
     detailed=False,
 )
 
@@ -179,12 +243,16 @@ polyline_grid_tab = PolylineGridTab(
     name="Polyline Grid",
     detailed=False,
     description="A bunch of images of the different maps from your activities.",
-    create_images_function=polyline_grid.create_images,
+    create_images_function=lazy_attribute(
+        "backend.statistics.images.polyline_grid", "create_images"
+    ),
 )
 
 animated_polyline_grid_tab = AnimatedPolylineGridTab(
     name="Animated Polyline Grid",
     detailed=False,
     description="A bunch of gifs of the different maps from your activities.",
-    create_images_function=polyline_grid.create_images,
+    create_images_function=lazy_attribute(
+        "backend.statistics.images.polyline_grid", "create_images"
+    ),
 )
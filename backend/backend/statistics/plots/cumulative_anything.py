@@ -1,8 +1,9 @@
 import dataclasses
 import datetime as dt
 import itertools
-from typing import Any, Callable, Iterator, Optional
+from typing import Any, Callable, Iterator, Optional, Protocol
 
+import numpy as np
 import plotly.graph_objects as go
 from stravalib import unit_helper as uh
 from stravalib.model import ActivityType, DetailedActivity
@@ -10,11 +11,49 @@ from stravalib.model import ActivityType, DetailedActivity
 ALL_ACTIVITIES = "All"
 
 
+# Every year gets 366 days, so leap years fit too.
+DAYS_PER_YEAR = 366
+
+
+@dataclasses.dataclass
+class CumulativePlot:
+    """
+    Everything that's different between the cumulative plots.
+    """
+
+    activity_attribute_name: str
+    conversion_function: Callable[[Any], Any]
+    yaxis_title: str
+    plot_title_creator: Callable[[str], str]
+
+
+class SharedPlotFunction(Protocol):
+    """
+    Works out a few cumulative plots at once (or just the ones with the keys given, if
+    there are any), and returns them by their keys.
+    """
+
+    def __call__(
+        self,
+        activity_iterator: Iterator[DetailedActivity],
+        keys: Optional[list[str]] = None,
+    ) -> dict[str, go.Figure]: ...
+
+
 @dataclasses.dataclass
-class CompactActivity:
-    type: ActivityType
-    start_date_local: dt.datetime
-    activity_attribute: Any
+class ActivityColumns:
+    """
+    The type, year and day of the year (from 0) of every activity, and the converted
+    attribute for each plot, kept as columns so that they can be summed up all at
+    once. Activities without an attribute are left out of that plot, so there's also a
+    column for each plot saying which activities had it.
+    """
+
+    types: list[ActivityType]
+    years: np.ndarray
+    days: np.ndarray
+    values: dict[str, np.ndarray]
+    has_values: dict[str, np.ndarray]
 
 
 def get_plot_function(
@@ -28,79 +67,168 @@ def get_plot_function(
     called with an iterator of activities, returns a plotly figure of a
     cumulative plot about the attribute of interest.
     """
+    plots = {
+        activity_attribute_name: CumulativePlot(
+            activity_attribute_name,
+            conversion_function,
+            yaxis_title,
+            plot_title_creator,
+        )
+    }
+    plot_all = get_shared_plot_function(plots)
 
     def plot(activity_iterator: Iterator[DetailedActivity]) -> go.Figure:
-        compact_activities: list[CompactActivity] = get_compact_activities(
-            activity_attribute_name, activity_iterator, conversion_function
-        )
+        return plot_all(activity_iterator)[activity_attribute_name]
+
+    return plot
+
 
-        # Get set of all the different types of activities this person has logged.
-        activity_types = {activity.type for activity in compact_activities}
+def get_shared_plot_function(
+    plots: dict[str, CumulativePlot],
+) -> SharedPlotFunction:
+    """
+    Like get_plot_function, but for a few cumulative plots at once, which share a
+    single pass through the activities. Returns each plot's figure by its key. If only
+    some of the plots are needed, their keys should be given. Converting the values
+    and making the figure is most of the work, so nothing is done for the others.
+    """
 
-        all_plots: dict[ActivityType, dict[int, go.Scatter]] = {}
+    def plot(
+        activity_iterator: Iterator[DetailedActivity], keys: Optional[list[str]] = None
+    ) -> dict[str, go.Figure]:
+        wanted_plots = plots if keys is None else {key: plots[key] for key in keys}
+        columns = get_activity_columns(wanted_plots, activity_iterator)
+        return {
+            key: get_figure(get_cumulative_data(columns, key), cumulative_plot)
+            for key, cumulative_plot in wanted_plots.items()
+        }
 
-        # Make plots for all activities
-        all_plots[ALL_ACTIVITIES] = plot_graph(compact_activities, yaxis_title)
+    return plot
 
-        # Make plots for specific activities
-        for activity_type in activity_types:
-            all_plots[activity_type] = plot_graph(
-                list(
-                    filter(
-                        lambda activity: activity.type == activity_type,
-                        compact_activities,
-                    )
-                ),
-                yaxis_title,
-            )
 
-        data = get_figure_data_from_all_activity_data(all_plots)
-        layout = get_layout_from_all_activity_data(
-            all_plots,
-            yaxis_title=yaxis_title,
-            plot_title_creator=plot_title_creator,
-        )
+def get_figure(
+    cumulative_data: dict[ActivityType, dict[int, np.ndarray]],
+    cumulative_plot: CumulativePlot,
+) -> go.Figure:
+    all_plots: dict[ActivityType, dict[int, go.Scatter]] = {
+        activity_type: plot_graph(years, cumulative_plot.yaxis_title)
+        for activity_type, years in cumulative_data.items()
+    }
 
-        fig = go.Figure(data=data, layout=layout)
-        return fig
+    data = get_figure_data_from_all_activity_data(all_plots)
+    layout = get_layout_from_all_activity_data(
+        all_plots,
+        yaxis_title=cumulative_plot.yaxis_title,
+        plot_title_creator=cumulative_plot.plot_title_creator,
+    )
 
-    return plot
+    fig = go.Figure(data=data, layout=layout)
+    return fig
 
 
-def get_compact_activities(
-    activity_attribute_name: str,
+def get_activity_columns(
+    plots: dict[str, CumulativePlot],
     activity_iterator: Iterator[DetailedActivity],
-    conversion_function: Callable[[Any], Any],
-) -> list[CompactActivity]:
-    return [
-        CompactActivity(
-            type=activity.type.root,
-            start_date_local=activity.start_date_local,
-            activity_attribute=conversion_function(
-                getattr(activity, activity_attribute_name)
-            ),
+) -> ActivityColumns:
+    types: list[ActivityType] = []
+    years: list[int] = []
+    days: list[int] = []
+    values: dict[str, list[float]] = {key: [] for key in plots}
+    has_values: dict[str, list[bool]] = {key: [] for key in plots}
+    for activity in activity_iterator:
+        date = activity.start_date_local
+        if date is None:
+            continue
+        types.append(activity.type.root)
+        years.append(date.year)
+        days.append(date.timetuple().tm_yday - 1)
+
+        for key, cumulative_plot in plots.items():
+            value = getattr(activity, cumulative_plot.activity_attribute_name)
+            has_values[key].append(value is not None)
+            if value is None:
+                values[key].append(0.0)
+            else:
+                # Some of the conversion functions return pint quantities, but it's
+                # only the number that ends up on the plot.
+                value = cumulative_plot.conversion_function(value)
+                values[key].append(float(getattr(value, "magnitude", value)))
+
+    return ActivityColumns(
+        types=types,
+        years=np.array(years, dtype=np.int64),
+        days=np.array(days, dtype=np.int64),
+        values={key: np.array(v, dtype=np.float64) for key, v in values.items()},
+        has_values={key: np.array(h, dtype=bool) for key, h in has_values.items()},
+    )
+
+
+def get_cumulative_data(
+    columns: ActivityColumns, key: str
+) -> dict[ActivityType, dict[int, np.ndarray]]:
+    """
+    The cumulative total of one plot's attribute for each day of every year, for all
+    activities and for each type of activity. Only the years with activities of that
+    type are included.
+    """
+    has_values = columns.has_values[key]
+    types = list(itertools.compress(columns.types, has_values))
+    years = columns.years[has_values]
+    days = columns.days[has_values]
+    values = columns.values[key][has_values]
+
+    # All activities, grouped by year...
+    unique_years, year_ids = np.unique(years, return_inverse=True)
+    cumulative_data: dict[ActivityType, dict[int, np.ndarray]] = {
+        ALL_ACTIVITIES: dict(
+            zip(
+                unique_years.tolist(),
+                get_cumulative_sums(year_ids, len(unique_years), days, values),
+            )
         )
-        for activity in activity_iterator
-        if activity.start_date_local is not None
-        and getattr(activity, activity_attribute_name) is not None
-    ]
+    }
+
+    # ...and then every activity type, grouped by type and year, in one go.
+    activity_types = list(set(types))
+    type_index = {activity_type: i for i, activity_type in enumerate(activity_types)}
+    type_ids = np.array(
+        [type_index[activity_type] for activity_type in types], dtype=np.int64
+    )
+    unique_groups, group_ids = np.unique(
+        type_ids * len(unique_years) + year_ids, return_inverse=True
+    )
+    cumulative_sums = get_cumulative_sums(group_ids, len(unique_groups), days, values)
+    for activity_type in activity_types:
+        cumulative_data[activity_type] = {}
+    for group, sums in zip(unique_groups.tolist(), cumulative_sums):
+        activity_type = activity_types[group // len(unique_years)]
+        year = int(unique_years[group % len(unique_years)])
+        cumulative_data[activity_type][year] = sums
+
+    return cumulative_data
+
+
+def get_cumulative_sums(
+    group_ids: np.ndarray, number_of_groups: int, days: np.ndarray, values: np.ndarray
+) -> np.ndarray:
+    """
+    Adds up the values for each day of each group, and then turns them into running
+    totals. Returns one row for each group, with a column for each day.
+    """
+    daily_sums = np.bincount(
+        group_ids * DAYS_PER_YEAR + days,
+        weights=values,
+        minlength=number_of_groups * DAYS_PER_YEAR,
+    ).reshape(number_of_groups, DAYS_PER_YEAR)
+    return np.cumsum(daily_sums, axis=1)
 
 
 def plot_graph(
-    activities: list[CompactActivity], yaxis_title: str
+    cumulative_data: dict[int, np.ndarray], yaxis_title: str
 ) -> dict[int, go.Scatter]:
-    graph_data: dict[int, list[float]] = {}
-    for activity in activities:
-        activity_datetime = activity.start_date_local
-        year = activity_datetime.year
-        year_data = graph_data.get(year, [0.0] * 366)
-        year_data[activity_datetime.timetuple().tm_yday - 1] += (
-            activity.activity_attribute
-        )
-        graph_data[year] = year_data
-
-    for year, year_data in graph_data.items():
-        graph_data[year] = list(itertools.accumulate(year_data))
+    graph_data: dict[int, list[float]] = {
+        year: year_data.tolist() for year, year_data in cumulative_data.items()
+    }
 
     # Remove additional zeros from end of data if year is the current year
     current_year = dt.datetime.now().year
@@ -1,2 +1,5 @@
+from .aggregations import AggregateTidbit as AggregateTidbit
+from .timing import TriviaTimings as TriviaTimings
 from .trivia import TriviaProcessor as TriviaProcessor
 from .trivia import TriviaTidbitBase as TriviaTidbitBase
+from .trivia import get_data_for_processors as get_data_for_processors
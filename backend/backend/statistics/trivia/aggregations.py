@@ -0,0 +1,215 @@
+"""
+Lots of tidbits are just "the activity with the most/least of something" or "the total
+of something", often once for every activity type. Written as normal tidbits, every one
+of them gets called with every activity, mostly just to find out it's the wrong type.
+
+Instead, those tidbits say what they want to work out, and the TriviaProcessor collects
+the attributes they need into columns as it goes through the activities, and works out
+every one of them at once with a pandas group by.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Literal, Optional
+
+import pandas as pd
+from stravalib.model import DetailedActivity
+
+from backend.statistics.utils.strava_links import get_activity_url, get_link
+from backend.tabs.table_tab import LinkCell
+
+Aggregation = Literal["min", "max", "sum"]
+
+
+class AggregateTidbit(ABC):
+    """
+    A tidbit that's the min, max or sum of one of the activities' attributes, either
+    for all activities or just one type of activity. Mins and maxes link to the
+    activity they came from.
+    """
+
+    def __init__(
+        self,
+        aggregation: Aggregation,
+        attribute_name: str,
+        activity_type: Optional[str] = None,
+        ignore_if_all_zero: bool = False,
+    ) -> None:
+        self.aggregation = aggregation
+        self.attribute_name = attribute_name
+        self.activity_type = activity_type
+        # Some activity types (like workouts) never have a distance, so there's no
+        # point showing the shortest one.
+        self.ignore_if_all_zero = ignore_if_all_zero
+
+    @abstractmethod
+    def get_description(self) -> str:
+        pass
+
+    @abstractmethod
+    def format_value(self, value: Any) -> str:
+        """
+        Turns the aggregated value into the tidbit, like "4.3km".
+        """
+        pass
+
+    def get_tidbit_url(self, activity_id: Optional[int]) -> Optional[LinkCell]:
+        if activity_id is None:
+            return None
+        return get_link(get_activity_url(activity_id))
+
+    def get_tidbit_from_result(self, result: "AggregateResult") -> Optional[str]:
+        if result.value is None:
+            return None
+        if self.ignore_if_all_zero and not result.nonzero:
+            return None
+        return self.format_value(result.value)
+
+    def merge_results(
+        self, result: "AggregateResult", later_result: "AggregateResult"
+    ) -> "AggregateResult":
+        """
+        Combines the results from two lots of activities, where the second lot came
+        after the first. Just like going through them in order, ties go to the first.
+        """
+        nonzero = result.nonzero or later_result.nonzero
+        if self.aggregation == "sum":
+            return AggregateResult(
+                (result.value or 0) + (later_result.value or 0), nonzero=nonzero
+            )
+
+        if later_result.value is None:
+            best = result
+        elif result.value is None:
+            best = later_result
+        elif self.aggregation == "min":
+            best = later_result if later_result.value < result.value else result
+        else:
+            best = later_result if later_result.value > result.value else result
+        return AggregateResult(best.value, best.activity_id, nonzero)
+
+
+class AggregateResult:
+    def __init__(
+        self,
+        value: Any,
+        activity_id: Optional[int] = None,
+        nonzero: bool = False,
+    ) -> None:
+        self.value = value
+        self.activity_id = activity_id
+        # Whether any of the values that went into this weren't zero.
+        self.nonzero = nonzero
+
+    def to_state(self) -> dict[str, Any]:
+        return {
+            "value": None if self.value is None else float(self.value),
+            "activity_id": self.activity_id,
+            "nonzero": self.nonzero,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> "AggregateResult":
+        return cls(state["value"], state["activity_id"], state["nonzero"])
+
+
+class ActivityColumns:
+    """
+    The attributes the aggregate tidbits need from each activity, kept as columns.
+    """
+
+    def __init__(self, attribute_names: set[str]) -> None:
+        self.ids: list[int] = []
+        self.types: list[str] = []
+        # The values exactly as they were on the activities, so the tidbits come out
+        # the same as if they'd looked at the activities themselves.
+        self.values: dict[str, list[Any]] = {name: [] for name in attribute_names}
+
+    def add_activity(self, activity: DetailedActivity) -> None:
+        self.ids.append(activity.id)
+        self.types.append(activity.type.root)
+        for name, values in self.values.items():
+            values.append(getattr(activity, name))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "type": pd.Series(self.types, dtype=object),
+                **{
+                    name: pd.Series(
+                        [
+                            math.nan if value is None else float(value)
+                            for value in values
+                        ],
+                        dtype=float,
+                    )
+                    for name, values in self.values.items()
+                },
+            }
+        )
+
+
+def get_aggregate_results(
+    tidbits: list[AggregateTidbit], columns: ActivityColumns
+) -> list[AggregateResult]:
+    """
+    Works out every aggregate tidbit, in the same order as they're given. Each
+    attribute and aggregation is only worked out once, for every activity type at the
+    same time, no matter how many tidbits want it.
+    """
+    frame = columns.to_dataframe()
+    aggregates: dict[tuple[str, Aggregation], dict[Optional[str], Any]] = {}
+    nonzero: dict[str, dict[Optional[str], bool]] = {}
+
+    for attribute_name, aggregation in {
+        (tidbit.attribute_name, tidbit.aggregation) for tidbit in tidbits
+    }:
+        # Activities without the attribute at all are left out, rather than counting
+        # as zero.
+        valid = frame[frame[attribute_name].notna()]
+        values = valid[attribute_name]
+        by_type = values.groupby(valid["type"], sort=False)
+
+        if aggregation == "sum":
+            totals: dict[Optional[str], Any] = by_type.sum().to_dict()
+            totals[None] = values.sum()
+            aggregates[(attribute_name, aggregation)] = totals
+        else:
+            # The index of the first activity with the min or max, just like looking
+            # through them in order and only keeping strictly smaller or larger ones.
+            positions: dict[Optional[str], Any] = (
+                by_type.idxmin() if aggregation == "min" else by_type.idxmax()
+            ).to_dict()
+            if not values.empty:
+                positions[None] = (
+                    values.idxmin() if aggregation == "min" else values.idxmax()
+                )
+            aggregates[(attribute_name, aggregation)] = positions
+
+        if attribute_name not in nonzero:
+            is_nonzero = values != 0
+            nonzero[attribute_name] = is_nonzero.groupby(
+                valid["type"], sort=False
+            ).any().to_dict() | {None: bool(is_nonzero.any())}
+
+    results: list[AggregateResult] = []
+    for tidbit in tidbits:
+        aggregate = aggregates[(tidbit.attribute_name, tidbit.aggregation)]
+        nonzero_for_type = nonzero[tidbit.attribute_name].get(
+            tidbit.activity_type, False
+        )
+        if tidbit.aggregation == "sum":
+            value = aggregate.get(tidbit.activity_type, 0)
+            results.append(AggregateResult(value, nonzero=nonzero_for_type))
+        elif tidbit.activity_type not in aggregate:
+            results.append(AggregateResult(None))
+        else:
+            position = int(aggregate[tidbit.activity_type])
+            results.append(
+                AggregateResult(
+                    columns.values[tidbit.attribute_name][position],
+                    columns.ids[position],
+                    nonzero_for_type,
+                )
+            )
+    return results
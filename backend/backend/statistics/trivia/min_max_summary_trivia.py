@@ -1,131 +1,46 @@
-from typing import Optional
+from typing import Any
 
-import stravalib.unit_helper as uh
-from stravalib.model import ActivityType, DetailedActivity
+from backend.statistics.trivia import AggregateTidbit, TriviaProcessor
 
-from backend.statistics.trivia import TriviaProcessor, TriviaTidbitBase
 
-
-class MinAttributeTidbit(TriviaTidbitBase):
+class MinAttributeTidbit(AggregateTidbit):
     """
     A type of tidbit that can calculate the min of any attribute for any activity type.
     """
 
-    def __init__(self, activity_type: ActivityType, attribute_name: str) -> None:
-        self.all_distances_zero: bool = True
-
-        self.min_activity_id: Optional[int] = None
-        self.attribute_name = attribute_name
-        self.min_attribute_value: Optional[uh._Quantity] = None
-        self.activity_type: Optional[ActivityType] = activity_type
-
-    def reset_tidbit(self) -> None:
-        self.all_distances_zero = True
-        self.min_activity_id = None
-        self.min_attribute_value = None
-
-    def process_activity(self, activity: DetailedActivity) -> None:
-        attr_value = getattr(activity, self.attribute_name)
-
-        # If activity type is not correct, just return.
-        if activity.type.root != self.activity_type:
-            return
-
-        # If the distance is non-zero and non-null, then turn off the "all distances
-        # null" flag.
-        if attr_value is not None:
-            if attr_value != 0.0:
-                self.all_distances_zero = False
-
-        if self.min_attribute_value is None or attr_value < self.min_attribute_value:
-            self.min_attribute_value = attr_value
-            self.min_activity_id = activity.id
+    def __init__(self, activity_type: str, attribute_name: str) -> None:
+        # If all the values have been zero, then chances are this is an activity type
+        # that doesn't use distance like "workout", so there's no tidbit.
+        super().__init__("min", attribute_name, activity_type, ignore_if_all_zero=True)
 
     def get_description(self) -> str:
         attr_name = self.attribute_name.replace("_", " ").title()
         return f"{self.activity_type} with Minimum {attr_name}"
 
-    def get_tidbit(self) -> Optional[str]:
-        # If all the values have been zero, then chances are this is an
-        # activity type that doesn't use distance like "workout". Just return
-        # None in this case.
-        if self.all_distances_zero:
-            return None
+    def format_value(self, value: Any) -> str:
+        # Round the magnitude to nearest meter
+        return f"{int(value)} meters"
 
-        quantity = self.min_attribute_value
-        if quantity is None:
-            return None
-        else:
-            # Round the magnitude to nearest meter
-            return f"{int(quantity)} meters"
 
-    def get_activity_id(self) -> Optional[int]:
-        return self.min_activity_id
-
-
-class MaxAttributeTidbit(TriviaTidbitBase):
+class MaxAttributeTidbit(AggregateTidbit):
     """
-    A type of tidbit that can calculate the min of any attribute for any activity type.
+    A type of tidbit that can calculate the max of any attribute for any activity type.
     """
 
-    def __init__(self, activity_type: ActivityType, attribute_name: str) -> None:
-        self.all_distances_zero: bool = True
-
-        self.max_activity_id: Optional[int] = None
-        self.attribute_name = attribute_name
-        self.max_attribute_value: Optional[uh._Quantity] = None
-        self.activity_type: Optional[ActivityType] = activity_type
-
-    def reset_tidbit(self) -> None:
-        self.all_distances_zero = True
-        self.max_activity_id = None
-        self.max_attribute_value = None
-
-    def process_activity(self, activity: DetailedActivity) -> None:
-        attr_value = getattr(activity, self.attribute_name)
-
-        # If activity type is not the specified type, just return.
-        if activity_type is not None:
-            if activity.type.root != self.activity_type:
-                return
-
-        # If the distance is non-zero and non-null, then turn off the "all distances
-        # null" flag.
-        if attr_value is not None:
-            if attr_value != 0.0:
-                self.all_distances_zero = False
-
-        if self.max_attribute_value is None or attr_value > self.max_attribute_value:
-            self.max_attribute_value = attr_value
-            self.max_activity_id = activity.id
+    def __init__(self, activity_type: str, attribute_name: str) -> None:
+        super().__init__("max", attribute_name, activity_type, ignore_if_all_zero=True)
 
     def get_description(self) -> str:
         attr_name = self.attribute_name.replace("_", " ").title()
         return f"{self.activity_type} with Maximum {attr_name}"
 
-    def get_tidbit(self) -> Optional[str]:
-        # If all the values have been zero, then chances are this is an
-        # activity type that doesn't use distance like "workout". Just return
-        # None in this case.
-        if self.all_distances_zero:
-            return None
-
-        quantity = self.max_attribute_value
-        if quantity is None:
-            return None
-        else:
-            # Round the magnitude to nearest meter
-            return f"{int(quantity)} meters"
-
-    def get_activity_id(self) -> Optional[int]:
-        return self.max_activity_id
+    def format_value(self, value: Any) -> str:
+        # Round the magnitude to nearest meter
+        return f"{int(value)} meters"
 
 
-min_and_max_distance_trivia_processor = TriviaProcessor()
-min_and_max_elevation_trivia_processor = TriviaProcessor()
-general_trivia = TriviaProcessor()
-
-for activity_type in [
+# All the activity types that get their own tidbits.
+ACTIVITY_TYPES = [
     "AlpineSki",
     "BackcountrySki",
     "Canoeing",
@@ -163,7 +78,13 @@ for activity_type in [
     "Windsurf",
     "Workout",
     "Yoga",
-]:
+]
+
+min_and_max_distance_trivia_processor = TriviaProcessor()
+min_and_max_elevation_trivia_processor = TriviaProcessor()
+general_trivia = TriviaProcessor()
+
+for activity_type in ACTIVITY_TYPES:
     min_and_max_distance_trivia_processor.register_tidbit(
         MinAttributeTidbit(activity_type, "distance")
     )
@@ -0,0 +1,139 @@
+from abc import abstractmethod
+from typing import Any, Optional
+
+from stravalib.model import DetailedActivity
+
+from backend.statistics.trivia import TriviaProcessor, TriviaTidbitBase
+from backend.statistics.trivia.min_max_summary_trivia import ACTIVITY_TYPES
+from backend.statistics.utils.average_speed_utils import (
+    average_speed_to_mins_per_km,
+    get_y_axis_settings,
+)
+from backend.statistics.utils.quantiles import QuantileSketch
+
+PERCENTILES = [10, 50, 90]
+
+
+class PercentilesTidbit(TriviaTidbitBase):
+    """
+    The 10th, 50th (the median) and 90th percentiles of something about one type of
+    activity, all in one tidbit, like "4.1 / 7.5 / 12.0 km".
+    """
+
+    def __init__(self, activity_type: str) -> None:
+        self.activity_type = activity_type
+        self.sketch = QuantileSketch()
+
+    @abstractmethod
+    def get_value(self, activity: DetailedActivity) -> Optional[float]:
+        """
+        The value for an activity, or None if it doesn't have one.
+        """
+        pass
+
+    @abstractmethod
+    def format_value(self, value: float) -> str:
+        pass
+
+    @abstractmethod
+    def get_name(self) -> str:
+        pass
+
+    def get_activity_types(self) -> Optional[set[str]]:
+        return {self.activity_type}
+
+    def reset_tidbit(self) -> None:
+        self.sketch = QuantileSketch()
+
+    def process_activity(self, activity: DetailedActivity) -> None:
+        value = self.get_value(activity)
+        if value is not None:
+            self.sketch.add(value)
+
+    def get_state(self) -> dict[str, Any]:
+        return self.sketch.to_state()
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.sketch = QuantileSketch.from_state(state)
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        self.sketch.merge(QuantileSketch.from_state(later_state))
+
+    def get_tidbit(self) -> Optional[str]:
+        if self.sketch.count == 0:
+            return None
+        values = self.sketch.get_quantiles([p / 100 for p in PERCENTILES])
+        return " / ".join(self.format_value(value) for value in values)
+
+    def get_description(self) -> str:
+        percentiles = " / ".join(f"{p}th" for p in PERCENTILES)
+        return f"{self.activity_type} {self.get_name()} ({percentiles} Percentiles)"
+
+
+class DistancePercentilesTidbit(PercentilesTidbit):
+    def get_value(self, activity: DetailedActivity) -> Optional[float]:
+        # Activities without a distance (like workouts) would just drag everything
+        # down to zero.
+        if not activity.distance:
+            return None
+        return float(activity.distance)
+
+    def format_value(self, value: float) -> str:
+        return f"{value / 1000:.2f}km"
+
+    def get_name(self) -> str:
+        return "Distance"
+
+
+class HeartRatePercentilesTidbit(PercentilesTidbit):
+    def get_value(self, activity: DetailedActivity) -> Optional[float]:
+        if not activity.average_heartrate:
+            return None
+        return float(activity.average_heartrate)
+
+    def format_value(self, value: float) -> str:
+        return f"{round(value)} BPM"
+
+    def get_name(self) -> str:
+        return "Average Heart Rate"
+
+
+class PacePercentilesTidbit(PercentilesTidbit):
+    """
+    Pace is in mins/km or km/h, depending on the activity type, the same as the pace
+    plots.
+    """
+
+    def __init__(self, activity_type: str) -> None:
+        super().__init__(activity_type)
+        self.mins_per_km = (
+            get_y_axis_settings(activity_type).conversion_function  # type: ignore
+            is average_speed_to_mins_per_km
+        )
+
+    def get_value(self, activity: DetailedActivity) -> Optional[float]:
+        if not activity.average_speed:
+            return None
+        average_speed = float(activity.average_speed)
+        # The pace itself is sketched, rather than the speed, so that the 10th
+        # percentile is always the lowest number shown.
+        if self.mins_per_km:
+            return 1000 / average_speed
+        return average_speed / 1000 * 3600
+
+    def format_value(self, value: float) -> str:
+        if self.mins_per_km:
+            minutes, seconds = divmod(round(value), 60)
+            return f"{minutes}:{seconds:02d}/km"
+        return f"{value:.1f}km/h"
+
+    def get_name(self) -> str:
+        return "Pace"
+
+
+percentile_trivia = TriviaProcessor()
+
+for activity_type in ACTIVITY_TYPES:
+    percentile_trivia.register_tidbit(PacePercentilesTidbit(activity_type))
+    percentile_trivia.register_tidbit(HeartRatePercentilesTidbit(activity_type))
+    percentile_trivia.register_tidbit(DistancePercentilesTidbit(activity_type))
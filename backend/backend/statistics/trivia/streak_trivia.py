@@ -0,0 +1,179 @@
+import datetime as dt
+from typing import Any, Callable, Optional
+
+from stravalib.model import DetailedActivity, Timezone
+
+from backend.statistics.trivia import TriviaProcessor, TriviaTidbitBase
+from backend.statistics.trivia.min_max_summary_trivia import ACTIVITY_TYPES
+from backend.statistics.utils.streaks import (
+    DayBitset,
+    get_current_streak,
+    get_longest_gap,
+    get_longest_streak,
+    get_longest_weekly_streak,
+)
+
+
+class StreakTidbit(TriviaTidbitBase):
+    """
+    A tidbit that only needs to know which days had activities on them, either for all
+    activities, or just one type of activity.
+    """
+
+    def __init__(self, activity_type: Optional[str] = None) -> None:
+        self.activity_type = activity_type
+        self.days = DayBitset()
+
+    def get_activity_types(self) -> Optional[set[str]]:
+        return None if self.activity_type is None else {self.activity_type}
+
+    def reset_tidbit(self) -> None:
+        self.days = DayBitset()
+
+    def process_activity(self, activity: DetailedActivity) -> None:
+        if activity.start_date_local is not None:
+            self.days.add(activity.start_date_local.date())
+
+    def get_state(self) -> dict[str, Any]:
+        return self.days.to_state()
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.days = DayBitset.from_state(state)
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        self.days = self.days.union(DayBitset.from_state(later_state))
+
+    def get_activities_name(self) -> str:
+        if self.activity_type is None:
+            return "Activities"
+        return f"{self.activity_type} Activities"
+
+
+class LongestStreakTidbit(StreakTidbit):
+    def get_tidbit(self) -> Optional[str]:
+        streak = get_longest_streak(self.days)
+        if streak is None:
+            return None
+        return f"{streak.days} days ({streak.start} to {streak.end})"
+
+    def get_description(self) -> str:
+        return f"Most Consecutive Days of {self.get_activities_name()}"
+
+
+class CurrentStreakTidbit(StreakTidbit):
+    """
+    The days of each activity are the athlete's local days, so "today" has to be too,
+    or the streak would look broken (or still going) for hours around midnight. Their
+    time zone is taken from their most recent activity.
+    """
+
+    def __init__(
+        self,
+        activity_type: Optional[str] = None,
+        get_now: Callable[[], dt.datetime] = lambda: dt.datetime.now(dt.timezone.utc),
+    ) -> None:
+        super().__init__(activity_type)
+        self.get_now = get_now
+        self.latest_start: Optional[dt.datetime] = None
+        self.timezone: Optional[str] = None
+
+    def reset_tidbit(self) -> None:
+        super().reset_tidbit()
+        self.latest_start = None
+        self.timezone = None
+
+    def process_activity(self, activity: DetailedActivity) -> None:
+        super().process_activity(activity)
+        if activity.start_date is not None and (
+            self.latest_start is None or activity.start_date > self.latest_start
+        ):
+            self.latest_start = activity.start_date
+            self.timezone = activity.timezone
+
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "days": super().get_state(),
+            "latest_start": (
+                self.latest_start.timestamp() if self.latest_start else None
+            ),
+            "timezone": self.timezone,
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        super().set_state(state["days"])
+        self.latest_start = (
+            dt.datetime.fromtimestamp(state["latest_start"], tz=dt.timezone.utc)
+            if state["latest_start"] is not None
+            else None
+        )
+        self.timezone = state["timezone"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        super().merge_state(later_state["days"])
+        later_start = later_state["latest_start"]
+        if later_start is not None and (
+            self.latest_start is None or later_start > self.latest_start.timestamp()
+        ):
+            self.latest_start = dt.datetime.fromtimestamp(
+                later_start, tz=dt.timezone.utc
+            )
+            self.timezone = later_state["timezone"]
+
+    def get_today(self) -> dt.date:
+        now = self.get_now()
+        timezone = Timezone(self.timezone).timezone() if self.timezone else None
+        if timezone is None:
+            return now.date()
+        return now.astimezone(timezone).date()
+
+    def get_tidbit(self) -> Optional[str]:
+        streak = get_current_streak(self.days, self.get_today())
+        if streak is None:
+            return None
+        return f"{streak.days} days (since {streak.start})"
+
+    def get_description(self) -> str:
+        return f"Current Streak of {self.get_activities_name()}"
+
+
+class LongestWeeklyStreakTidbit(StreakTidbit):
+    def __init__(self, days_per_week: int, activity_type: Optional[str] = None) -> None:
+        super().__init__(activity_type)
+        self.days_per_week = days_per_week
+
+    def get_tidbit(self) -> Optional[str]:
+        streak = get_longest_weekly_streak(self.days, self.days_per_week)
+        if streak is None:
+            return None
+        return f"{streak.days // 7} weeks ({streak.start} to {streak.end})"
+
+    def get_description(self) -> str:
+        return (
+            f"Most Consecutive Weeks With {self.days_per_week}+ Days of "
+            f"{self.get_activities_name()}"
+        )
+
+
+class LongestGapTidbit(StreakTidbit):
+    def get_tidbit(self) -> Optional[str]:
+        gap = get_longest_gap(self.days)
+        if gap is None:
+            return None
+        return f"{gap.days} days ({gap.start} to {gap.end})"
+
+    def get_description(self) -> str:
+        return f"Longest Break Between {self.get_activities_name()}"
+
+
+streak_trivia = TriviaProcessor()
+
+streak_trivia.register_tidbit(LongestStreakTidbit())
+streak_trivia.register_tidbit(CurrentStreakTidbit())
+streak_trivia.register_tidbit(LongestWeeklyStreakTidbit(days_per_week=3))
+streak_trivia.register_tidbit(LongestGapTidbit())
+
+for activity_type in ACTIVITY_TYPES:
+    streak_trivia.register_tidbit(LongestStreakTidbit(activity_type))
+    streak_trivia.register_tidbit(CurrentStreakTidbit(activity_type))
+    streak_trivia.register_tidbit(LongestWeeklyStreakTidbit(3, activity_type))
+    streak_trivia.register_tidbit(LongestGapTidbit(activity_type))
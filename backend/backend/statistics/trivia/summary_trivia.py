@@ -1,9 +1,14 @@
 import datetime as dt
-from typing import Optional
+from typing import Any, Optional
 
 from stravalib.model import DetailedActivity
 
-from backend.statistics.trivia import TriviaProcessor, TriviaTidbitBase
+from backend.statistics.trivia import (
+    AggregateTidbit,
+    TriviaProcessor,
+    TriviaTidbitBase,
+)
+from backend.statistics.trivia.streak_trivia import LongestStreakTidbit
 
 
 class MostPeopleOnAGroupRunTidbit(TriviaTidbitBase):
@@ -20,6 +25,18 @@ class MostPeopleOnAGroupRunTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.most_people = activity.athlete_count
 
+    def get_state(self) -> dict[str, Any]:
+        return {"activity_id": self.activity_id, "most_people": self.most_people}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.most_people = state["most_people"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        later = later_state["most_people"]
+        if later is not None and (self.most_people is None or self.most_people < later):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.most_people:
             return f"{self.most_people} People"
@@ -53,6 +70,23 @@ class HighestHeartRateRecordedTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.highest_max_heartrate = activity.max_heartrate
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "activity_id": self.activity_id,
+            "highest_max_heartrate": self.highest_max_heartrate,
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.highest_max_heartrate = state["highest_max_heartrate"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        later = later_state["highest_max_heartrate"]
+        if later is not None and (
+            self.highest_max_heartrate is None or later > self.highest_max_heartrate
+        ):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.highest_max_heartrate:
             return f"{self.highest_max_heartrate} BPM"
@@ -86,6 +120,23 @@ class LowestHeartRateRecordedTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.lowest_max_heartrate = activity.max_heartrate
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "activity_id": self.activity_id,
+            "lowest_max_heartrate": self.lowest_max_heartrate,
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.lowest_max_heartrate = state["lowest_max_heartrate"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        later = later_state["lowest_max_heartrate"]
+        if later is not None and (
+            self.lowest_max_heartrate is None or later < self.lowest_max_heartrate
+        ):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.lowest_max_heartrate:
             return f"{self.lowest_max_heartrate} BPM"
@@ -119,6 +170,24 @@ class HighestAverageHeartrateTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.highest_average_heartrate = activity.average_heartrate
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "activity_id": self.activity_id,
+            "highest_average_heartrate": self.highest_average_heartrate,
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.highest_average_heartrate = state["highest_average_heartrate"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        later = later_state["highest_average_heartrate"]
+        if later is not None and (
+            self.highest_average_heartrate is None
+            or later > self.highest_average_heartrate
+        ):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.highest_average_heartrate:
             return f"{self.highest_average_heartrate} BPM"
@@ -152,6 +221,24 @@ class LowestAverageHeartrateTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.lowest_average_heartrate = activity.average_heartrate
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "activity_id": self.activity_id,
+            "lowest_average_heartrate": self.lowest_average_heartrate,
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.lowest_average_heartrate = state["lowest_average_heartrate"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        later = later_state["lowest_average_heartrate"]
+        if later is not None and (
+            self.lowest_average_heartrate is None
+            or later < self.lowest_average_heartrate
+        ):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.lowest_average_heartrate:
             return f"{self.lowest_average_heartrate} BPM"
@@ -179,6 +266,18 @@ class MostKudosedActivityTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.max_kudos = activity.kudos_count
 
+    def get_state(self) -> dict[str, Any]:
+        return {"activity_id": self.activity_id, "max_kudos": self.max_kudos}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.max_kudos = state["max_kudos"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        later = later_state["max_kudos"]
+        if later is not None and (self.max_kudos is None or later > self.max_kudos):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.max_kudos:
             return f"{self.max_kudos}"
@@ -206,6 +305,35 @@ class FirstActivityRecordedTidbit(TriviaTidbitBase):
             self.activity_id = activity.id
             self.activity_date = activity.start_date_local
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "activity_id": self.activity_id,
+            "activity_date": (
+                self.activity_date.isoformat() if self.activity_date else None
+            ),
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.activity_id = state["activity_id"]
+        self.activity_date = (
+            dt.datetime.fromisoformat(state["activity_date"])
+            if state["activity_date"]
+            else None
+        )
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        current_activity_id, current_activity_date = (
+            self.activity_id,
+            self.activity_date,
+        )
+        self.set_state(later_state)
+        if self.activity_date is None or (
+            current_activity_date is not None
+            and current_activity_date <= self.activity_date
+        ):
+            self.activity_id = current_activity_id
+            self.activity_date = current_activity_date
+
     def get_tidbit(self) -> Optional[str]:
         if self.activity_date:
             return f"{self.activity_date}"
@@ -219,19 +347,12 @@ class FirstActivityRecordedTidbit(TriviaTidbitBase):
         return self.activity_id
 
 
-class TotalKudosRecievedTidbit(TriviaTidbitBase):
+class TotalKudosRecievedTidbit(AggregateTidbit):
     def __init__(self) -> None:
-        self.kudos_count: int = 0
-
-    def reset_tidbit(self) -> None:
-        self.kudos_count = 0
-
-    def process_activity(self, activity: DetailedActivity) -> None:
-        if activity.kudos_count is not None:
-            self.kudos_count += activity.kudos_count
+        super().__init__("sum", "kudos_count")
 
-    def get_tidbit(self) -> Optional[str]:
-        return f"{self.kudos_count}"
+    def format_value(self, value: Any) -> str:
+        return f"{int(value)}"
 
     def get_description(self) -> str:
         return "Total Kudos Recieved"
@@ -256,6 +377,36 @@ class EarliestActivityTidbit(TriviaTidbitBase):
                 self.earliest_activity_id = activity.id
                 self.time_of_earliest_activity = activity_time
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "earliest_activity_id": self.earliest_activity_id,
+            "time_of_earliest_activity": (
+                self.time_of_earliest_activity.isoformat()
+                if self.time_of_earliest_activity
+                else None
+            ),
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.earliest_activity_id = state["earliest_activity_id"]
+        self.time_of_earliest_activity = (
+            dt.time.fromisoformat(state["time_of_earliest_activity"])
+            if state["time_of_earliest_activity"]
+            else None
+        )
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        current_time = self.time_of_earliest_activity
+        later_time = (
+            dt.time.fromisoformat(later_state["time_of_earliest_activity"])
+            if later_state["time_of_earliest_activity"]
+            else None
+        )
+        if later_time is not None and (
+            current_time is None or later_time <= current_time
+        ):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.time_of_earliest_activity:
             return f"{self.time_of_earliest_activity}"
@@ -288,6 +439,36 @@ class LatestActivityTidbit(TriviaTidbitBase):
                 self.latest_activity_id = activity.id
                 self.time_of_latest_activity = activity_time
 
+    def get_state(self) -> dict[str, Any]:
+        return {
+            "latest_activity_id": self.latest_activity_id,
+            "time_of_latest_activity": (
+                self.time_of_latest_activity.isoformat()
+                if self.time_of_latest_activity
+                else None
+            ),
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.latest_activity_id = state["latest_activity_id"]
+        self.time_of_latest_activity = (
+            dt.time.fromisoformat(state["time_of_latest_activity"])
+            if state["time_of_latest_activity"]
+            else None
+        )
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        current_time = self.time_of_latest_activity
+        later_time = (
+            dt.time.fromisoformat(later_state["time_of_latest_activity"])
+            if later_state["time_of_latest_activity"]
+            else None
+        )
+        if later_time is not None and (
+            current_time is None or later_time >= current_time
+        ):
+            self.set_state(later_state)
+
     def get_tidbit(self) -> Optional[str]:
         if self.time_of_latest_activity:
             return f"{self.time_of_latest_activity}"
@@ -301,63 +482,13 @@ class LatestActivityTidbit(TriviaTidbitBase):
         return self.latest_activity_id
 
 
-class MostConsecutiveDaysOfActivities(TriviaTidbitBase):
-    def __init__(self) -> None:
-        self.date_list: list[dt.date] = []
+class MostConsecutiveDaysOfActivities(LongestStreakTidbit):
+    """
+    The longest streak of days with any type of activity.
+    """
 
-    def reset_tidbit(self) -> None:
-        self.date_list = []
-
-    def process_activity(self, activity: DetailedActivity) -> None:
-        if activity.start_date_local is not None:
-            self.date_list.append(activity.start_date_local.date())
-
-    def get_tidbit(self) -> Optional[str]:
-        # If there are no activities, just return None
-        if not self.date_list:
-            return None
-
-        # Sort the date list in ascending order
-        self.date_list.sort()
-
-        max_consecutive_days = 1
-        current_consecutive_days = 1
-        start_date = self.date_list[0]
-        end_date = self.date_list[0]
-
-        # Initialize variables to track the start and end of the longest consecutive
-        # days
-        max_start_date = self.date_list[0]
-        max_end_date = self.date_list[0]
-
-        for i in range(1, len(self.date_list)):
-            # Calculate the difference between consecutive datetimes
-            time_difference = self.date_list[i] - self.date_list[i - 1]
-
-            # If there are multiple activities on the same day, just continue.
-            if time_difference == dt.timedelta(days=0):
-                continue
-
-            # Check if the difference is one day
-            if time_difference == dt.timedelta(days=1):
-                current_consecutive_days += 1
-                end_date = self.date_list[i]
-            else:
-                # If the difference is not one day, reset the current count
-                current_consecutive_days = 1
-                start_date = self.date_list[i]
-                end_date = self.date_list[i]
-
-            # Update the maximum consecutive days count and dates if needed
-            if current_consecutive_days > max_consecutive_days:
-                max_consecutive_days = current_consecutive_days
-                max_start_date = start_date
-                max_end_date = end_date
-
-        return f"{max_consecutive_days} days ({max_start_date} to {max_end_date})"
-
-    def get_description(self) -> str:
-        return "Most Consecutive Days of Activities"
+    def __init__(self) -> None:
+        super().__init__()
 
 
 general_trivia = TriviaProcessor()
@@ -0,0 +1,90 @@
+"""
+With well over a hundred tidbits, when a trivia tab is slow it's hard to tell which of
+them is to blame. If a processor is given a TriviaTimings, it keeps track of how many
+times each tidbit is called and how long it takes, so the slow ones can be logged.
+
+It's opt in, because timing every call to every tidbit for every activity isn't free.
+"""
+
+import dataclasses
+import time
+from typing import TYPE_CHECKING, Optional
+
+from stravalib.model import DetailedActivity
+
+if TYPE_CHECKING:
+    from backend.statistics.trivia.aggregations import AggregateTidbit
+    from backend.statistics.trivia.trivia import TriviaTidbitBase
+
+
+@dataclasses.dataclass
+class TidbitTiming:
+    name: str
+    process_activity_calls: int = 0
+    process_activity_seconds: float = 0.0
+    get_tidbit_calls: int = 0
+    get_tidbit_seconds: float = 0.0
+
+    @property
+    def total_seconds(self) -> float:
+        return self.process_activity_seconds + self.get_tidbit_seconds
+
+
+class TriviaTimings:
+    def __init__(self) -> None:
+        # By the id of the tidbit, because two tidbits can have the same description.
+        self.timings: dict[int, TidbitTiming] = {}
+        # The aggregate tidbits are all worked out at once, so there's only a total.
+        self.aggregate_seconds = 0.0
+
+    def get_timing(self, tidbit: "TriviaTidbitBase | AggregateTidbit") -> TidbitTiming:
+        timing = self.timings.get(id(tidbit))
+        if timing is None:
+            timing = TidbitTiming(
+                f"{type(tidbit).__name__}: {tidbit.get_description()}"
+            )
+            self.timings[id(tidbit)] = timing
+        return timing
+
+    def process_activity(
+        self, tidbit: "TriviaTidbitBase", activity: DetailedActivity
+    ) -> None:
+        start = time.perf_counter()
+        tidbit.process_activity(activity)
+        seconds = time.perf_counter() - start
+
+        timing = self.get_timing(tidbit)
+        timing.process_activity_calls += 1
+        timing.process_activity_seconds += seconds
+
+    def add_get_tidbit_time(
+        self, tidbit: "TriviaTidbitBase | AggregateTidbit", seconds: float
+    ) -> None:
+        timing = self.get_timing(tidbit)
+        timing.get_tidbit_calls += 1
+        timing.get_tidbit_seconds += seconds
+
+    def get_report(self, limit: Optional[int] = None) -> list[str]:
+        """
+        A line for each tidbit, slowest first.
+        """
+        timings = sorted(
+            self.timings.values(), key=lambda timing: timing.total_seconds, reverse=True
+        )
+        lines = [
+            f"Aggregate tidbits: {self.aggregate_seconds * 1000:.2f}ms",
+            *(
+                f"{timing.name}: {timing.total_seconds * 1000:.2f}ms "
+                f"(process_activity: {timing.process_activity_calls} calls, "
+                f"{timing.process_activity_seconds * 1000:.2f}ms, "
+                f"get_tidbit: {timing.get_tidbit_calls} calls, "
+                f"{timing.get_tidbit_seconds * 1000:.2f}ms)"
+                for timing in timings[:limit]
+            ),
+        ]
+        return lines
+
+    def log(self, title: str, limit: Optional[int] = 20) -> None:
+        print(f"Trivia timings for {title}:")
+        for line in self.get_report(limit):
+            print(f"  {line}")
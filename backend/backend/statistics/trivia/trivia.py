@@ -1,8 +1,17 @@
+import copy
+import time
 from abc import ABC, abstractmethod
-from typing import Iterator, Optional
+from typing import Any, Iterator, Optional
 
 from stravalib.model import DetailedActivity
 
+from backend.statistics.trivia.aggregations import (
+    ActivityColumns,
+    AggregateResult,
+    AggregateTidbit,
+    get_aggregate_results,
+)
+from backend.statistics.trivia.timing import TriviaTimings
 from backend.statistics.utils.strava_links import (
     get_activity_url,
     get_link,
@@ -51,10 +60,44 @@ class TriviaTidbitBase(ABC):
     @abstractmethod
     def reset_tidbit(self) -> None:
         """
-        Only important for running the tidbit locally, but you need to wipe the
-        tidbit stats between each run because otherwise the second time you hit
-        the tab, everything gets processed again and
+        Sets up the tidbit's stats from scratch. Each time a processor is run, it
+        works on a copy of the tidbit, and this is called on the copy before it sees
+        any activities.
+        """
+
+    @abstractmethod
+    def get_state(self) -> dict[str, Any]:
+        """
+        Everything the tidbit has saved from the activities it's processed so far,
+        as something that can be turned into JSON. That way it can be saved, and
+        newly uploaded activities processed on top of it later, instead of going
+        through every activity again.
+        """
+        pass
+
+    @abstractmethod
+    def set_state(self, state: dict[str, Any]) -> None:
+        """
+        Puts the tidbit back how it was when get_state was called.
+        """
+        pass
+
+    @abstractmethod
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        """
+        Adds the state of the same tidbit, from activities that came after the ones
+        this tidbit has processed, to this tidbit. Afterwards, the tidbit should be
+        the same as if it had processed all the activities itself, in order.
+        """
+        pass
+
+    def get_activity_types(self) -> Optional[set[str]]:
+        """
+        If the tidbit only cares about some types of activities (like "Run"), it can
+        return them here, and it'll only ever be given activities of those types.
+        None means it wants every activity.
         """
+        return None
 
     def get_activity_id(self) -> Optional[int]:
         """
@@ -89,39 +132,267 @@ class TriviaTidbitBase(ABC):
             return None
 
 
+# The state of every tidbit in a processor, in the order they were registered.
+TriviaState = list[dict[str, Any]]
+
+
 class TriviaProcessor:
     """
     The trivia processor processes all the individual tidbits of trivia,
     and returns them all as a list.
+
+    It can also hand back the state of all its tidbits instead, which can be saved
+    and then added to with newly uploaded activities, or worked out for a few lots
+    of activities at the same time and then merged together.
+
+    The registered tidbits are only ever used as templates. Each time the processor
+    is run, it works on its own copies of them, so lots of threads can run the same
+    processor at once.
     """
 
     def __init__(self) -> None:
-        self.tidbits: list[TriviaTidbitBase] = []
+        self.tidbits: list[TriviaTidbitBase | AggregateTidbit] = []
 
-    def register_tidbit(self, tidbit: TriviaTidbitBase) -> None:
+    def register_tidbit(self, tidbit: TriviaTidbitBase | AggregateTidbit) -> None:
         self.tidbits.append(tidbit)
 
     def get_data(
-        self, activities: Iterator[DetailedActivity]
+        self,
+        activities: Iterator[DetailedActivity],
+        state: Optional[TriviaState] = None,
+        timings: Optional[TriviaTimings] = None,
     ) -> list[tuple[str, str, LinkCell | None]]:
-        trivia: list[tuple[str, str, LinkCell | None]] = []
+        """
+        Works out the trivia for the activities, on top of the state from some
+        earlier activities if there is one. If timings are given, how long each tidbit
+        takes is added to them.
+        """
+        run = process_together([self], activities, [state], timings)[0]
+        return run.get_trivia(timings)
 
-        # Reset tidbits
-        for tidbit in self.tidbits:
-            tidbit.reset_tidbit()
+    def process_activities(
+        self,
+        activities: Iterator[DetailedActivity],
+        state: Optional[TriviaState] = None,
+    ) -> TriviaState:
+        """
+        Like get_data, but returns the state of the tidbits, instead of the trivia.
+        """
+        return process_together([self], activities, [state])[0].get_state()
 
-        # Process activities
-        for activity in activities:
-            for tidbit in self.tidbits:
-                tidbit.process_activity(activity)
+    def merge_states(self, state: TriviaState, later_state: TriviaState) -> TriviaState:
+        """
+        Merges the states from two lots of activities, where the second lot came
+        after the first.
+        """
+        run = TriviaRun(self)
+        run.set_state(state)
+        run.merge_state(later_state)
+        return run.get_state()
+
+    def get_data_from_state(
+        self, state: TriviaState
+    ) -> list[tuple[str, str, LinkCell | None]]:
+        run = TriviaRun(self)
+        run.set_state(state)
+        return run.get_trivia()
 
-        # Get results
-        for tidbit in self.tidbits:
+
+class TriviaRun:
+    """
+    A single run of a processor, with fresh copies of all of its tidbits to keep track
+    of the activities this run has seen.
+    """
+
+    def __init__(self, processor: TriviaProcessor) -> None:
+        self.tidbits: list[TriviaTidbitBase | AggregateTidbit] = []
+        for tidbit in processor.tidbits:
+            # The aggregate tidbits don't keep anything themselves, so they can be
+            # shared.
+            if isinstance(tidbit, TriviaTidbitBase):
+                tidbit = copy.deepcopy(tidbit)
+                tidbit.reset_tidbit()
+            self.tidbits.append(tidbit)
+
+        # The results of the aggregate tidbits, by where they are in the list of
+        # tidbits.
+        self.aggregate_results: dict[int, AggregateResult] = {
+            position: AggregateResult(0 if tidbit.aggregation == "sum" else None)
+            for position, tidbit in enumerate(self.tidbits)
+            if isinstance(tidbit, AggregateTidbit)
+        }
+
+    def get_processing_tidbits(self) -> list[TriviaTidbitBase]:
+        return [
+            tidbit for tidbit in self.tidbits if isinstance(tidbit, TriviaTidbitBase)
+        ]
+
+    def get_attribute_names(self) -> set[str]:
+        return {
+            tidbit.attribute_name
+            for tidbit in self.tidbits
+            if isinstance(tidbit, AggregateTidbit)
+        }
+
+    def finish_processing(
+        self, columns: ActivityColumns, timings: Optional[TriviaTimings] = None
+    ) -> None:
+        """
+        Once the tidbits have seen every activity, works out the aggregate tidbits from
+        the columns.
+        """
+        positions = list(self.aggregate_results)
+        if positions:
+            aggregate_tidbits: list[AggregateTidbit] = [
+                self.tidbits[position]  # type: ignore
+                for position in positions
+            ]
+            start = time.perf_counter()
+            self.aggregate_results = dict(
+                zip(positions, get_aggregate_results(aggregate_tidbits, columns))
+            )
+            if timings is not None:
+                timings.aggregate_seconds += time.perf_counter() - start
+
+    def get_state(self) -> TriviaState:
+        return [
+            (
+                self.aggregate_results[position].to_state()
+                if isinstance(tidbit, AggregateTidbit)
+                else tidbit.get_state()
+            )
+            for position, tidbit in enumerate(self.tidbits)
+        ]
+
+    def set_state(self, state: TriviaState) -> None:
+        self.check_state(state)
+        for position, (tidbit, tidbit_state) in enumerate(zip(self.tidbits, state)):
+            if isinstance(tidbit, AggregateTidbit):
+                self.aggregate_results[position] = AggregateResult.from_state(
+                    tidbit_state
+                )
+            else:
+                tidbit.set_state(tidbit_state)
+
+    def merge_state(self, later_state: TriviaState) -> None:
+        self.check_state(later_state)
+        for position, (tidbit, later_tidbit_state) in enumerate(
+            zip(self.tidbits, later_state)
+        ):
+            if isinstance(tidbit, AggregateTidbit):
+                self.aggregate_results[position] = tidbit.merge_results(
+                    self.aggregate_results[position],
+                    AggregateResult.from_state(later_tidbit_state),
+                )
+            else:
+                tidbit.merge_state(later_tidbit_state)
+
+    def get_trivia(
+        self, timings: Optional[TriviaTimings] = None
+    ) -> list[tuple[str, str, LinkCell | None]]:
+        trivia: list[tuple[str, str, LinkCell | None]] = []
+        for position, tidbit in enumerate(self.tidbits):
             description = tidbit.get_description()
-            tidbit_text = tidbit.get_tidbit()
-            url = tidbit.get_tidbit_url()
+            start = time.perf_counter()
+            if isinstance(tidbit, AggregateTidbit):
+                result = self.aggregate_results[position]
+                tidbit_text = tidbit.get_tidbit_from_result(result)
+                url = tidbit.get_tidbit_url(result.activity_id)
+            else:
+                tidbit_text = tidbit.get_tidbit()
+                url = tidbit.get_tidbit_url()
+            if timings is not None:
+                timings.add_get_tidbit_time(tidbit, time.perf_counter() - start)
 
             if tidbit_text is not None:
                 trivia.append((description, tidbit_text, url))
 
         return trivia
+
+    def check_state(self, state: TriviaState) -> None:
+        if len(state) != len(self.tidbits):
+            raise ValueError("That state is from a different set of tidbits.")
+
+
+def get_data_for_processors(
+    processors: list[TriviaProcessor],
+    activities: Iterator[DetailedActivity],
+    states: Optional[list[Optional[TriviaState]]] = None,
+    timings: Optional[TriviaTimings] = None,
+) -> list[list[tuple[str, str, LinkCell | None]]]:
+    """
+    The same as calling get_data on each of the processors, but only going through
+    the activities once. Useful when a few trivia tabs are all needed at once, so the
+    activities only need to be loaded and gone through a single time.
+    """
+    if states is None:
+        states = [None] * len(processors)
+    runs = process_together(processors, activities, states, timings)
+    return [run.get_trivia(timings) for run in runs]
+
+
+def process_together(
+    processors: list[TriviaProcessor],
+    activities: Iterator[DetailedActivity],
+    states: list[Optional[TriviaState]],
+    timings: Optional[TriviaTimings] = None,
+) -> list[TriviaRun]:
+    """
+    Runs every processor over the activities in a single go through them. Each
+    activity is given to the tidbits of every processor that want it, and one set of
+    columns is collected for all of their aggregate tidbits. If there's an earlier
+    state for a processor, everything is added on top of it.
+    """
+    runs = [TriviaRun(processor) for processor in processors]
+    tidbits = [tidbit for run in runs for tidbit in run.get_processing_tidbits()]
+    attribute_names = set().union(*(run.get_attribute_names() for run in runs))
+
+    # Process activities
+    columns = ActivityColumns(attribute_names)
+    tidbits_by_type, untyped_tidbits = get_tidbits_by_activity_type(tidbits)
+    for activity in activities:
+        if attribute_names:
+            columns.add_activity(activity)
+        for tidbit in tidbits_by_type.get(activity.type.root, untyped_tidbits):
+            if timings is None:
+                tidbit.process_activity(activity)
+            else:
+                timings.process_activity(tidbit, activity)
+
+    for run, state in zip(runs, states):
+        run.finish_processing(columns, timings)
+
+        # Everything in the earlier state came before these activities.
+        if state is not None:
+            later_state = run.get_state()
+            run.set_state(state)
+            run.merge_state(later_state)
+
+    return runs
+
+
+def get_tidbits_by_activity_type(
+    tidbits: list[TriviaTidbitBase],
+) -> tuple[dict[str, list[TriviaTidbitBase]], list[TriviaTidbitBase]]:
+    """
+    Works out which tidbits want each type of activity, so each activity is only given
+    to the tidbits that care about it, instead of all of them checking its type
+    themselves. Activities of a type no tidbit asked for only go to the tidbits which
+    want everything, which are returned separately.
+    """
+    untyped_tidbits = [
+        tidbit for tidbit in tidbits if tidbit.get_activity_types() is None
+    ]
+    activity_types: set[str] = set().union(
+        *(tidbit.get_activity_types() or set() for tidbit in tidbits)
+    )
+    tidbits_by_type = {
+        activity_type: [
+            tidbit
+            for tidbit in tidbits
+            if tidbit.get_activity_types() is None
+            or activity_type in tidbit.get_activity_types()  # type: ignore
+        ]
+        for activity_type in activity_types
+    }
+    return tidbits_by_type, untyped_tidbits
@@ -0,0 +1,123 @@
+"""
+Working out the median (or any other percentile) of something normally means keeping
+every value and sorting them. Instead, this is a KLL sketch, which keeps at most a few
+hundred values no matter how many it's seen, and still gets the percentiles to within
+about a percent of the right rank.
+
+It works by keeping values in levels. Every value starts on level 0, and when a level
+gets too full it's sorted, and every second value is moved up to the next level, where
+each value counts twice as much as on the level below. Lower levels are allowed fewer
+values than the higher ones, so while there are only a few values, nothing gets thrown
+away at all and the percentiles are exact.
+
+The sketches can also be merged, so two lots of activities can be sketched separately
+and then combined.
+"""
+
+import math
+from typing import Any
+
+DEFAULT_K = 200
+
+# How much smaller each level's capacity is than the level above it.
+CAPACITY_RATIO = 2 / 3
+
+
+class QuantileSketch:
+    def __init__(self, k: int = DEFAULT_K) -> None:
+        self.k = k
+        self.count = 0
+        self.levels: list[list[float]] = [[]]
+        # Whether the odd or even values are kept when a level is compacted. Taking
+        # turns (rather than picking randomly) keeps the sketch the same every time
+        # for the same values.
+        self.keep_odd = False
+
+    def get_capacity(self, level: int) -> int:
+        height = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * CAPACITY_RATIO**height))
+
+    def get_max_size(self) -> int:
+        return sum(self.get_capacity(level) for level in range(len(self.levels)))
+
+    def get_size(self) -> int:
+        return sum(len(values) for values in self.levels)
+
+    def add(self, value: float) -> None:
+        self.levels[0].append(value)
+        self.count += 1
+        if len(self.levels[0]) >= self.get_capacity(0):
+            self.compress()
+
+    def merge(self, other: "QuantileSketch") -> None:
+        if other.k != self.k:
+            raise ValueError("Can't merge sketches with different sizes.")
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for values, other_values in zip(self.levels, other.levels):
+            values.extend(other_values)
+        self.count += other.count
+        self.compress()
+
+    def compress(self) -> None:
+        while self.get_size() >= self.get_max_size():
+            # Compact the lowest level that's full. There's always one, because
+            # together they're over their total capacity.
+            level = next(
+                level
+                for level, values in enumerate(self.levels)
+                if len(values) >= self.get_capacity(level)
+            )
+            self.compact(level)
+
+    def compact(self, level: int) -> None:
+        if level + 1 == len(self.levels):
+            self.levels.append([])
+
+        values = sorted(self.levels[level])
+        # With an odd number of values, one has to stay behind, so that the values
+        # moved up a level still count for exactly as much as before.
+        leftover = [values.pop()] if len(values) % 2 else []
+        self.levels[level + 1].extend(values[int(self.keep_odd) :: 2])
+        self.levels[level] = leftover
+        self.keep_odd = not self.keep_odd
+
+    def get_quantiles(self, quantiles: list[float]) -> list[float]:
+        """
+        The value at each quantile (between 0 and 1), using the nearest rank: the
+        smallest value with at least that fraction of all the values at or below it.
+        """
+        if self.count == 0:
+            raise ValueError("Can't get quantiles of an empty sketch.")
+
+        weighted_values = sorted(
+            (value, 2**level)
+            for level, values in enumerate(self.levels)
+            for value in values
+        )
+        results = []
+        for quantile in quantiles:
+            rank = max(1, math.ceil(quantile * self.count))
+            total_weight = 0
+            for value, weight in weighted_values:
+                total_weight += weight
+                if total_weight >= rank:
+                    break
+            results.append(value)
+        return results
+
+    def to_state(self) -> dict[str, Any]:
+        return {
+            "k": self.k,
+            "count": self.count,
+            "levels": self.levels,
+            "keep_odd": self.keep_odd,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> "QuantileSketch":
+        sketch = cls(state["k"])
+        sketch.count = state["count"]
+        sketch.levels = [list(values) for values in state["levels"]]
+        sketch.keep_odd = state["keep_odd"]
+        return sketch
@@ -0,0 +1,160 @@
+"""
+Streaks (and breaks) only care about which days had activities on them, so instead of
+keeping every activity's date around, I keep a bitset of days, where the nth bit is set
+if there was an activity n days after the first day. Python ints make great bitsets,
+and even a decade of activities is only a few hundred bytes.
+"""
+
+import dataclasses
+import datetime as dt
+from typing import Any, Iterator, Optional
+
+
+@dataclasses.dataclass(frozen=True)
+class Streak:
+    start: dt.date
+    end: dt.date
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+
+class DayBitset:
+    """
+    A set of days, stored as bits of an int.
+    """
+
+    def __init__(self) -> None:
+        # The ordinal of the day the first bit is for, or None if there aren't any.
+        self.first_day: Optional[int] = None
+        self.bits = 0
+
+    def add(self, date: dt.date) -> None:
+        self.add_ordinal(date.toordinal())
+
+    def add_ordinal(self, day: int) -> None:
+        if self.first_day is None:
+            self.first_day = day
+        elif day < self.first_day:
+            # Move everything along so the new day is the first bit.
+            self.bits <<= self.first_day - day
+            self.first_day = day
+        self.bits |= 1 << (day - self.first_day)
+
+    def union(self, other: "DayBitset") -> "DayBitset":
+        union = DayBitset()
+        for bitset in [self, other]:
+            if bitset.first_day is not None:
+                union.add_ordinal(bitset.first_day)
+                union.bits |= bitset.bits << (bitset.first_day - union.first_day)  # type: ignore
+        return union
+
+    def __contains__(self, date: dt.date) -> bool:
+        if self.first_day is None:
+            return False
+        offset = date.toordinal() - self.first_day
+        return offset >= 0 and bool(self.bits >> offset & 1)
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def get_runs(self) -> Iterator[Streak]:
+        """
+        Every run of consecutive days in the set, in order.
+        """
+        if self.first_day is None:
+            return
+        bits = self.bits
+        day = self.first_day
+        while bits:
+            # Skip the days without anything on them...
+            gap = (bits & -bits).bit_length() - 1
+            bits >>= gap
+            day += gap
+            # ...and then count the days in a row that do.
+            run = (bits ^ (bits + 1)).bit_length() - 1
+            yield Streak(dt.date.fromordinal(day), dt.date.fromordinal(day + run - 1))
+            bits >>= run
+            day += run
+
+    def to_state(self) -> dict[str, Any]:
+        return {"first_day": self.first_day, "bits": format(self.bits, "x")}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> "DayBitset":
+        bitset = cls()
+        bitset.first_day = state["first_day"]
+        bitset.bits = int(state["bits"], 16)
+        return bitset
+
+
+def get_longest_streak(days: DayBitset) -> Optional[Streak]:
+    """
+    The most days in a row with activities. If there's a tie, it's the first one.
+    """
+    longest: Optional[Streak] = None
+    for streak in days.get_runs():
+        if longest is None or streak.days > longest.days:
+            longest = streak
+    return longest
+
+
+def get_current_streak(days: DayBitset, today: dt.date) -> Optional[Streak]:
+    """
+    The streak that's still going. It's still going if there's been an activity today,
+    or if there was one yesterday and there's still time to do one today.
+    """
+    current: Optional[Streak] = None
+    for streak in days.get_runs():
+        current = streak
+    if current is None or current.end < today - dt.timedelta(days=1):
+        return None
+    return current
+
+
+def get_longest_gap(days: DayBitset) -> Optional[Streak]:
+    """
+    The most days in a row without an activity, between the first and last activity.
+    """
+    longest: Optional[Streak] = None
+    previous: Optional[Streak] = None
+    for streak in days.get_runs():
+        if previous is not None:
+            gap = Streak(
+                previous.end + dt.timedelta(days=1), streak.start - dt.timedelta(days=1)
+            )
+            if longest is None or gap.days > longest.days:
+                longest = gap
+        previous = streak
+    return longest
+
+
+def get_longest_weekly_streak(days: DayBitset, days_per_week: int) -> Optional[Streak]:
+    """
+    The most weeks in a row with activities on at least days_per_week days of the
+    week. Weeks start on Monday, and the streak goes from the Monday of the first week
+    to the Sunday of the last.
+    """
+    if days.first_day is None:
+        return None
+
+    # Line the bits up with the Mondays, so each week is just the next 7 bits.
+    first_monday = days.first_day - dt.date.fromordinal(days.first_day).weekday()
+    bits = days.bits << (days.first_day - first_monday)
+
+    weeks = DayBitset()
+    week = first_monday
+    while bits:
+        if (bits & 0b1111111).bit_count() >= days_per_week:
+            # One bit per week, so the runs of weeks can be found just like days.
+            weeks.add_ordinal(first_monday + (week - first_monday) // 7)
+        bits >>= 7
+        week += 7
+
+    longest = get_longest_streak(weeks)
+    if longest is None:
+        return None
+    start = first_monday + (longest.start.toordinal() - first_monday) * 7
+    end = first_monday + (longest.end.toordinal() - first_monday) * 7 + 6
+    return Streak(dt.date.fromordinal(start), dt.date.fromordinal(end))
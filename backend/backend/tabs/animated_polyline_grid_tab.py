@@ -1,11 +1,11 @@
 import json
 from typing import Any, Callable, Iterator
 
-import plotly
 from stravalib.model import DetailedActivity
 
 from backend.tabs.tabs import Tab
 from backend.utils.environment_variables import EnvironmentVariableManager
+from backend.utils.lazy import Lazy
 
 
 class AnimatedPolylineGridTab(Tab):
@@ -14,7 +14,7 @@ class AnimatedPolylineGridTab(Tab):
         name: str,
         detailed: bool,
         description: str,
-        create_images_function: Callable[[Iterator[DetailedActivity], str], None],
+        create_images_function: Lazy[Callable[[Iterator[DetailedActivity], str], None]],
         **kwargs: Any,
     ) -> None:
         super().__init__(name, detailed, **kwargs)
@@ -22,7 +22,7 @@ class AnimatedPolylineGridTab(Tab):
         self.create_images_function = create_images_function
 
     def get_plot_function(self) -> Callable[[Iterator[DetailedActivity], str], None]:
-        return self.create_images_function
+        return self.create_images_function.get()
 
     def get_type(self) -> str:
         return "animated_polyline_grid_tab"
@@ -37,6 +37,9 @@ class AnimatedPolylineGridTab(Tab):
         The images are made in a canvas on the frontend, so just send them the data that
         they need, and they'll take care of the rest.
         """
+        # plotly is slow to import, so it's left until a tab actually needs it.
+        import plotly
+
         return json.loads(
             json.dumps(
                 [
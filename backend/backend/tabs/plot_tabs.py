@@ -1,12 +1,29 @@
 import json
-from typing import Any, Callable, Iterator
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional, Protocol
 
-import plotly
-import plotly.graph_objects as go
 from stravalib.model import DetailedActivity
 
 from backend.tabs.tabs import Tab
 from backend.utils.environment_variables import EnvironmentVariableManager
+from backend.utils.lazy import Lazy
+
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
+
+PlotFunction = Callable[[Iterator[DetailedActivity]], "go.Figure"]
+
+
+class SharedPlotFunction(Protocol):
+    """
+    Works out a few plots at once (or just the ones with the keys given, if there are
+    any), and returns them by their keys.
+    """
+
+    def __call__(
+        self,
+        activity_iterator: Iterator[DetailedActivity],
+        keys: Optional[list[str]] = None,
+    ) -> dict[str, "go.Figure"]: ...
 
 
 class PlotTab(Tab):
@@ -15,15 +32,15 @@ class PlotTab(Tab):
         name: str,
         detailed: bool,
         description: str,
-        plot_function: Callable[[Iterator[DetailedActivity]], go.Figure],
+        plot_function: Lazy[PlotFunction],
         **kwargs: Any,
     ) -> None:
         super().__init__(name, detailed, **kwargs)
         self.description = description
         self.plot_function = plot_function
 
-    def get_plot_function(self) -> Callable[[Iterator[DetailedActivity]], go.Figure]:
-        return self.plot_function
+    def get_plot_function(self) -> PlotFunction:
+        return self.plot_function.get()
 
     def generate_and_return_tab_data(
         self,
@@ -31,9 +48,64 @@ class PlotTab(Tab):
         evm: EnvironmentVariableManager,
         athlete_id: int,
     ) -> None:
-        fig = self.plot_function(activity_iterator)
-        chart_json_string = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        return json.loads(chart_json_string)
+        return get_figure_tab_data(self.get_plot_function()(activity_iterator))
 
     def get_type(self) -> str:
         return "plot_tab"
+
+
+class SharedPlots:
+    """
+    A few plot tabs whose plots all come from the same plot function, which can make
+    any of them.
+    """
+
+    def __init__(self, plot_function: Lazy[SharedPlotFunction]) -> None:
+        self.plot_function = plot_function
+
+
+class SharedPlotTab(PlotTab):
+    """
+    One of the tabs in some SharedPlots. It only asks the plot function for its own
+    plot, because making each figure is the expensive part, and most people only
+    look at one or two of them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        detailed: bool,
+        description: str,
+        shared_plots: SharedPlots,
+        plot_key: str,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(
+            name,
+            detailed,
+            description,
+            plot_function=Lazy(self.get_own_plot_function),
+            **kwargs,
+        )
+        self.shared_plots = shared_plots
+        self.plot_key = plot_key
+
+    def get_response_type(self) -> str:
+        # It's shown exactly like any other plot tab.
+        return PlotTab.__name__
+
+    def get_own_plot_function(self) -> PlotFunction:
+        plot_function = self.shared_plots.plot_function.get()
+
+        def plot(activity_iterator: Iterator[DetailedActivity]) -> "go.Figure":
+            return plot_function(activity_iterator, [self.plot_key])[self.plot_key]
+
+        return plot
+
+
+def get_figure_tab_data(fig: "go.Figure") -> Any:
+    # plotly is slow to import, so it's left until a tab actually needs it.
+    import plotly
+
+    chart_json_string = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+    return json.loads(chart_json_string)
@@ -1,12 +1,17 @@
 import dataclasses
 import json
-from typing import Any, Callable, Iterator, Literal, Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Literal, Optional
 
-import pandas as pd
 from stravalib.model import DetailedActivity
 
 from backend.tabs.tabs import Tab
 from backend.utils.environment_variables import EnvironmentVariableManager
+from backend.utils.lazy import Lazy
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+TableFunction = Callable[[Iterator[DetailedActivity]], "pd.DataFrame"]
 
 ColumnTypes = Literal["string", "link"]
 
@@ -23,9 +28,7 @@ class TableTab(Tab):
         name: str,
         detailed: bool,
         description: str,
-        table_function: Optional[
-            Callable[[Iterator[DetailedActivity]], pd.DataFrame]
-        ] = None,
+        table_function: Optional[Lazy[TableFunction]] = None,
         **kwargs: Any,
     ) -> None:
         super().__init__(name, detailed, **kwargs)
@@ -34,10 +37,10 @@ class TableTab(Tab):
 
     def get_table_dataframe(
         self, activities: Iterator[DetailedActivity]
-    ) -> pd.DataFrame:
+    ) -> "pd.DataFrame":
         if self.table_function is None:
             raise Exception("Table tab has no function to generate a table.")
-        return self.table_function(activities)
+        return self.table_function.get()(activities)
 
     def get_table_column_types(self) -> dict[str, ColumnTypes]:
         return {}
@@ -45,7 +48,7 @@ class TableTab(Tab):
     def has_column_headings(self):
         return True
 
-    def get_columns(self, df: pd.DataFrame) -> list[dict[str, str]]:
+    def get_columns(self, df: "pd.DataFrame") -> list[dict[str, str]]:
         column_types = self.get_table_column_types()
 
         # Default column types are "string" for all columns UNLESS there is a
@@ -63,8 +66,9 @@ class TableTab(Tab):
         return cols
 
     def get_table_data(self, activities: Iterator[DetailedActivity]) -> dict[str, Any]:
-        df = self.get_table_dataframe(activities)
+        return self.get_table_data_from_dataframe(self.get_table_dataframe(activities))
 
+    def get_table_data_from_dataframe(self, df: "pd.DataFrame") -> dict[str, Any]:
         def serialise_linkcells(
             linkcell: Optional[LinkCell],
         ) -> Optional[dict[str, Any]]:
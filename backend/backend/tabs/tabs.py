@@ -1,3 +1,4 @@
+import datetime as dt
 import traceback
 from abc import ABC, abstractmethod
 from typing import Any, Iterator, Optional
@@ -7,16 +8,27 @@ from mypy_boto3_dynamodb.service_resource import Table
 from mypy_boto3_s3 import S3Client
 from stravalib.model import DetailedActivity
 
-from backend.utils.dynamodb import get_user_data_row_for_athlete
+from backend.utils.dynamodb import get_data_version_from_dynamo
 from backend.utils.environment_variables import EnvironmentVariableManager
 from backend.utils.s3 import get_summary_activities_from_s3
+from backend.utils.sessions import get_session
+from backend.utils.tab_cache import TabPayloadCache, tab_payload_cache
 
 
 class Tab(ABC):
-    def __init__(self, name: str, detailed: bool, key: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        name: str,
+        detailed: bool,
+        key: Optional[str] = None,
+        date_dependent: bool = False,
+    ) -> None:
         self.name = name
         self.detailed = detailed
         self.key = key
+        # Whether the tab can change from one day to the next without the athlete's
+        # data changing (like how long their current streak is).
+        self.date_dependent = date_dependent
 
     def get_name(self) -> str:
         return self.name
@@ -31,6 +43,20 @@ class Tab(ABC):
     def is_detailed(self) -> bool:
         return self.detailed
 
+    def get_cache_key(self, now: dt.datetime) -> str:
+        """
+        What the tab's payload is cached under, along with the athlete and the version
+        of their data. A tab that depends on the date can only be cached until the
+        athlete's date changes. Midnight in every time zone is on a quarter hour in
+        UTC, so the athlete's date never changes within a quarter hour.
+        """
+        if not self.date_dependent:
+            return self.get_key()
+        quarter_hour = now.replace(
+            minute=now.minute - now.minute % 15, second=0, microsecond=0
+        )
+        return f"{self.get_key()}:{quarter_hour:%Y-%m-%dT%H:%M}"
+
     @abstractmethod
     def get_type(self) -> str:
         pass
@@ -40,7 +66,9 @@ class Tab(ABC):
         app: FastAPI,
         evm: EnvironmentVariableManager,
         user_table: Table,
+        download_status_table: Table,
         s3_client: S3Client,
+        cache: TabPayloadCache = tab_payload_cache,
     ) -> None:
         """
         This function is called on app startup, and registers this tabs route
@@ -48,28 +76,52 @@ class Tab(ABC):
         """
 
         async def frontend_data_retrieval_hook(request: Request) -> Any:
-            session_token = request.cookies["session_token"]
-
-            user_table_data = get_user_data_row_for_athlete(user_table, session_token)
-            summary_activities = get_summary_activities_from_s3(
-                s3_client, user_table_data.athlete_id
+            now = dt.datetime.now(dt.timezone.utc)
+            athlete_id = get_session(
+                user_table,
+                request.cookies["session_token"],
+                evm.get_session_signing_secret(),
+                now,
+            ).athlete_id
+
+            # If we've already worked this tab out from the same version of their
+            # data, there's no need to read it all out of s3 again.
+            data_version = get_data_version_from_dynamo(
+                download_status_table, athlete_id
+            )
+            cached_response_msg = cache.get(
+                athlete_id, self.get_cache_key(now), data_version
             )
+            if cached_response_msg is not None:
+                return cached_response_msg
 
-            response_msg = {"key": self.get_key(), "type": self.__class__.__name__}
+            summary_activities = get_summary_activities_from_s3(s3_client, athlete_id)
 
             try:
-                frontend_data = self.generate_and_return_tab_data(
-                    summary_activities, evm, user_table_data.athlete_id
+                tab_data = self.generate_and_return_shared_tab_data(
+                    summary_activities, evm, athlete_id
                 )
-                response_msg["status"] = "Success"
-                response_msg["tab_data"] = frontend_data
-
             except Exception as e:
                 print(e)
                 traceback.print_exc()
-                response_msg["status"] = "Failure"
+                return {
+                    "key": self.get_key(),
+                    "type": self.get_response_type(),
+                    "status": "Failure",
+                }
+
+            # Any other tabs that were worked out along the way are cached too, so
+            # they're ready when they're asked for.
+            response_msgs = {
+                tab: tab.get_response_msg(frontend_data)
+                for tab, frontend_data in tab_data.items()
+            }
+            for tab, response_msg in response_msgs.items():
+                cache.put(
+                    athlete_id, tab.get_cache_key(now), data_version, response_msg
+                )
 
-            return response_msg
+            return response_msgs[self]
 
         frontend_data_retrieval_hook.__name__ = f"{self.get_key()}"
         app.add_api_route(
@@ -78,6 +130,35 @@ class Tab(ABC):
             methods=["GET"],
         )
 
+    def get_response_type(self) -> str:
+        """
+        The frontend picks how to show a tab from this.
+        """
+        return self.__class__.__name__
+
+    def get_response_msg(self, frontend_data: Any) -> dict[str, Any]:
+        return {
+            "key": self.get_key(),
+            "type": self.get_response_type(),
+            "status": "Success",
+            "tab_data": frontend_data,
+        }
+
+    def generate_and_return_shared_tab_data(
+        self,
+        activity_iterator: Iterator[DetailedActivity],
+        evm: EnvironmentVariableManager,
+        athlete_id: int,
+    ) -> dict["Tab", Any]:
+        """
+        Some tabs are worked out along with other tabs, from the same pass through the
+        activities. This returns the data for this tab, and any others worked out at
+        the same time, so they can all be cached at once.
+        """
+        return {
+            self: self.generate_and_return_tab_data(activity_iterator, evm, athlete_id)
+        }
+
     @abstractmethod
     def generate_and_return_tab_data(
         self,
@@ -1,10 +1,15 @@
-from typing import Any, Iterator
+from typing import TYPE_CHECKING, Any, Iterator, Sequence
 
-import pandas as pd
 from stravalib.model import DetailedActivity
 
-from backend.statistics.trivia import TriviaProcessor
-from backend.tabs.table_tab import TableTab
+from backend.tabs.table_tab import LinkCell, TableTab
+from backend.utils.environment_variables import evm
+from backend.utils.lazy import Lazy
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from backend.statistics.trivia import TriviaProcessor
 
 
 class TriviaTab(TableTab):
@@ -13,7 +18,7 @@ class TriviaTab(TableTab):
         name: str,
         detailed: bool,
         description: str,
-        trivia_processor: TriviaProcessor,
+        trivia_processor: Lazy["TriviaProcessor"],
         **kwargs: Any,
     ) -> None:
         super().__init__(name, detailed, description, **kwargs)
@@ -22,24 +27,13 @@ class TriviaTab(TableTab):
 
     def get_table_dataframe(
         self, activities: Iterator[DetailedActivity]
-    ) -> pd.DataFrame:
-        trivia_data = self.trivia_processor.get_data(activities)
-
-        descriptions = []
-        tidbit_info = []
-        optional_links = []
-        for description, tidbit, link in trivia_data:
-            descriptions.append(description)
-            tidbit_info.append(tidbit)
-            optional_links.append(link)
-
-        return pd.DataFrame(
-            {
-                "tidbit_description": descriptions,
-                "tidbit_info": tidbit_info,
-                "optional_link": optional_links,
-            }
+    ) -> "pd.DataFrame":
+        # Only this tab's trivia is worked out. Most people only open one or two of
+        # the trivia tabs, so working the others out too would mostly be wasted.
+        dataframes = get_trivia_tab_dataframes(
+            [self], activities, log_timings=evm.should_log_trivia_timings()
         )
+        return dataframes[self.get_key()]
 
     def get_table_column_types(self):
         return {
@@ -50,3 +44,50 @@ class TriviaTab(TableTab):
 
     def has_column_headings(self):
         return False
+
+
+def get_trivia_dataframe(
+    trivia_data: list[tuple[str, str, LinkCell | None]],
+) -> "pd.DataFrame":
+    # pandas is slow to import, so it's left until a tab actually needs it.
+    import pandas as pd
+
+    descriptions = []
+    tidbit_info = []
+    optional_links = []
+    for description, tidbit, link in trivia_data:
+        descriptions.append(description)
+        tidbit_info.append(tidbit)
+        optional_links.append(link)
+
+    return pd.DataFrame(
+        {
+            "tidbit_description": descriptions,
+            "tidbit_info": tidbit_info,
+            "optional_link": optional_links,
+        }
+    )
+
+
+def get_trivia_tab_dataframes(
+    tabs: Sequence[TriviaTab],
+    activities: Iterator[DetailedActivity],
+    log_timings: bool = False,
+) -> dict[str, "pd.DataFrame"]:
+    """
+    Works out the tables for a few trivia tabs at once, only going through the
+    activities a single time. Returns each tab's table by its key.
+    """
+    # Like the processors themselves, this isn't imported until it's needed.
+    from backend.statistics.trivia import TriviaTimings, get_data_for_processors
+
+    timings = TriviaTimings() if log_timings else None
+    trivia_data = get_data_for_processors(
+        [tab.trivia_processor.get() for tab in tabs], activities, timings=timings
+    )
+    if timings is not None:
+        timings.log(", ".join(tab.name for tab in tabs))
+    return {
+        tab.get_key(): get_trivia_dataframe(data)
+        for tab, data in zip(tabs, trivia_data)
+    }
@@ -0,0 +1,260 @@
+"""
+Downloading all of an athlete's activities from Strava. Athletes with lots of
+activities can take longer to download than a single lambda invocation is allowed to
+run for, so the download is done one page at a time, and after each page we save the
+page to s3 and checkpoint how far we got. If we run low on time, or something goes
+wrong, the download can be started again and resume from the next page.
+"""
+
+import datetime as dt
+import logging
+from typing import Any, Callable, Optional
+
+from mypy_boto3_dynamodb.service_resource import Table
+from mypy_boto3_s3 import S3Client
+from requests.exceptions import HTTPError
+from stravalib.client import Client
+from stravalib.exc import ObjectNotFound, RateLimitExceeded
+from stravalib.model import SummaryActivity
+
+from backend.utils.dynamodb import (
+    DownloadStatusItem,
+    get_download_status_item_from_dynamo,
+    increment_data_version_in_dynamo,
+    save_download_checkpoint_to_dynamo,
+    save_download_status_to_dynamo,
+)
+from backend.utils.s3 import (
+    ACTIVITY_PAGES_PREFIX,
+    delete_partial_activities_from_s3,
+    get_partial_activities_from_s3,
+    save_partial_activities_to_s3,
+    save_raw_activities_to_s3,
+)
+
+logger = logging.getLogger(__name__)
+
+# The most activities Strava will give us in a single request.
+PAGE_SIZE = 200
+
+# If there's less time than this left in the lambda invocation, stop and hand over to
+# a new invocation. It needs to be long enough to fetch one more page, or to merge all
+# the pages and save them at the end.
+MINIMUM_REMAINING_SECONDS = 60
+
+
+def is_valid_raw_activity(raw_activity: dict[str, Any]) -> bool:
+    """
+    Checks only the things we actually rely on when putting downloads together and
+    reading them back: every activity has an id, a type, and a start date.
+    """
+    if not isinstance(raw_activity.get("id"), int):
+        return False
+    if not isinstance(raw_activity.get("type"), str):
+        return False
+    start_date = raw_activity.get("start_date")
+    if not isinstance(start_date, str):
+        return False
+    try:
+        dt.datetime.fromisoformat(start_date)
+    except ValueError:
+        return False
+    return True
+
+
+def get_raw_activity_page(
+    client: Client,
+    page: int,
+    before: Optional[dt.datetime] = None,
+    after: Optional[dt.datetime] = None,
+) -> list[dict[str, Any]]:
+    """
+    Fetches a single page of the athlete's activities, as the JSON Strava gives us.
+    This is what stravalib's get_activities() does under the hood, but it only lets
+    you start from page 1, and it turns every activity into a pydantic model, which we
+    would only turn straight back into JSON to save it.
+    """
+    return client.protocol.get(
+        "/athlete/activities",
+        page=page,
+        per_page=PAGE_SIZE,
+        before=int(before.timestamp()) if before else None,
+        after=int(after.timestamp()) if after else None,
+    )
+
+
+def get_valid_raw_activities(
+    raw_activities: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """
+    Drops anything that doesn't look like an activity, instead of failing the whole
+    download over it.
+    """
+    valid_activities = [raw for raw in raw_activities if is_valid_raw_activity(raw)]
+    if len(valid_activities) != len(raw_activities):
+        logger.warning(
+            f"Skipped {len(raw_activities) - len(valid_activities)} invalid activities."
+        )
+    return valid_activities
+
+
+def remove_duplicate_activities(
+    raw_activities: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """
+    Keeps the first of any activities with the same id, without changing the order.
+    """
+    activities_by_id: dict[int, dict[str, Any]] = {}
+    for raw_activity in raw_activities:
+        activities_by_id.setdefault(raw_activity["id"], raw_activity)
+    return list(activities_by_id.values())
+
+
+def get_activity(client: Client, activity_id: int) -> Optional[SummaryActivity]:
+    """
+    Fetches a single activity, or returns None if it doesn't exist (anymore). Strava
+    gives us a detailed activity, but we only keep the summary parts of it.
+    """
+    try:
+        raw_activity = client.protocol.get("/activities/{id}", id=activity_id)
+    except ObjectNotFound:
+        return None
+    return SummaryActivity.model_validate({**raw_activity, "bound_client": client})
+
+
+def get_estimated_total_activities(client: Client, athlete_id: int) -> Optional[int]:
+    """
+    Returns the number of runs, rides and swims the athlete has done, or None if we
+    can't get their stats. This is only used for showing progress, so it's never
+    worth failing a download over.
+    """
+    try:
+        stats = client.get_athlete_stats(athlete_id)
+    except (HTTPError, RateLimitExceeded) as e:
+        logger.warning(f"Couldn't get stats for athlete {athlete_id}: {e}")
+        return None
+
+    totals = [stats.all_run_totals, stats.all_ride_totals, stats.all_swim_totals]
+    return sum(total.count or 0 for total in totals if total is not None)
+
+
+def download_activities(
+    client: Client,
+    s3_client: S3Client,
+    download_status_table: Table,
+    athlete_id: int,
+    resume: bool = False,
+    get_remaining_seconds: Optional[Callable[[], float]] = None,
+    estimated_total_activities: Optional[int] = None,
+    download_status_item: Optional[DownloadStatusItem] = None,
+) -> bool:
+    """
+    Downloads the athlete's activities page by page, saving each page to s3 and
+    checkpointing as it goes. Once every page has been downloaded, they're all merged
+    and saved as the athlete's data.
+
+    If resume is True, the download carries on from the last checkpoint, if there is
+    one. If get_remaining_seconds is given and the time runs low, the download stops
+    after checkpointing, and False is returned so the caller can hand over to a fresh
+    invocation. Returns True once the download is complete. If the caller has already
+    estimated how many activities there are, it can be passed in to save a request,
+    and the same goes for the athlete's download status when resuming.
+    """
+    if resume and download_status_item is None:
+        download_status_item = get_download_status_item_from_dynamo(
+            download_status_table, athlete_id
+        )
+    elif not resume:
+        download_status_item = None
+
+    if download_status_item is not None and download_status_item.has_checkpoint():
+        # If activities were uploaded or deleted since the last invocation, Strava's
+        # pages will have moved a bit, so go back a page to make sure nothing falls in
+        # the gap. Anything we end up with twice is removed when the pages are merged.
+        next_page = max(download_status_item.next_page - 1, 1)
+        pages_persisted = download_status_item.pages_persisted
+        activities_downloaded = download_status_item.activities_downloaded
+        estimated_total_activities = download_status_item.estimated_total_activities
+        print(f"Resuming download from page {next_page}.")
+    else:
+        delete_partial_activities_from_s3(s3_client, ACTIVITY_PAGES_PREFIX, athlete_id)
+        next_page = 1
+        pages_persisted = 0
+        activities_downloaded = 0
+        save_download_checkpoint_to_dynamo(
+            download_status_table,
+            athlete_id,
+            dt.datetime.now(dt.timezone.utc),
+            "Starting download.",
+            next_page=next_page,
+            pages_persisted=pages_persisted,
+            activities_downloaded=activities_downloaded,
+            estimated_total_activities=None,
+        )
+        # Strava doesn't tell us how many activities an athlete has, but their stats
+        # give us a rough (lower bound) estimate to show progress against.
+        if estimated_total_activities is None:
+            estimated_total_activities = get_estimated_total_activities(
+                client, athlete_id
+            )
+
+    while True:
+        if (
+            get_remaining_seconds is not None
+            and get_remaining_seconds() < MINIMUM_REMAINING_SECONDS
+        ):
+            print(f"Running out of time, stopping before page {next_page}.")
+            return False
+
+        raw_page = get_raw_activity_page(client, next_page)
+        page_activities = get_valid_raw_activities(raw_page)
+        if page_activities:
+            pages_persisted += 1
+            save_partial_activities_to_s3(
+                s3_client,
+                ACTIVITY_PAGES_PREFIX,
+                athlete_id,
+                pages_persisted,
+                page_activities,
+            )
+            activities_downloaded += len(page_activities)
+
+        next_page += 1
+        print(f"{activities_downloaded} activities downloaded so far.")
+        save_download_checkpoint_to_dynamo(
+            download_status_table,
+            athlete_id,
+            dt.datetime.now(dt.timezone.utc),
+            f"{activities_downloaded} activities downloaded so far.",
+            next_page=next_page,
+            pages_persisted=pages_persisted,
+            activities_downloaded=activities_downloaded,
+            estimated_total_activities=estimated_total_activities,
+        )
+
+        if len(raw_page) < PAGE_SIZE:
+            break
+
+    raw_activities = remove_duplicate_activities(
+        get_partial_activities_from_s3(
+            s3_client, ACTIVITY_PAGES_PREFIX, athlete_id, pages_persisted
+        )
+    )
+    activities_downloaded = len(raw_activities)
+    save_raw_activities_to_s3(s3_client, athlete_id, raw_activities)
+    delete_partial_activities_from_s3(s3_client, ACTIVITY_PAGES_PREFIX, athlete_id)
+
+    print(f"All {activities_downloaded} activities saved to s3.")
+    save_download_status_to_dynamo(
+        download_status_table,
+        athlete_id,
+        dt.datetime.now(dt.timezone.utc),
+        f"All {activities_downloaded} activities saved to s3.",
+        error=False,
+        complete=True,
+        activities_downloaded=activities_downloaded,
+        estimated_total_activities=estimated_total_activities,
+    )
+    # Anything worked out from their old data is now out of date.
+    increment_data_version_in_dynamo(download_status_table, athlete_id)
+    return True
@@ -0,0 +1,65 @@
+"""
+A few tabs (or browser windows) polling /api/data_status at the same time could each
+decide the athlete needs a download, and start one each. Now, whoever wants to start
+a download has to win the lease on the athlete's download status first (see
+acquire_download_lease_in_dynamo), and everyone else just reports the progress of the
+download that's already going.
+
+We also count how often leases are won and lost, so we can see how often this happens.
+"""
+
+import dataclasses
+import datetime as dt
+import secrets
+import threading
+from typing import Optional
+
+from mypy_boto3_dynamodb.service_resource import Table
+
+from backend.utils.dynamodb import acquire_download_lease_in_dynamo
+
+
+@dataclasses.dataclass
+class DownloadLeaseCounters:
+    acquired: int = 0
+    # Times someone wanted to start a download, but one was already running.
+    contended: int = 0
+
+    def __post_init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def record(self, acquired: bool) -> None:
+        with self._lock:
+            if acquired:
+                self.acquired += 1
+            else:
+                self.contended += 1
+
+
+download_lease_counters = DownloadLeaseCounters()
+
+
+def try_acquire_download_lease(
+    download_status_table: Table,
+    athlete_id: int,
+    now: dt.datetime,
+    status: str,
+    counters: DownloadLeaseCounters = download_lease_counters,
+    refreshing: bool = False,
+) -> Optional[str]:
+    """
+    Tries to take the lease on the athlete's download. Returns the new owner's id if
+    we got it, which the download should hold on to, or None if a download is already
+    running.
+    """
+    owner = secrets.token_urlsafe(16)
+    acquired = acquire_download_lease_in_dynamo(
+        download_status_table, athlete_id, owner, now, status, refreshing
+    )
+    counters.record(acquired)
+    print(
+        f"Download lease for athlete {athlete_id} "
+        f"{'acquired' if acquired else 'contended'} "
+        f"({counters.acquired} acquired, {counters.contended} contended)."
+    )
+    return owner if acquired else None
@@ -0,0 +1,104 @@
+"""
+Helpers for pushing download progress to the frontend as Server-Sent Events, instead
+of making it poll /api/data_status every few seconds. Each poll costs a session lookup
+and a download status lookup, but the stream only resolves the session once, and then
+only re-reads the download status item.
+
+This only works when we're served by uvicorn (locally). In prod, Mangum runs the app
+behind API Gateway, which has to have the whole response before it sends any of it.
+So the events would all turn up at once when the stream closed, and every open stream
+would keep a lambda busy the whole time. The frontend polls in prod instead.
+"""
+
+import asyncio
+import dataclasses
+import json
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from backend.communication_schema import DownloadProgressMessage
+from backend.utils.dynamodb import DownloadStatusItem
+
+# How often the stream re-reads the download status item.
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+
+# Close the stream every so often and let the browser's EventSource reconnect, so a
+# stream can't be left open forever by a tab nobody is looking at.
+DEFAULT_MAX_STREAM_SECONDS = 25.0
+
+# How long the browser should wait before reconnecting after we close the stream.
+RECONNECT_DELAY_MS = 1000
+
+
+def get_download_progress_message(
+    download_status_item: Optional[DownloadStatusItem],
+) -> DownloadProgressMessage:
+    """
+    Converts a download status item into the message we send to the frontend.
+    """
+    if download_status_item is None:
+        return DownloadProgressMessage(
+            message="Waiting for download to start...",
+            downloaded=False,
+            error=False,
+            activities_downloaded=0,
+            estimated_total_activities=None,
+            percent_complete=None,
+        )
+
+    downloaded = download_status_item.complete and not download_status_item.error
+    return DownloadProgressMessage(
+        message="Data downloaded." if downloaded else download_status_item.status,
+        downloaded=downloaded,
+        error=download_status_item.error,
+        activities_downloaded=download_status_item.activities_downloaded,
+        estimated_total_activities=download_status_item.estimated_total_activities,
+        percent_complete=download_status_item.get_percent_complete(),
+    )
+
+
+def format_server_sent_event(
+    data: DownloadProgressMessage, event: Optional[str] = None
+) -> str:
+    """
+    Formats a message in the text/event-stream wire format.
+    """
+    lines = []
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(dataclasses.asdict(data))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_download_progress(
+    get_download_status_item: Callable[[], Optional[DownloadStatusItem]],
+    poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+    max_stream_seconds: float = DEFAULT_MAX_STREAM_SECONDS,
+) -> AsyncIterator[str]:
+    """
+    Yields server-sent events describing the download progress. An event is only sent
+    when the progress changes. The stream ends with a "done" event once the download
+    has completed (successfully or not), or silently when it hits the maximum stream
+    duration, in which case the client is expected to reconnect.
+    """
+    yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+
+    deadline = time.monotonic() + max_stream_seconds
+    last_message: Optional[DownloadProgressMessage] = None
+
+    while True:
+        download_status_item = await asyncio.to_thread(get_download_status_item)
+        message = get_download_progress_message(download_status_item)
+
+        if download_status_item is not None and download_status_item.complete:
+            yield format_server_sent_event(message, event="done")
+            return
+
+        if message != last_message:
+            yield format_server_sent_event(message)
+            last_message = message
+
+        if time.monotonic() + poll_interval > deadline:
+            return
+
+        await asyncio.sleep(poll_interval)
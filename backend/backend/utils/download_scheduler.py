@@ -0,0 +1,542 @@
+"""
+Every user of the app shares the same Strava rate limits (a 15 minute limit, and a
+daily limit). If a bunch of people sign up at once and all start downloads, they all
+hit the limit and everyone's download fails. Instead of starting downloads immediately,
+we queue them up, keep track of how much of the quota is left, and only start as many
+downloads as the quota allows. Anyone left in the queue is told roughly when their
+download will start.
+
+In prod, the queue is kept in dynamodb and the quota's reservations in the shared
+quota (backend.utils.rate_limiter), so every container sees the same queue, and any of
+them can start the next download when someone checks on theirs.
+"""
+
+import dataclasses
+import datetime as dt
+import enum
+import heapq
+import itertools
+import math
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, Callable, Literal, Optional
+
+from botocore.exceptions import ClientError
+from mypy_boto3_dynamodb.service_resource import Table
+from stravalib.protocol import RequestMethod
+from stravalib.util.limiter import (
+    RateLimiter,
+    SleepingRateLimitRule,
+    get_rates_from_response_headers,
+)
+
+if TYPE_CHECKING:
+    from backend.utils.rate_limiter import SharedStravaQuota
+
+# Strava's default read limits for an app.
+DEFAULT_SHORT_LIMIT = 100
+DEFAULT_LONG_LIMIT = 1000
+
+SHORT_WINDOW = dt.timedelta(minutes=15)
+
+# How often to ask other containers how much of the quota they've used. Asking isn't
+# free, and the queue gets checked every time someone polls their download status.
+USAGE_REFRESH_INTERVAL = dt.timedelta(seconds=5)
+
+# Strava returns up to 200 activities per page.
+ACTIVITIES_PER_PAGE = 200
+
+# If we don't know how many activities someone has, guess they need this many
+# requests. This is about 1000 activities.
+DEFAULT_ESTIMATED_REQUESTS = 5
+
+
+class SyncPriority(enum.IntEnum):
+    """
+    Lower values are started first. People sitting in front of the loading screen for
+    the first time get to go before people who just need their old data refreshed.
+    """
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+@dataclasses.dataclass
+class SyncJob:
+    athlete_id: int
+    session_token: str
+    priority: SyncPriority
+    enqueued_at: dt.datetime
+    estimated_requests: int = DEFAULT_ESTIMATED_REQUESTS
+    # Whether to carry on from the last checkpoint of a previous download.
+    resume: bool = False
+    # Who holds the lease on the athlete's download.
+    lease_owner: Optional[str] = None
+    # How many requests were reserved from the shared quota when the job was started.
+    reserved_requests: int = 0
+
+
+def estimate_requests_for_download(estimated_total_activities: Optional[int]) -> int:
+    """
+    Returns roughly how many Strava API requests a full download will take. One for
+    each page of activities, plus one for the final empty page.
+    """
+    if estimated_total_activities is None:
+        return DEFAULT_ESTIMATED_REQUESTS
+    return math.ceil(estimated_total_activities / ACTIVITIES_PER_PAGE) + 1
+
+
+class SyncJobQueue(ABC):
+    """
+    A priority queue of sync jobs. Jobs are ordered by priority, and then by the order
+    they were added. There is only ever one job per athlete in the queue.
+    """
+
+    @abstractmethod
+    def push(self, job: SyncJob) -> None:
+        """
+        Adds a job to the queue. If the athlete already has a job queued, it is
+        replaced, keeping the more urgent of the two priorities.
+        """
+        pass
+
+    @abstractmethod
+    def peek(self) -> Optional[SyncJob]:
+        """
+        Returns the next job to run without removing it.
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, athlete_id: int) -> Optional[SyncJob]:
+        """
+        Removes and returns an athlete's job, or returns None if they don't have one
+        queued (like when someone else has just started it).
+        """
+        pass
+
+    def pop(self) -> Optional[SyncJob]:
+        """
+        Removes and returns the next job to run.
+        """
+        while (job := self.peek()) is not None:
+            removed_job = self.remove(job.athlete_id)
+            if removed_job is not None:
+                return removed_job
+        return None
+
+    @abstractmethod
+    def get_jobs(self) -> list[SyncJob]:
+        """
+        Returns all the queued jobs in the order they will be run.
+        """
+        pass
+
+    def __len__(self) -> int:
+        return len(self.get_jobs())
+
+
+class InMemorySyncJobQueue(SyncJobQueue):
+    """
+    A queue that lives in the memory of the current process. This is good enough for
+    running locally and in tests, but on lambda each container would have its own, so
+    prod uses DynamoDBSyncJobQueue.
+    """
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, dt.datetime, int, int, SyncJob]] = []
+        self._jobs_by_athlete: dict[int, SyncJob] = {}
+        # Breaks ties between jobs added at the same time. A replaced job keeps the
+        # sequence number of the job it replaced, so it doesn't lose its place.
+        self._sequence_by_athlete: dict[int, int] = {}
+        self._counter = itertools.count()
+        # Every heap entry also gets its own number, after everything else, so that a
+        # replaced job and the job it replaced never tie, and the heap never has to
+        # compare the jobs themselves.
+        self._entry_counter = itertools.count()
+
+    def push(self, job: SyncJob) -> None:
+        existing_job = self._jobs_by_athlete.get(job.athlete_id)
+        if existing_job is not None:
+            job = dataclasses.replace(
+                job,
+                priority=min(job.priority, existing_job.priority),
+                enqueued_at=min(job.enqueued_at, existing_job.enqueued_at),
+            )
+        else:
+            self._sequence_by_athlete[job.athlete_id] = next(self._counter)
+
+        self._jobs_by_athlete[job.athlete_id] = job
+        heapq.heappush(
+            self._heap,
+            (
+                job.priority,
+                job.enqueued_at,
+                self._sequence_by_athlete[job.athlete_id],
+                next(self._entry_counter),
+                job,
+            ),
+        )
+
+    def _discard_stale_entries(self) -> None:
+        """
+        Replaced jobs are left in the heap and skipped over lazily.
+        """
+        while self._heap:
+            job = self._heap[0][4]
+            if self._jobs_by_athlete.get(job.athlete_id) is job:
+                return
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[SyncJob]:
+        self._discard_stale_entries()
+        return self._heap[0][4] if self._heap else None
+
+    def remove(self, athlete_id: int) -> Optional[SyncJob]:
+        # Its heap entry is left behind, and skipped over like a replaced job's.
+        self._sequence_by_athlete.pop(athlete_id, None)
+        return self._jobs_by_athlete.pop(athlete_id, None)
+
+    def get_jobs(self) -> list[SyncJob]:
+        return [
+            job
+            for _, _, _, _, job in sorted(self._heap)
+            if self._jobs_by_athlete.get(job.athlete_id) is job
+        ]
+
+
+class DynamoDBSyncJobQueue(SyncJobQueue):
+    """
+    A queue kept in a dynamodb table, with an item for each athlete's job, so that every
+    container shares it and nothing is lost when a container goes away. The queue is
+    only ever long while the quota is used up, so it's just read in full and sorted.
+    """
+
+    def __init__(self, table: Table) -> None:
+        self.table = table
+
+    def push(self, job: SyncJob) -> None:
+        # Only whoever holds the athlete's download lease queues their download, so
+        # two containers never replace the same job at once.
+        response = self.table.get_item(
+            Key={"athlete_id": job.athlete_id}, ConsistentRead=True
+        )
+        if "Item" in response:
+            existing_job = get_sync_job_from_item(response["Item"])
+            job = dataclasses.replace(
+                job,
+                priority=min(job.priority, existing_job.priority),
+                enqueued_at=min(job.enqueued_at, existing_job.enqueued_at),
+            )
+
+        try:
+            self.table.put_item(Item=get_item_from_sync_job(job))
+        except ClientError as e:
+            print(f"Error queueing download: {e.response['Error']['Message']}")
+            raise e
+
+    def peek(self) -> Optional[SyncJob]:
+        jobs = self.get_jobs()
+        return jobs[0] if jobs else None
+
+    def remove(self, athlete_id: int) -> Optional[SyncJob]:
+        # The delete is what decides who gets the job, since only one container can
+        # delete the item.
+        try:
+            response = self.table.delete_item(
+                Key={"athlete_id": athlete_id},
+                ConditionExpression="attribute_exists(athlete_id)",
+                ReturnValues="ALL_OLD",
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return None
+            print(f"Error removing queued download: {e.response['Error']['Message']}")
+            raise e
+        return get_sync_job_from_item(response["Attributes"])
+
+    def get_jobs(self) -> list[SyncJob]:
+        items: list[dict[str, Any]] = []
+        scan_kwargs: dict[str, Any] = {"ConsistentRead": True}
+        while True:
+            response = self.table.scan(**scan_kwargs)
+            items.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                break
+            scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        return sorted(
+            (get_sync_job_from_item(item) for item in items),
+            key=lambda job: (job.priority, job.enqueued_at, job.athlete_id),
+        )
+
+
+def get_item_from_sync_job(job: SyncJob) -> dict[str, Any]:
+    item: dict[str, Any] = {
+        "athlete_id": job.athlete_id,
+        "session_token": job.session_token,
+        "priority": int(job.priority),
+        "enqueued_at": Decimal(str(job.enqueued_at.timestamp())),
+        "estimated_requests": job.estimated_requests,
+        "resume": job.resume,
+    }
+    if job.lease_owner is not None:
+        item["lease_owner"] = job.lease_owner
+    return item
+
+
+def get_sync_job_from_item(item: dict[str, Any]) -> SyncJob:
+    return SyncJob(
+        athlete_id=int(item["athlete_id"]),
+        session_token=item["session_token"],
+        priority=SyncPriority(int(item["priority"])),
+        enqueued_at=dt.datetime.fromtimestamp(
+            float(item["enqueued_at"]), tz=dt.timezone.utc
+        ),
+        estimated_requests=int(item["estimated_requests"]),
+        resume=item["resume"],
+        lease_owner=item.get("lease_owner"),
+    )
+
+
+def get_start_of_next_short_window(now: dt.datetime) -> dt.datetime:
+    """
+    Strava's 15 minute limits reset on the quarter hour.
+    """
+    start_of_window = now.replace(
+        minute=(now.minute // 15) * 15, second=0, microsecond=0
+    )
+    return start_of_window + SHORT_WINDOW
+
+
+def get_start_of_next_long_window(now: dt.datetime) -> dt.datetime:
+    """
+    Strava's daily limits reset at midnight UTC.
+    """
+    now = now.astimezone(dt.timezone.utc)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0) + dt.timedelta(days=1)
+
+
+class StravaQuota:
+    """
+    Keeps track of how much of the app's Strava quota has been used, as far as this
+    container knows, for guessing when queued downloads will start. Strava tells us
+    the app-wide usage in the headers of every response, and the shared quota knows
+    about every container's requests and reservations, so it's kept up to date from
+    those. Reserving requests for downloads is done in the shared quota, so that
+    refreshing this can never lose a reservation.
+    """
+
+    def __init__(
+        self,
+        short_limit: int = DEFAULT_SHORT_LIMIT,
+        long_limit: int = DEFAULT_LONG_LIMIT,
+    ) -> None:
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        self.short_usage = 0
+        self.long_usage = 0
+        self._short_window_end: Optional[dt.datetime] = None
+        self._long_window_end: Optional[dt.datetime] = None
+        self._last_refresh: Optional[dt.datetime] = None
+
+    def _roll_windows(self, now: dt.datetime) -> None:
+        """
+        Resets the usage counters if their window has passed.
+        """
+        if self._short_window_end is None or now >= self._short_window_end:
+            self.short_usage = 0
+            self._short_window_end = get_start_of_next_short_window(now)
+        if self._long_window_end is None or now >= self._long_window_end:
+            self.long_usage = 0
+            self._long_window_end = get_start_of_next_long_window(now)
+
+    def update_usage(
+        self,
+        now: dt.datetime,
+        short_usage: int,
+        long_usage: int,
+        short_limit: Optional[int] = None,
+        long_limit: Optional[int] = None,
+    ) -> None:
+        """
+        Updates the usage from what Strava has told us.
+        """
+        self._roll_windows(now)
+        self.short_usage = short_usage
+        self.long_usage = long_usage
+        if short_limit is not None:
+            self.short_limit = short_limit
+        if long_limit is not None:
+            self.long_limit = long_limit
+
+    def refresh_usage(
+        self, get_usage: Callable[[dt.datetime], tuple[int, int]], now: dt.datetime
+    ) -> None:
+        """
+        Updates the usage from somewhere that's slow to ask (like the quota shared by
+        every container), but only if it hasn't been asked in the last few seconds.
+        """
+        if (
+            self._last_refresh is not None
+            and now - self._last_refresh < USAGE_REFRESH_INTERVAL
+        ):
+            return
+        self.update_usage(now, *get_usage(now))
+        self._last_refresh = now
+
+    def mark_exhausted(self, now: dt.datetime) -> None:
+        """
+        Called when Strava tells us we've hit the limit, without telling us which one.
+        Assume the 15 minute one, since that's the most likely.
+        """
+        self._roll_windows(now)
+        self.short_usage = self.short_limit
+
+    def get_remaining(self, now: dt.datetime) -> int:
+        """
+        Returns how many requests can be made right now without hitting either limit.
+        """
+        self._roll_windows(now)
+        return max(
+            min(
+                self.short_limit - self.short_usage,
+                self.long_limit - self.long_usage,
+            ),
+            0,
+        )
+
+    def get_time_until_available(self, requests: int, now: dt.datetime) -> dt.timedelta:
+        """
+        Estimates how long until a given number of requests (on top of what's been
+        used already) could have been made, assuming the quota is spent as fast as
+        possible.
+        """
+        self._roll_windows(now)
+        assert self._short_window_end is not None
+        assert self._long_window_end is not None
+
+        long_remaining = self.long_limit - self.long_usage
+        if requests > long_remaining:
+            # We won't get there today. Start again tomorrow with fresh limits.
+            tomorrow = self._long_window_end
+            fresh_quota = StravaQuota(self.short_limit, self.long_limit)
+            return (tomorrow - now) + fresh_quota.get_time_until_available(
+                requests - max(long_remaining, 0), tomorrow
+            )
+
+        short_remaining = self.short_limit - self.short_usage
+        if requests <= short_remaining:
+            return dt.timedelta(0)
+
+        extra_windows = math.ceil((requests - short_remaining) / self.short_limit)
+        return (self._short_window_end - now) + SHORT_WINDOW * (extra_windows - 1)
+
+
+class QuotaTrackingRateLimiter(RateLimiter):
+    """
+    A stravalib rate limiter that keeps the shared quota up to date with the usage
+    Strava reports in every response, on top of stravalib's normal throttling.
+    """
+
+    def __init__(
+        self,
+        quota: StravaQuota,
+        priority: Literal["low", "medium", "high"] = "high",
+    ) -> None:
+        super().__init__()
+        self.quota = quota
+        self.rules.append(SleepingRateLimitRule(priority=priority))
+        self.rules.append(self._update_quota)
+
+    def _update_quota(
+        self, response_headers: dict[str, str], method: RequestMethod
+    ) -> None:
+        rates = get_rates_from_response_headers(response_headers, method)
+        if rates is not None:
+            self.quota.update_usage(
+                dt.datetime.now(dt.timezone.utc),
+                rates.short_usage,
+                rates.long_usage,
+                rates.short_limit,
+                rates.long_limit,
+            )
+
+
+class DownloadScheduler:
+    """
+    Decides when queued downloads are allowed to start. Jobs are only started while
+    there is enough quota for them, in priority order. A job that doesn't fit blocks
+    everything behind it, so that big downloads don't get starved by small ones.
+    """
+
+    def __init__(
+        self,
+        queue: SyncJobQueue,
+        quota: StravaQuota,
+        shared_quota: "SharedStravaQuota",
+    ) -> None:
+        self.queue = queue
+        self.quota = quota
+        self.shared_quota = shared_quota
+
+    def submit(self, job: SyncJob) -> None:
+        self.queue.push(job)
+
+    def dispatch_ready_jobs(
+        self, dispatch: Callable[[SyncJob], None], now: dt.datetime
+    ) -> list[SyncJob]:
+        """
+        Starts as many jobs as the quota currently allows, returning them. Each job's
+        requests are reserved in the shared quota before it starts.
+        """
+        dispatched_jobs: list[SyncJob] = []
+        while (job := self.queue.peek()) is not None:
+            reserved_requests = self.shared_quota.try_reserve(
+                job.estimated_requests, now
+            )
+            if reserved_requests is None:
+                break
+
+            removed_job = self.queue.remove(job.athlete_id)
+            if removed_job is None:
+                # Another container started it first.
+                self.shared_quota.release(reserved_requests, now)
+                continue
+
+            job = dataclasses.replace(removed_job, reserved_requests=reserved_requests)
+            dispatch(job)
+            dispatched_jobs.append(job)
+
+        if dispatched_jobs:
+            # So the guesses for everyone still waiting count what was just reserved.
+            self.quota.update_usage(now, *self.shared_quota.get_usage(now))
+        return dispatched_jobs
+
+    def get_estimated_start_time(
+        self, athlete_id: int, now: dt.datetime
+    ) -> Optional[dt.datetime]:
+        """
+        Returns roughly when an athlete's queued download will start, or None if they
+        don't have one queued. Every job ahead of theirs needs its requests first.
+        """
+        requests_ahead = 0
+        for job in self.queue.get_jobs():
+            if job.athlete_id == athlete_id:
+                # Their own job needs to at least partially fit too.
+                requests_needed = requests_ahead + min(
+                    job.estimated_requests, self.quota.short_limit
+                )
+                return now + self.quota.get_time_until_available(requests_needed, now)
+            requests_ahead += job.estimated_requests
+        return None
+
+    def get_queue_position(self, athlete_id: int) -> Optional[int]:
+        """
+        Returns how many jobs are ahead of the athlete's, or None if they don't have
+        one queued.
+        """
+        for position, job in enumerate(self.queue.get_jobs()):
+            if job.athlete_id == athlete_id:
+                return position
+        return None
@@ -1,13 +1,44 @@
 import datetime as dt
+import time
+from typing import Any, NamedTuple, Optional
 
+from boto3.dynamodb.conditions import Key
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from fastapi import HTTPException
 from mypy_boto3_dynamodb.service_resource import Table
+from mypy_boto3_dynamodb.type_defs import KeysAndAttributesTypeDef
 from pydantic import BaseModel
 from stravalib.protocol import AccessInfo
 
 TTL_TIME_IN_FUTURE = 7 * 24 * 60 * 60  # Number of seconds in a week
 
+ATHLETE_ID_INDEX_NAME = "athlete_id-index"
+
+# Only one download per athlete can run at a time. Whoever starts one holds a lease on
+# the athlete's download status for this long, and every bit of progress the download
+# makes extends it. If the lease runs out, the download must have died.
+DOWNLOAD_LEASE_DURATION = dt.timedelta(minutes=10)
+
+# Once a job has been sent to apply an athlete's webhook events, any more events that
+# arrive leave them to that job. If it still hasn't taken them after this long, it
+# must have been lost, and the next event sends another one.
+WEBHOOK_FLUSH_TIMEOUT = dt.timedelta(minutes=10)
+
+# Every table in a container shares the one low level client, and a fanned out download
+# can have plenty of threads talking to dynamodb at once, so give it enough connections
+# to go around and keep them alive between requests.
+DYNAMODB_CLIENT_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    connect_timeout=2,
+    retries={"max_attempts": 5, "mode": "standard"},
+)
+
+# DynamoDB doesn't promise to read every key in a batch, so the leftovers are retried
+# this many times before giving up.
+BATCH_GET_MAX_RETRIES = 5
+
 
 class UserTableItem(BaseModel):
     session_token: str
@@ -24,6 +55,55 @@ class DownloadStatusItem(BaseModel):
     ttl: dt.datetime
     error: bool
     complete: bool
+    activities_downloaded: int = 0
+    estimated_total_activities: Optional[int] = None
+    rate_limited: bool = False
+    next_page: int = 1
+    pages_persisted: int = 0
+    windows_total: int = 0
+    windows_complete: int = 0
+    # Bumped whenever the athlete's stored data changes, so anything worked out from
+    # the old data knows it's out of date.
+    data_version: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[dt.datetime] = None
+    # Whether the running download is replacing data the athlete already has. Until
+    # it finishes, they can keep using the old data.
+    refreshing: bool = False
+
+    def has_checkpoint(self) -> bool:
+        """
+        Whether a previous download got part of the way through, and can be resumed.
+        """
+        finished = self.complete and not self.error
+        return self.next_page > 1 and not finished
+
+    def get_percent_complete(self) -> Optional[int]:
+        """
+        How far through the download we are, as a whole number percentage. The
+        estimated total comes from the athlete's Strava stats, which only count runs,
+        rides and swims, so it's a lower bound. Because of that, we never claim 100%
+        until the download is actually complete.
+        """
+        if self.complete and not self.error:
+            return 100
+        if self.windows_total:
+            # Downloads split up by date range know exactly how far through they are.
+            return min(int(self.windows_complete / self.windows_total * 100), 99)
+        if not self.estimated_total_activities:
+            return None
+        fraction = self.activities_downloaded / self.estimated_total_activities
+        return min(int(fraction * 100), 99)
+
+    def is_lease_expired(self, now: dt.datetime) -> bool:
+        """
+        Whether whatever download was running has stopped making progress. Items from
+        before leases existed only have their last download time to go on.
+        """
+        lease_expires_at = self.lease_expires_at or (
+            self.last_download_time + DOWNLOAD_LEASE_DURATION
+        )
+        return now > lease_expires_at
 
 
 def save_user_data_to_dynamo(
@@ -55,7 +135,9 @@ def save_user_data_to_dynamo(
 
 def get_athlete_id_from_session_token(user_table: Table, session_token: str) -> int:
     try:
-        response = user_table.get_item(Key={"session_token": session_token})
+        response = user_table.get_item(
+            Key={"session_token": session_token}, ProjectionExpression="athlete_id"
+        )
     except ClientError as e:
         raise HTTPException(status_code=500, detail=f"DynamoDB error: {str(e)}")
 
@@ -74,12 +156,56 @@ def get_user_data_row_for_athlete(
 
     if "Item" not in response:
         raise Exception(f"Can't find athlete with session token: {session_token}")
+    return get_user_table_item_from_attributes(response["Item"])
+
+
+# Everything get_user_table_item_from_attributes reads, for when only those are needed.
+USER_TABLE_ITEM_ATTRIBUTES = [
+    "session_token",
+    "athlete_id",
+    "access_token",
+    "refresh_token",
+    "expires_at",
+]
+
+
+def get_user_table_item_from_attributes(attributes: dict[str, Any]) -> UserTableItem:
     return UserTableItem(
-        session_token=response["Item"]["session_token"],
-        athlete_id=response["Item"]["athlete_id"],
-        access_token=response["Item"]["access_token"],
-        refresh_token=response["Item"]["refresh_token"],
-        expires_at=response["Item"]["expires_at"],
+        session_token=attributes["session_token"],
+        athlete_id=attributes["athlete_id"],
+        access_token=attributes["access_token"],
+        refresh_token=attributes["refresh_token"],
+        expires_at=attributes["expires_at"],
+    )
+
+
+def get_user_data_row_for_athlete_id(
+    user_table: Table, athlete_id: int
+) -> Optional[UserTableItem]:
+    """
+    Finds a user row from an athlete id instead of a session token, for when Strava
+    tells us about an athlete without them being logged in. If they have logged in a
+    few times, the row with the freshest access token is returned.
+    """
+    try:
+        response = user_table.query(
+            IndexName=ATHLETE_ID_INDEX_NAME,
+            KeyConditionExpression=Key("athlete_id").eq(athlete_id),
+        )
+    except ClientError as e:
+        print(f"Error finding athlete {athlete_id}: {e.response['Error']['Message']}")
+        raise e
+
+    items = response.get("Items", [])
+    if not items:
+        return None
+    item = max(items, key=lambda item: int(item["expires_at"]))  # type: ignore
+    return UserTableItem(
+        session_token=item["session_token"],  # type: ignore
+        athlete_id=item["athlete_id"],  # type: ignore
+        access_token=item["access_token"],  # type: ignore
+        refresh_token=item["refresh_token"],  # type: ignore
+        expires_at=item["expires_at"],  # type: ignore
     )
 
 
@@ -90,6 +216,10 @@ def save_download_status_to_dynamo(
     status: str,
     error: bool,
     complete: bool,
+    activities_downloaded: int = 0,
+    estimated_total_activities: Optional[int] = None,
+    rate_limited: bool = False,
+    refreshing: bool = False,
 ) -> None:
     try:
         # Use the attributes from the Pydantic model
@@ -100,7 +230,11 @@ def save_download_status_to_dynamo(
                 "status_message = :status_message, "
                 "time_to_live = :time_to_live, "
                 "download_error = :download_error, "
-                "complete = :complete"
+                "complete = :complete, "
+                "activities_downloaded = :activities_downloaded, "
+                "estimated_total_activities = :estimated_total_activities, "
+                "rate_limited = :rate_limited, "
+                "refreshing = :refreshing"
             ),
             ExpressionAttributeValues={
                 ":last_download_time": int(download_time.timestamp()),
@@ -108,6 +242,10 @@ def save_download_status_to_dynamo(
                 ":time_to_live": int(download_time.timestamp()) + TTL_TIME_IN_FUTURE,
                 ":download_error": error,
                 ":complete": complete,
+                ":activities_downloaded": activities_downloaded,
+                ":estimated_total_activities": estimated_total_activities,
+                ":rate_limited": rate_limited,
+                ":refreshing": refreshing,
             },
             ReturnValues="ALL_NEW",
         )
@@ -117,6 +255,313 @@ def save_download_status_to_dynamo(
         raise e
 
 
+def save_download_error_to_dynamo(
+    download_status_table: Table,
+    athlete_id: int,
+    download_time: dt.datetime,
+    status: str,
+    rate_limited: bool = False,
+) -> None:
+    """
+    Marks a download as failed. Unlike save_download_status_to_dynamo, this leaves the
+    progress and checkpoint alone, so the download can be resumed later.
+    """
+    try:
+        _ = download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=(
+                "SET last_download_time = :last_download_time, "
+                "status_message = :status_message, "
+                "time_to_live = :time_to_live, "
+                "download_error = :download_error, "
+                "complete = :complete, "
+                "rate_limited = :rate_limited"
+            ),
+            ExpressionAttributeValues={
+                ":last_download_time": int(download_time.timestamp()),
+                ":status_message": status,
+                ":time_to_live": int(download_time.timestamp()) + TTL_TIME_IN_FUTURE,
+                ":download_error": True,
+                ":complete": True,
+                ":rate_limited": rate_limited,
+            },
+        )
+    except ClientError as e:
+        print(f"Error saving download error: {e.response['Error']['Message']}")
+        raise e
+
+
+def save_download_checkpoint_to_dynamo(
+    download_status_table: Table,
+    athlete_id: int,
+    download_time: dt.datetime,
+    status: str,
+    next_page: int,
+    pages_persisted: int,
+    activities_downloaded: int,
+    estimated_total_activities: Optional[int],
+) -> None:
+    """
+    Saves how far through a download we are, along with the usual status, so that an
+    interrupted download can be resumed from the next page.
+    """
+    try:
+        _ = download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=(
+                "SET last_download_time = :last_download_time, "
+                "status_message = :status_message, "
+                "time_to_live = :time_to_live, "
+                "download_error = :download_error, "
+                "complete = :complete, "
+                "activities_downloaded = :activities_downloaded, "
+                "estimated_total_activities = :estimated_total_activities, "
+                "rate_limited = :rate_limited, "
+                "next_page = :next_page, "
+                "pages_persisted = :pages_persisted, "
+                "windows_total = :windows_total, "
+                "lease_expires_at = :lease_expires_at "
+                "REMOVE fan_out_id"
+            ),
+            ExpressionAttributeValues={
+                ":last_download_time": int(download_time.timestamp()),
+                ":status_message": status,
+                ":time_to_live": int(download_time.timestamp()) + TTL_TIME_IN_FUTURE,
+                ":download_error": False,
+                ":complete": False,
+                ":activities_downloaded": activities_downloaded,
+                ":estimated_total_activities": estimated_total_activities,
+                ":rate_limited": False,
+                ":next_page": next_page,
+                ":pages_persisted": pages_persisted,
+                # A download done page by page isn't split into windows, so no
+                # window left over from an earlier fan out should count for anything.
+                ":windows_total": 0,
+                ":lease_expires_at": get_lease_expiry_timestamp(download_time),
+            },
+        )
+    except ClientError as e:
+        print(f"Error saving checkpoint for athlete: {e.response['Error']['Message']}")
+        raise e
+
+
+def get_lease_expiry_timestamp(now: dt.datetime) -> int:
+    return int((now + DOWNLOAD_LEASE_DURATION).timestamp())
+
+
+def acquire_download_lease_in_dynamo(
+    download_status_table: Table,
+    athlete_id: int,
+    owner: str,
+    now: dt.datetime,
+    status: str,
+    refreshing: bool = False,
+) -> bool:
+    """
+    Tries to take the lease on the athlete's download, which is only allowed if no
+    download is running. That's when there's no status yet, the last download finished
+    (or failed), or the lease holder has stopped making progress. The check and the
+    write happen in one conditional update, so only one caller can ever win. Returns
+    whether we got the lease.
+
+    refreshing should be True if the athlete already has data, which they can keep
+    using while the new download runs.
+    """
+    try:
+        download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=(
+                "SET last_download_time = :now, "
+                "status_message = :status_message, "
+                "time_to_live = :time_to_live, "
+                "download_error = :false, "
+                "complete = :false, "
+                "lease_owner = :owner, "
+                "lease_expires_at = :lease_expires_at, "
+                "refreshing = :refreshing"
+            ),
+            ConditionExpression=(
+                "attribute_not_exists(athlete_id) "
+                "OR complete = :true "
+                "OR lease_expires_at < :now "
+                "OR (attribute_not_exists(lease_expires_at) "
+                "AND last_download_time < :lease_start)"
+            ),
+            ExpressionAttributeValues={
+                ":now": int(now.timestamp()),
+                ":status_message": status,
+                ":time_to_live": int(now.timestamp()) + TTL_TIME_IN_FUTURE,
+                ":false": False,
+                ":true": True,
+                ":owner": owner,
+                ":lease_expires_at": get_lease_expiry_timestamp(now),
+                ":lease_start": int((now - DOWNLOAD_LEASE_DURATION).timestamp()),
+                ":refreshing": refreshing,
+            },
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        print(f"Error acquiring download lease: {e.response['Error']['Message']}")
+        raise e
+    return True
+
+
+# Everything get_download_status_item_from_attributes reads. Reading only these leaves
+# out things like the athlete's pending webhook events, which can get fairly big.
+DOWNLOAD_STATUS_ITEM_ATTRIBUTES = [
+    "athlete_id",
+    "last_download_time",
+    "status_message",
+    "time_to_live",
+    "download_error",
+    "complete",
+    "activities_downloaded",
+    "estimated_total_activities",
+    "rate_limited",
+    "next_page",
+    "pages_persisted",
+    "windows_total",
+    "windows_complete",
+    "data_version",
+    "lease_owner",
+    "lease_expires_at",
+    "refreshing",
+]
+
+
+def get_download_status_item_from_attributes(
+    attributes: dict[str, Any],
+) -> DownloadStatusItem:
+    return DownloadStatusItem(
+        athlete_id=attributes["athlete_id"],
+        last_download_time=dt.datetime.fromtimestamp(
+            int(attributes["last_download_time"]), tz=dt.timezone.utc
+        ),
+        status=attributes["status_message"],
+        ttl=attributes["time_to_live"],
+        error=attributes["download_error"],
+        complete=attributes["complete"],
+        activities_downloaded=attributes.get("activities_downloaded", 0),
+        estimated_total_activities=attributes.get("estimated_total_activities"),
+        rate_limited=attributes.get("rate_limited", False),
+        next_page=attributes.get("next_page", 1),
+        pages_persisted=attributes.get("pages_persisted", 0),
+        windows_total=attributes.get("windows_total", 0),
+        windows_complete=attributes.get("windows_complete", 0),
+        data_version=attributes.get("data_version", 0),
+        lease_owner=attributes.get("lease_owner"),
+        lease_expires_at=(
+            dt.datetime.fromtimestamp(
+                int(attributes["lease_expires_at"]), tz=dt.timezone.utc
+            )
+            if "lease_expires_at" in attributes
+            else None
+        ),
+        refreshing=attributes.get("refreshing", False),
+    )
+
+
+def save_fan_out_started_to_dynamo(
+    download_status_table: Table,
+    athlete_id: int,
+    download_time: dt.datetime,
+    status: str,
+    windows_total: int,
+    estimated_total_activities: Optional[int],
+    fan_out_id: str,
+) -> Optional[str]:
+    """
+    Resets the download status for a download that has been split up into date
+    windows, which are downloaded separately. fan_out_id tells this lot of windows
+    apart from any earlier ones. Returns the id of the previous fan out, if there was
+    one, so its windows can be cleaned up.
+    """
+    try:
+        response = download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=(
+                "SET last_download_time = :last_download_time, "
+                "status_message = :status_message, "
+                "time_to_live = :time_to_live, "
+                "download_error = :download_error, "
+                "complete = :complete, "
+                "activities_downloaded = :zero, "
+                "estimated_total_activities = :estimated_total_activities, "
+                "rate_limited = :rate_limited, "
+                "next_page = :one, "
+                "pages_persisted = :zero, "
+                "windows_total = :windows_total, "
+                "windows_complete = :zero, "
+                "fan_out_id = :fan_out_id, "
+                "lease_expires_at = :lease_expires_at"
+            ),
+            ExpressionAttributeValues={
+                ":last_download_time": int(download_time.timestamp()),
+                ":status_message": status,
+                ":time_to_live": int(download_time.timestamp()) + TTL_TIME_IN_FUTURE,
+                ":download_error": False,
+                ":complete": False,
+                ":estimated_total_activities": estimated_total_activities,
+                ":rate_limited": False,
+                ":windows_total": windows_total,
+                ":zero": 0,
+                ":one": 1,
+                ":fan_out_id": fan_out_id,
+                ":lease_expires_at": get_lease_expiry_timestamp(download_time),
+            },
+            ReturnValues="UPDATED_OLD",
+        )
+    except ClientError as e:
+        print(f"Error starting fan out download: {e.response['Error']['Message']}")
+        raise e
+
+    return response.get("Attributes", {}).get("fan_out_id")  # type: ignore
+
+
+def record_window_complete_in_dynamo(
+    download_status_table: Table,
+    athlete_id: int,
+    download_time: dt.datetime,
+    activities_in_window: int,
+    fan_out_id: str,
+) -> Optional[DownloadStatusItem]:
+    """
+    Atomically counts a finished date window, and the activities in it. Windows finish
+    in parallel, so the returned item is what tells a window whether it was the last.
+
+    The window is only counted if it belongs to the fan out that's running now. A
+    window from an earlier fan out can finish late, and it would otherwise count
+    towards the new one. Returns None if the window wasn't counted.
+    """
+    try:
+        response = download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=(
+                "SET last_download_time = :last_download_time, "
+                "lease_expires_at = :lease_expires_at "
+                "ADD windows_complete :one, "
+                "activities_downloaded :activities_in_window"
+            ),
+            ConditionExpression="fan_out_id = :fan_out_id",
+            ExpressionAttributeValues={
+                ":last_download_time": int(download_time.timestamp()),
+                ":lease_expires_at": get_lease_expiry_timestamp(download_time),
+                ":one": 1,
+                ":activities_in_window": activities_in_window,
+                ":fan_out_id": fan_out_id,
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        print(f"Error recording finished window: {e.response['Error']['Message']}")
+        raise e
+
+    return get_download_status_item_from_attributes(response["Attributes"])
+
+
 def get_download_status_item_from_dynamo(
     download_status_table: Table, athlete_id: int
 ) -> DownloadStatusItem | None:
@@ -132,13 +577,271 @@ def get_download_status_item_from_dynamo(
     if "Item" not in response:
         return None
     else:
-        return DownloadStatusItem(
-            athlete_id=response["Item"]["athlete_id"],
-            last_download_time=dt.datetime.fromtimestamp(
-                int(response["Item"]["last_download_time"]), tz=dt.timezone.utc
+        return get_download_status_item_from_attributes(response["Item"])
+
+
+def get_data_version_from_dynamo(download_status_table: Table, athlete_id: int) -> int:
+    """
+    Just the version of the athlete's data, without reading the rest of their status.
+    """
+    try:
+        response = download_status_table.get_item(
+            Key={"athlete_id": athlete_id}, ProjectionExpression="data_version"
+        )
+    except ClientError as e:
+        raise HTTPException(status_code=500, detail=f"DynamoDB error: {str(e)}")
+
+    return int(response.get("Item", {}).get("data_version", 0))  # type: ignore
+
+
+def get_user_row_and_download_status_from_dynamo(
+    user_table: Table,
+    download_status_table: Table,
+    session_token: str,
+    athlete_id: int,
+) -> tuple[UserTableItem, Optional[DownloadStatusItem]]:
+    """
+    Reads an athlete's user row and their download status in one round trip, for when
+    we already know both of their keys.
+    """
+    user_attributes, download_status_attributes = batch_get_items_from_dynamo(
+        [
+            BatchGetRequest(
+                user_table, {"session_token": session_token}, USER_TABLE_ITEM_ATTRIBUTES
             ),
-            status=response["Item"]["status_message"],
-            ttl=response["Item"]["time_to_live"],
-            error=response["Item"]["download_error"],
-            complete=response["Item"]["complete"],
+            # The download status has to be up to date, because it's used to check
+            # whether the download still holds the lease. A stale read can still have
+            # the last download's lease_owner, and make the new one give up.
+            BatchGetRequest(
+                download_status_table,
+                {"athlete_id": athlete_id},
+                DOWNLOAD_STATUS_ITEM_ATTRIBUTES,
+                consistent_read=True,
+            ),
+        ]
+    )
+    if user_attributes is None:
+        raise Exception(f"Can't find athlete with session token: {session_token}")
+
+    return get_user_table_item_from_attributes(user_attributes), (
+        get_download_status_item_from_attributes(download_status_attributes)
+        if download_status_attributes is not None
+        else None
+    )
+
+
+class BatchGetRequest(NamedTuple):
+    table: Table
+    key: dict[str, Any]
+    # The only attributes to read, or None for all of them.
+    attributes: Optional[list[str]] = None
+    # Reads are eventually consistent unless this is set.
+    consistent_read: bool = False
+
+
+def batch_get_items_from_dynamo(
+    requests: list[BatchGetRequest],
+) -> list[Optional[dict[str, Any]]]:
+    """
+    Reads a few items from any number of tables in a single BatchGetItem. The items
+    are returned in the same order as the requests, with None for any that don't
+    exist.
+
+    Every table must come from the same dynamodb resource, because they all share its
+    client.
+    """
+    # The resource's client turns the items to and from dynamodb's types for us, the
+    # same way the tables do.
+    client = requests[0][0].meta.client
+    request_items = get_batch_get_request_items(requests)
+    items: dict[str, list[dict[str, Any]]] = {name: [] for name in request_items}
+    retries = 0
+    while request_items:
+        try:
+            response = client.batch_get_item(RequestItems=request_items)
+        except ClientError as e:
+            print(f"Error batch reading items: {e.response['Error']['Message']}")
+            raise e
+
+        for table_name, table_items in response["Responses"].items():
+            items[table_name].extend(table_items)  # type: ignore
+
+        request_items = response.get("UnprocessedKeys", {})  # type: ignore
+        if request_items:
+            retries += 1
+            if retries > BATCH_GET_MAX_RETRIES:
+                raise Exception("DynamoDB kept leaving keys out of a batch read.")
+            time.sleep(0.05 * 2**retries)
+
+    return [
+        next(
+            (
+                item
+                for item in items[table.name]
+                if all(item.get(name) == value for name, value in key.items())
+            ),
+            None,
         )
+        for table, key, _, _ in requests
+    ]
+
+
+def get_batch_get_request_items(
+    requests: list[BatchGetRequest],
+) -> dict[str, KeysAndAttributesTypeDef]:
+    request_items: dict[str, KeysAndAttributesTypeDef] = {}
+    keys: dict[str, list[dict[str, Any]]] = {}
+    projections: dict[str, Optional[set[str]]] = {}
+    for table, key, attributes, consistent_read in requests:
+        table_keys = keys.setdefault(table.name, [])
+        if key not in table_keys:
+            table_keys.append(key)
+        table_request = request_items.setdefault(table.name, {"Keys": table_keys})
+        # Like the projection, this is for the whole table, so it's consistent if any
+        # of the requests for it need to be.
+        if consistent_read:
+            table_request["ConsistentRead"] = True
+
+        # A batch only gets one projection per table, so it's everything any of the
+        # requests for that table want, plus the key so we can match the items up.
+        projection = projections.setdefault(table.name, set())
+        if attributes is None or projection is None:
+            projections[table.name] = None
+        else:
+            projection.update(attributes, key)
+
+    for table_name, projection in projections.items():
+        if projection is not None:
+            names = {f"#a{i}": name for i, name in enumerate(sorted(projection))}
+            request_items[table_name]["ProjectionExpression"] = ", ".join(names)
+            request_items[table_name]["ExpressionAttributeNames"] = names
+
+    return request_items
+
+
+def add_pending_webhook_event_to_dynamo(
+    download_status_table: Table,
+    athlete_id: int,
+    event: dict[str, Any],
+    now: dt.datetime,
+) -> bool:
+    """
+    Adds an event from Strava to the athlete's list of events waiting to be applied.
+    Returns True if nothing was going to apply them yet, in which case the caller
+    should, and False if something already will (or there's no data to apply them to).
+    """
+    append_events = (
+        "pending_events = list_append(if_not_exists(pending_events, :empty), :events)"
+    )
+    try:
+        # Save the event, and claim the job of applying it, unless another event
+        # already has (and not so long ago that its job must have been lost).
+        download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=f"SET {append_events}, events_flush_scheduled_at = :now",
+            ConditionExpression=(
+                "attribute_exists(athlete_id) AND "
+                "(attribute_not_exists(events_flush_scheduled_at) OR "
+                "events_flush_scheduled_at < :stale)"
+            ),
+            ExpressionAttributeValues={
+                ":empty": [],
+                ":events": [event],
+                ":now": int(now.timestamp()),
+                ":stale": int((now - WEBHOOK_FLUSH_TIMEOUT).timestamp()),
+            },
+        )
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            print(f"Error saving webhook event: {e.response['Error']['Message']}")
+            raise e
+
+    # A job is already coming, so the event just needs saving for it.
+    try:
+        download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression=f"SET {append_events}",
+            ConditionExpression="attribute_exists(athlete_id)",
+            ExpressionAttributeValues={":empty": [], ":events": [event]},
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            print(f"Error saving webhook event: {e.response['Error']['Message']}")
+            raise e
+    return False
+
+
+def release_webhook_flush_in_dynamo(
+    download_status_table: Table, athlete_id: int, scheduled_at: dt.datetime
+) -> None:
+    """
+    Gives up the claim add_pending_webhook_event_to_dynamo made at scheduled_at, for
+    when the job to apply the events couldn't be sent. The next event will try again,
+    instead of leaving the events waiting for a job that isn't coming.
+    """
+    try:
+        download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression="REMOVE events_flush_scheduled_at",
+            ConditionExpression="events_flush_scheduled_at = :scheduled_at",
+            ExpressionAttributeValues={":scheduled_at": int(scheduled_at.timestamp())},
+        )
+    except ClientError as e:
+        # Someone else has claimed it since, which is fine.
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            print(f"Error releasing webhook flush: {e.response['Error']['Message']}")
+            raise e
+
+
+def take_pending_webhook_events_from_dynamo(
+    download_status_table: Table, athlete_id: int
+) -> list[dict[str, Any]]:
+    """
+    Removes and returns all the events waiting to be applied for an athlete. Any event
+    that arrives after this will need to schedule its own flush.
+    """
+    try:
+        response = download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression="REMOVE pending_events, events_flush_scheduled_at",
+            ConditionExpression="attribute_exists(athlete_id)",
+            ReturnValues="ALL_OLD",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return []
+        print(f"Error taking webhook events: {e.response['Error']['Message']}")
+        raise e
+
+    return response.get("Attributes", {}).get("pending_events", [])  # type: ignore
+
+
+def increment_data_version_in_dynamo(
+    download_status_table: Table, athlete_id: int
+) -> int:
+    """
+    Bumps the version of the athlete's data, and returns the new version.
+    """
+    try:
+        response = download_status_table.update_item(
+            Key={"athlete_id": athlete_id},
+            UpdateExpression="ADD data_version :one",
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW",
+        )
+    except ClientError as e:
+        print(f"Error updating data version: {e.response['Error']['Message']}")
+        raise e
+
+    return int(response["Attributes"]["data_version"])  # type: ignore
+
+
+def delete_download_status_from_dynamo(
+    download_status_table: Table, athlete_id: int
+) -> None:
+    try:
+        download_status_table.delete_item(Key={"athlete_id": athlete_id})
+    except ClientError as e:
+        print(f"Error deleting download status: {e.response['Error']['Message']}")
+        raise e
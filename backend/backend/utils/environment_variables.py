@@ -28,6 +28,12 @@ class EnvironmentVariableManager:
 
     STRAVA_CLIENT_ID = "STRAVA_CLIENT_ID"
     STRAVA_CLIENT_SECRET = "STRAVA_CLIENT_SECRET"
+    STRAVA_WEBHOOK_VERIFY_TOKEN = "STRAVA_WEBHOOK_VERIFY_TOKEN"
+    STRAVA_WEBHOOK_SUBSCRIPTION_ID = "STRAVA_WEBHOOK_SUBSCRIPTION_ID"
+
+    SESSION_SIGNING_SECRET = "SESSION_SIGNING_SECRET"
+
+    TRIVIA_TIMINGS = "TRIVIA_TIMINGS"
 
     ALL_VARIABLES = [
         PROTOCOL,
@@ -38,6 +44,10 @@ class EnvironmentVariableManager:
         SENTRY_SERVER_DSN,
         STRAVA_CLIENT_ID,
         STRAVA_CLIENT_SECRET,
+        STRAVA_WEBHOOK_VERIFY_TOKEN,
+        STRAVA_WEBHOOK_SUBSCRIPTION_ID,
+        SESSION_SIGNING_SECRET,
+        TRIVIA_TIMINGS,
     ]
 
     class ValidEnvironmentVariables(BaseModel):
@@ -49,6 +59,10 @@ class EnvironmentVariableManager:
         sentry_server_dsn: Optional[str]
         strava_client_id: int
         strava_client_secret: str
+        strava_webhook_verify_token: Optional[str] = None
+        strava_webhook_subscription_id: Optional[str] = None
+        session_signing_secret: Optional[str] = None
+        trivia_timings: Optional[bool] = None
 
     def __init__(self, **kwargs: dict[str, Any]) -> None:
         # Using .get returns None for environment variables that dont exist, but that's
@@ -92,5 +106,20 @@ class EnvironmentVariableManager:
     def get_strava_client_secret(self) -> str:
         return self.variables.strava_client_secret
 
+    def get_strava_webhook_verify_token(self) -> Optional[str]:
+        return self.variables.strava_webhook_verify_token
+
+    def get_strava_webhook_subscription_id(self) -> Optional[str]:
+        # Like the signing secret, an unset github secret is an empty string.
+        return self.variables.strava_webhook_subscription_id or None
+
+    def get_session_signing_secret(self) -> Optional[str]:
+        # An unset github secret ends up as an empty string, which is no good for
+        # signing anything.
+        return self.variables.session_signing_secret or None
+
+    def should_log_trivia_timings(self) -> bool:
+        return bool(self.variables.trivia_timings)
+
 
 evm = EnvironmentVariableManager()
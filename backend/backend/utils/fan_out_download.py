@@ -0,0 +1,247 @@
+"""
+For athletes with a huge number of activities, downloading one page after another is
+slow no matter what. Instead, we can split the time since they joined Strava into date
+windows, and download each window at the same time in separate jobs. Each window is
+saved to s3 separately, and whichever job finishes last merges them all together.
+
+Each fan out gets its own id, which every window carries with it. A window job from an
+earlier fan out can still be running when a new one starts, and the id stops it from
+being counted towards (or overwriting the windows of) the new one.
+"""
+
+import dataclasses
+import datetime as dt
+import math
+import uuid
+from typing import Any, Callable, Optional
+
+from mypy_boto3_dynamodb.service_resource import Table
+from mypy_boto3_s3 import S3Client
+from stravalib.client import Client
+
+from backend.utils.download import (
+    PAGE_SIZE,
+    get_raw_activity_page,
+    get_valid_raw_activities,
+)
+from backend.utils.dynamodb import (
+    increment_data_version_in_dynamo,
+    record_window_complete_in_dynamo,
+    save_download_status_to_dynamo,
+    save_fan_out_started_to_dynamo,
+)
+from backend.utils.s3 import (
+    ACTIVITY_WINDOWS_PREFIX,
+    delete_partial_activities_from_s3,
+    get_partial_activities_from_s3,
+    save_partial_activities_to_s3,
+    save_raw_activities_to_s3,
+)
+
+# Only bother splitting up downloads for athletes with more activities than this.
+FAN_OUT_THRESHOLD = 2000
+
+# Roughly how many activities each window should have. A window of this size only
+# takes a few requests, so it comfortably finishes within a single lambda invocation.
+ACTIVITIES_PER_WINDOW = 1000
+
+# Don't start more jobs than this at once, no matter how many activities there are.
+MAX_WINDOWS = 10
+
+# Strava's before and after filters are both exclusive, so an activity starting on the
+# exact second a window starts would be missed. Windows overlap by this much, and any
+# duplicates are removed when the windows are merged.
+WINDOW_OVERLAP = dt.timedelta(seconds=1)
+
+
+@dataclasses.dataclass
+class DateWindow:
+    """
+    A range of dates to download activities for. None means the window is unbounded
+    on that side, so that the first and last windows catch everything.
+    """
+
+    index: int
+    after: Optional[dt.datetime]
+    before: Optional[dt.datetime]
+    # Which fan out the window belongs to.
+    fan_out_id: Optional[str] = None
+
+
+def get_windows_prefix(fan_out_id: str) -> str:
+    """
+    Where the windows for a fan out are saved in s3.
+    """
+    return f"{ACTIVITY_WINDOWS_PREFIX}/{fan_out_id}"
+
+
+def should_fan_out(estimated_total_activities: Optional[int]) -> bool:
+    return (
+        estimated_total_activities is not None
+        and estimated_total_activities > FAN_OUT_THRESHOLD
+    )
+
+
+def get_window_count(estimated_total_activities: int) -> int:
+    return max(
+        1,
+        min(math.ceil(estimated_total_activities / ACTIVITIES_PER_WINDOW), MAX_WINDOWS),
+    )
+
+
+def split_into_windows(
+    start: dt.datetime,
+    end: dt.datetime,
+    window_count: int,
+    fan_out_id: Optional[str] = None,
+) -> list[DateWindow]:
+    """
+    Splits the time between start and end into equally long windows. Windows are
+    numbered from 1, like pages. The first window has no lower bound, because people
+    can upload activities from before they joined Strava, and the last has no upper
+    bound in case anything gets uploaded while we're downloading.
+    """
+    window_length = (end - start) / window_count
+    boundaries = [start + window_length * i for i in range(1, window_count)]
+
+    windows = []
+    for i in range(window_count):
+        after = boundaries[i - 1] - WINDOW_OVERLAP if i > 0 else None
+        before = boundaries[i] if i < window_count - 1 else None
+        windows.append(
+            DateWindow(index=i + 1, after=after, before=before, fan_out_id=fan_out_id)
+        )
+    return windows
+
+
+def start_fan_out_download(
+    client: Client,
+    s3_client: S3Client,
+    download_status_table: Table,
+    athlete_id: int,
+    estimated_total_activities: int,
+    dispatch_window: Callable[[DateWindow], None],
+) -> list[DateWindow]:
+    """
+    Splits the athlete's history into windows and dispatches a job for each.
+    """
+    now = dt.datetime.now(dt.timezone.utc)
+    athlete = client.get_athlete()
+    start = athlete.created_at or now - dt.timedelta(days=365)
+    fan_out_id = uuid.uuid4().hex
+    windows = split_into_windows(
+        start, now, get_window_count(estimated_total_activities), fan_out_id
+    )
+
+    previous_fan_out_id = save_fan_out_started_to_dynamo(
+        download_status_table,
+        athlete_id,
+        now,
+        f"Downloading your activities in {len(windows)} batches.",
+        windows_total=len(windows),
+        estimated_total_activities=estimated_total_activities,
+        fan_out_id=fan_out_id,
+    )
+    # Whatever the previous fan out left behind isn't going to be used now.
+    if previous_fan_out_id is not None:
+        delete_partial_activities_from_s3(
+            s3_client, get_windows_prefix(previous_fan_out_id), athlete_id
+        )
+
+    for window in windows:
+        dispatch_window(window)
+
+    return windows
+
+
+def download_window(
+    client: Client,
+    s3_client: S3Client,
+    download_status_table: Table,
+    athlete_id: int,
+    window: DateWindow,
+) -> bool:
+    """
+    Downloads every activity in a single window and records that it's finished. The
+    last window to finish merges all the windows together into the athlete's data,
+    and returns True.
+    """
+    if window.fan_out_id is None:
+        raise ValueError("Can't download a window that isn't part of a fan out.")
+    windows_prefix = get_windows_prefix(window.fan_out_id)
+
+    window_activities: list[dict[str, Any]] = []
+    page = 1
+    while True:
+        raw_page = get_raw_activity_page(
+            client, page, before=window.before, after=window.after
+        )
+        window_activities.extend(get_valid_raw_activities(raw_page))
+        if len(raw_page) < PAGE_SIZE:
+            break
+        page += 1
+
+    save_partial_activities_to_s3(
+        s3_client,
+        windows_prefix,
+        athlete_id,
+        window.index,
+        window_activities,
+    )
+    download_status_item = record_window_complete_in_dynamo(
+        download_status_table,
+        athlete_id,
+        dt.datetime.now(dt.timezone.utc),
+        len(window_activities),
+        window.fan_out_id,
+    )
+    if download_status_item is None:
+        print(f"Window {window.index} is from an old download, so it's been ignored.")
+        delete_partial_activities_from_s3(s3_client, windows_prefix, athlete_id)
+        return False
+
+    print(
+        f"Window {window.index} done. {download_status_item.windows_complete} of "
+        f"{download_status_item.windows_total} windows downloaded."
+    )
+
+    if download_status_item.windows_complete != download_status_item.windows_total:
+        return False
+
+    raw_activities = merge_windows(
+        get_partial_activities_from_s3(
+            s3_client,
+            windows_prefix,
+            athlete_id,
+            download_status_item.windows_total,
+        )
+    )
+    save_raw_activities_to_s3(s3_client, athlete_id, raw_activities)
+    delete_partial_activities_from_s3(s3_client, windows_prefix, athlete_id)
+
+    print(f"All {len(raw_activities)} activities saved to s3.")
+    save_download_status_to_dynamo(
+        download_status_table,
+        athlete_id,
+        dt.datetime.now(dt.timezone.utc),
+        f"All {len(raw_activities)} activities saved to s3.",
+        error=False,
+        complete=True,
+        activities_downloaded=len(raw_activities),
+        estimated_total_activities=download_status_item.estimated_total_activities,
+    )
+    increment_data_version_in_dynamo(download_status_table, athlete_id)
+    return True
+
+
+def merge_windows(raw_activities: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Removes the duplicates from where windows overlap, and puts the activities in the
+    same order Strava gives them to us normally, which is newest first.
+    """
+    activities_by_id = {activity["id"]: activity for activity in raw_activities}
+    return sorted(
+        activities_by_id.values(),
+        key=lambda activity: dt.datetime.fromisoformat(activity["start_date"]),
+        reverse=True,
+    )
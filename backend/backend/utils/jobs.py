@@ -0,0 +1,165 @@
+"""
+Some work takes too long to do while someone waits for a response (like downloading
+all their activities), so it gets handed off as a job.
+
+In prod, a job is sent to the worker lambda (backend.worker) as an asynchronous
+invocation, with a payload that looks like {"job": {"type": "download", ...}} instead
+of an API Gateway event. The worker's handler spots the "job" key and runs the job
+directly, instead of going through the app. Locally, and in tests, jobs just run on a
+pool of threads.
+
+Neither dispatcher tries to spot duplicate jobs. A lambda can't see jobs sent from
+other containers anyway, and dropping one can lose work for good, like webhook events
+that nothing else will ever apply. Instead, anything that should only be started once
+is claimed with a conditional write to DynamoDB (the download lease, or applying the
+webhook events) before its job is dispatched, so every job that's dispatched should
+run.
+"""
+
+import concurrent.futures
+import dataclasses
+import json
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Callable, ClassVar, Optional
+
+import boto3
+
+# Set on the API lambda (in template.yaml), so it knows where to send jobs.
+WORKER_FUNCTION_NAME = "WORKER_FUNCTION_NAME"
+
+
+@dataclasses.dataclass(frozen=True)
+class Job:
+    # Used to tell the jobs apart once they've been turned into JSON.
+    type: ClassVar[str]
+
+    athlete_id: int
+
+    def get_name(self) -> str:
+        """
+        Something to call the job in logs, which doesn't include the session token.
+        """
+        return f"{self.type}:{self.athlete_id}"
+
+
+@dataclasses.dataclass(frozen=True)
+class DownloadJob(Job):
+    type: ClassVar[str] = "download"
+
+    session_token: str
+    # Whether to carry on from the last checkpoint of a previous download.
+    resume: bool = False
+    # Who holds the lease on the athlete's download. The job won't run if someone
+    # else has taken it over since.
+    lease_owner: Optional[str] = None
+    # Requests already reserved from the shared quota for the job when it was queued.
+    reserved_requests: int = 0
+
+
+@dataclasses.dataclass(frozen=True)
+class DownloadWindowJob(Job):
+    type: ClassVar[str] = "download_window"
+
+    session_token: str
+    window_index: int
+    # Seconds since the epoch, or None if the window is unbounded on that side.
+    after: Optional[int] = None
+    before: Optional[int] = None
+    # Which fan out the window belongs to.
+    fan_out_id: Optional[str] = None
+
+    def get_name(self) -> str:
+        return f"{super().get_name()}:{self.fan_out_id}:{self.window_index}"
+
+
+@dataclasses.dataclass(frozen=True)
+class ApplyWebhookEventsJob(Job):
+    type: ClassVar[str] = "apply_webhook_events"
+
+
+ALL_JOB_TYPES: list[type[Job]] = [DownloadJob, DownloadWindowJob, ApplyWebhookEventsJob]
+JOB_TYPES: dict[str, type[Job]] = {
+    job_type.type: job_type for job_type in ALL_JOB_TYPES
+}
+
+
+def job_to_payload(job: Job) -> dict[str, Any]:
+    return {"job": {"type": job.type, **dataclasses.asdict(job)}}
+
+
+def is_job_payload(payload: Any) -> bool:
+    return isinstance(payload, dict) and "job" in payload
+
+
+def job_from_payload(payload: dict[str, Any]) -> Job:
+    job_data = dict(payload["job"])
+    job_type = JOB_TYPES[job_data.pop("type")]
+    return job_type(**job_data)
+
+
+class JobDispatcher(ABC):
+    @abstractmethod
+    def dispatch(self, job: Job) -> None:
+        """
+        Sends a job off to be run.
+        """
+        pass
+
+
+class LambdaJobDispatcher(JobDispatcher):
+    """
+    Sends jobs to a lambda as asynchronous invocations. By default, that's the worker,
+    which the API is told the name of, and which the worker knows is itself.
+    """
+
+    def __init__(
+        self, function_name: Optional[str] = None, lambda_client: Any = None
+    ) -> None:
+        self._function_name = function_name
+        self._lambda_client = lambda_client
+
+    def get_function_name(self) -> str:
+        # Lambda tells every function its own name.
+        if self._function_name is None:
+            self._function_name = os.environ.get(
+                WORKER_FUNCTION_NAME, os.environ["AWS_LAMBDA_FUNCTION_NAME"]
+            )
+        return self._function_name
+
+    def get_lambda_client(self) -> Any:
+        if self._lambda_client is None:
+            self._lambda_client = boto3.client("lambda")
+        return self._lambda_client
+
+    def dispatch(self, job: Job) -> None:
+        response = self.get_lambda_client().invoke(
+            FunctionName=self.get_function_name(),
+            InvocationType="Event",  # Asynchronous invocation
+            Payload=json.dumps(job_to_payload(job)),
+        )
+        if response["StatusCode"] != 202:
+            print(f"Failed to dispatch job {job.get_name()}: {response}")
+
+
+class InProcessJobDispatcher(JobDispatcher):
+    """
+    Runs jobs on a pool of threads in this process.
+    """
+
+    def __init__(self, run_job: Callable[[Job], Any], max_workers: int = 4) -> None:
+        self.run_job = run_job
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._futures: list[concurrent.futures.Future] = []
+
+    def dispatch(self, job: Job) -> None:
+        self._futures.append(self._executor.submit(self.run_job, job))
+
+    def wait_for_jobs(self) -> None:
+        """
+        Blocks until every job dispatched so far (and any they dispatch) has finished.
+        Exceptions from jobs are raised here.
+        """
+        while self._futures:
+            future = self._futures.pop(0)
+            future.result()
@@ -0,0 +1,43 @@
+"""
+Importing the plotting stack (plotly, pandas, PIL and friends) and building every tab's
+statistics takes a good chunk of a lambda's cold start, and most requests (logging in,
+checking on a download, listing the tabs) never need any of it. So the tabs only hold
+on to a Lazy version of the things that do the actual work, which isn't imported or
+made until a tab is first worked out.
+"""
+
+import importlib
+import threading
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class Lazy(Generic[T]):
+    """
+    Makes something the first time it's needed, and then hangs on to it.
+    """
+
+    def __init__(self, factory: Callable[[], T]) -> None:
+        self._factory = factory
+        self._value: T
+        self._made = False
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        if not self._made:
+            with self._lock:
+                if not self._made:
+                    self._value = self._factory()
+                    self._made = True
+        return self._value
+
+    def is_made(self) -> bool:
+        return self._made
+
+
+def lazy_attribute(module_name: str, attribute: str) -> Lazy[Any]:
+    """
+    Something from a module which isn't imported until it's needed.
+    """
+    return Lazy(lambda: getattr(importlib.import_module(module_name), attribute))
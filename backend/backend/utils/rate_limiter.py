@@ -0,0 +1,397 @@
+"""
+Every lambda container makes its own stravalib client, and each client only knows
+about the requests it has made itself. When a few downloads are running in different
+containers at once, none of them know about the others, and together they blow
+straight through the app's quota.
+
+Instead, the quota is kept as a couple of token buckets (one for Strava's 15 minute
+limit, and one for the daily limit) in a store that every container shares. Taking
+tokens from a bucket is a compare-and-swap on a version number, so two containers can
+never both spend the same token.
+
+Strava doesn't trickle its quota back over time. Its windows are fixed (each quarter of
+an hour, and each day from midnight UTC), and the whole limit comes back at once when
+one ends. So the buckets are refilled the same way, instead of a bit at a time, which
+would let us make up to twice the limit in the minutes either side of a reset.
+"""
+
+import dataclasses
+import datetime as dt
+import threading
+import time
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import Any, Callable, Optional
+
+import requests
+from botocore.exceptions import ClientError
+from mypy_boto3_dynamodb.service_resource import Table
+from stravalib.exc import RateLimitExceeded
+from stravalib.protocol import RequestMethod
+from stravalib.util.limiter import RequestRate, get_rates_from_response_headers
+
+from backend.utils.download_scheduler import (
+    DEFAULT_LONG_LIMIT,
+    DEFAULT_SHORT_LIMIT,
+    get_start_of_next_long_window,
+    get_start_of_next_short_window,
+)
+
+SHORT_BUCKET_KEY = "strava_short"
+LONG_BUCKET_KEY = "strava_long"
+
+# How many times to retry taking tokens when another container beats us to it.
+MAX_COMPARE_AND_SWAP_ATTEMPTS = 10
+
+# If we'd have to wait longer than this for a token, give up and let the download be
+# retried later instead of sitting in a lambda doing nothing.
+MAX_WAIT = dt.timedelta(seconds=60)
+
+
+@dataclasses.dataclass(frozen=True)
+class TokenBucketState:
+    tokens: float
+    # Seconds since the epoch when the tokens were last counted.
+    updated_at: float
+    # Bumped on every write, so that writes based on an old read can be rejected.
+    version: int = 0
+
+
+class TokenBucketStore(ABC):
+    """
+    Somewhere to keep token buckets that every container can see.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[TokenBucketState]:
+        """
+        Returns the state of a bucket, or None if it hasn't been created yet.
+        """
+        pass
+
+    @abstractmethod
+    def compare_and_swap(
+        self, key: str, expected_version: Optional[int], state: TokenBucketState
+    ) -> bool:
+        """
+        Saves the new state of a bucket, but only if nobody else has written to it
+        since it was read at expected_version (or None if it didn't exist). Returns
+        whether the state was saved.
+        """
+        pass
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """
+    A store that only lives in this process. Good for running locally and in tests.
+    """
+
+    def __init__(self) -> None:
+        self._states: dict[str, TokenBucketState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[TokenBucketState]:
+        with self._lock:
+            return self._states.get(key)
+
+    def compare_and_swap(
+        self, key: str, expected_version: Optional[int], state: TokenBucketState
+    ) -> bool:
+        with self._lock:
+            current_state = self._states.get(key)
+            current_version = current_state.version if current_state else None
+            if current_version != expected_version:
+                return False
+            self._states[key] = state
+            return True
+
+
+class DynamoDBTokenBucketStore(TokenBucketStore):
+    """
+    Keeps the buckets in a dynamodb table, using conditional writes for the swap.
+    """
+
+    def __init__(self, table: Table) -> None:
+        self.table = table
+
+    def get(self, key: str) -> Optional[TokenBucketState]:
+        response = self.table.get_item(Key={"bucket_key": key}, ConsistentRead=True)
+        item = response.get("Item")
+        if item is None:
+            return None
+        return TokenBucketState(
+            tokens=float(item["tokens"]),  # type: ignore
+            updated_at=float(item["updated_at"]),  # type: ignore
+            version=int(item["version"]),  # type: ignore
+        )
+
+    def compare_and_swap(
+        self, key: str, expected_version: Optional[int], state: TokenBucketState
+    ) -> bool:
+        condition: dict[str, Any] = (
+            {"ConditionExpression": "attribute_not_exists(bucket_key)"}
+            if expected_version is None
+            else {
+                "ConditionExpression": "version = :expected_version",
+                "ExpressionAttributeValues": {":expected_version": expected_version},
+            }
+        )
+
+        try:
+            self.table.put_item(
+                Item={
+                    "bucket_key": key,
+                    "tokens": Decimal(str(state.tokens)),
+                    "updated_at": Decimal(str(state.updated_at)),
+                    "version": state.version,
+                },
+                **condition,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        return True
+
+
+class TokenBucket:
+    """
+    A bucket that holds up to capacity tokens, and is filled back up whenever one of
+    Strava's windows ends. Each request takes one token.
+    """
+
+    def __init__(
+        self,
+        store: TokenBucketStore,
+        key: str,
+        capacity: int,
+        get_window_end: Callable[[dt.datetime], dt.datetime],
+    ) -> None:
+        self.store = store
+        self.key = key
+        self.capacity = capacity
+        # Given a time, returns when the window it's in ends.
+        self.get_window_end = get_window_end
+
+    def _refill(self, state: Optional[TokenBucketState], now: dt.datetime) -> float:
+        """
+        Returns how many tokens the bucket has at the given time. A new bucket is full,
+        and so is one that was last counted in an earlier window.
+        """
+        if state is None:
+            return self.capacity
+        updated_at = dt.datetime.fromtimestamp(state.updated_at, tz=dt.timezone.utc)
+        if now >= self.get_window_end(updated_at):
+            return self.capacity
+        return min(state.tokens, self.capacity)
+
+    def _update(
+        self, now: dt.datetime, get_new_tokens: Callable[[float], Optional[float]]
+    ) -> bool:
+        """
+        Reads the bucket, works out the new number of tokens from the current number,
+        and tries to save it, retrying if another container got in first. If
+        get_new_tokens returns None, nothing is saved and False is returned.
+        """
+        for _ in range(MAX_COMPARE_AND_SWAP_ATTEMPTS):
+            state = self.store.get(self.key)
+            new_tokens = get_new_tokens(self._refill(state, now))
+            if new_tokens is None:
+                return False
+
+            new_state = TokenBucketState(
+                tokens=new_tokens,
+                updated_at=now.timestamp(),
+                version=state.version + 1 if state else 0,
+            )
+            if self.store.compare_and_swap(
+                self.key, state.version if state else None, new_state
+            ):
+                return True
+
+        # Lots of containers are fighting over the bucket, so it's probably about to
+        # run out anyway. Better to be careful and say no.
+        return False
+
+    def try_acquire(self, now: dt.datetime, tokens: int = 1) -> bool:
+        """
+        Takes some tokens if there are enough of them.
+        """
+        return self._update(
+            now, lambda current: current - tokens if current >= tokens else None
+        )
+
+    def refund(self, now: dt.datetime, tokens: int = 1) -> None:
+        """
+        Gives back tokens that were taken but never used.
+        """
+        self._update(now, lambda current: min(current + tokens, self.capacity))
+
+    def drain_to(self, now: dt.datetime, remaining: int) -> None:
+        """
+        Makes sure the bucket has no more than remaining tokens. Used when Strava tells
+        us how much of the quota is actually left.
+        """
+        self._update(now, lambda current: remaining if current > remaining else None)
+
+    def get_remaining(self, now: dt.datetime) -> int:
+        return int(self._refill(self.store.get(self.key), now))
+
+    def get_time_until_available(
+        self, now: dt.datetime, tokens: int = 1
+    ) -> dt.timedelta:
+        if self._refill(self.store.get(self.key), now) >= tokens:
+            return dt.timedelta(0)
+        return self.get_window_end(now) - now
+
+
+class SharedStravaQuota:
+    """
+    The app's Strava quota, shared by every container.
+    """
+
+    def __init__(
+        self,
+        store: TokenBucketStore,
+        short_limit: int = DEFAULT_SHORT_LIMIT,
+        long_limit: int = DEFAULT_LONG_LIMIT,
+    ) -> None:
+        self.short_bucket = TokenBucket(
+            store, SHORT_BUCKET_KEY, short_limit, get_start_of_next_short_window
+        )
+        self.long_bucket = TokenBucket(
+            store, LONG_BUCKET_KEY, long_limit, get_start_of_next_long_window
+        )
+
+    def try_acquire(self, now: dt.datetime) -> bool:
+        """
+        Takes a token for a single request from both buckets, or from neither. The
+        daily token is given back if the 15 minute bucket is empty, because a daily
+        token takes the longest to come back, and whoever called this is going to keep
+        trying until they get both.
+        """
+        if not self.long_bucket.try_acquire(now):
+            return False
+        if not self.short_bucket.try_acquire(now):
+            self.long_bucket.refund(now)
+            return False
+        return True
+
+    def try_reserve(self, requests: int, now: dt.datetime) -> Optional[int]:
+        """
+        Takes the tokens for a download's requests up front, so every container can see
+        they're spoken for before the download has made them. A download bigger than a
+        whole window can never fit, so it only takes a window's worth, as long as the
+        window is untouched. Returns how many tokens were taken, or None if there
+        weren't enough.
+        """
+        tokens = min(requests, self.short_bucket.capacity, self.long_bucket.capacity)
+        if not self.long_bucket.try_acquire(now, tokens):
+            return None
+        if not self.short_bucket.try_acquire(now, tokens):
+            self.long_bucket.refund(now, tokens)
+            return None
+        return tokens
+
+    def release(self, tokens: int, now: dt.datetime) -> None:
+        """
+        Gives back tokens from try_reserve that won't be used after all.
+        """
+        self.short_bucket.refund(now, tokens)
+        self.long_bucket.refund(now, tokens)
+
+    def get_remaining(self, now: dt.datetime) -> int:
+        """
+        Returns how many requests any container could make right now.
+        """
+        return min(
+            self.short_bucket.get_remaining(now), self.long_bucket.get_remaining(now)
+        )
+
+    def get_usage(self, now: dt.datetime) -> tuple[int, int]:
+        """
+        Returns roughly how much of the short and long limits have been used.
+        """
+        return (
+            self.short_bucket.capacity - self.short_bucket.get_remaining(now),
+            self.long_bucket.capacity - self.long_bucket.get_remaining(now),
+        )
+
+    def get_time_until_available(self, now: dt.datetime) -> dt.timedelta:
+        return max(
+            self.short_bucket.get_time_until_available(now),
+            self.long_bucket.get_time_until_available(now),
+        )
+
+    def update_from_rates(self, rates: RequestRate, now: dt.datetime) -> None:
+        """
+        Strava's own count is always right, so if it says there's less left than we
+        think, believe it.
+        """
+        self.short_bucket.drain_to(now, max(rates.short_limit - rates.short_usage, 0))
+        self.long_bucket.drain_to(now, max(rates.long_limit - rates.long_usage, 0))
+
+
+class SharedQuotaRateLimitRule:
+    """
+    A stravalib rate limit rule that keeps the shared quota in line with the usage
+    Strava reports after each response. The tokens themselves are taken before each
+    request, by SharedQuotaSession.
+    """
+
+    def __init__(self, quota: SharedStravaQuota) -> None:
+        self.quota = quota
+
+    def __call__(self, response_headers: dict[str, str], method: RequestMethod) -> None:
+        rates = get_rates_from_response_headers(response_headers, method)
+        if rates is not None:
+            self.quota.update_from_rates(rates, dt.datetime.now(dt.timezone.utc))
+
+
+class SharedQuotaSession(requests.Session):
+    """
+    A requests session for a stravalib client, which takes a token from the shared
+    quota before every request it sends. stravalib only shows its rate limiter each
+    response once it's arrived, which is too late to stop the request. If the buckets
+    are empty, this waits for a token, or gives up if that would take too long.
+
+    A download that was queued already had its tokens reserved when it was started,
+    so it uses those up first instead of taking more.
+    """
+
+    def __init__(
+        self,
+        quota: SharedStravaQuota,
+        max_wait: dt.timedelta = MAX_WAIT,
+        sleep: Callable[[float], None] = time.sleep,
+        reserved_requests: int = 0,
+    ) -> None:
+        super().__init__()
+        self.quota = quota
+        self.max_wait = max_wait
+        self.sleep = sleep
+        self.reserved_requests = reserved_requests
+
+    def request(self, *args: Any, **kwargs: Any) -> requests.Response:
+        self.wait_for_token()
+        return super().request(*args, **kwargs)
+
+    def wait_for_token(self) -> None:
+        if self.reserved_requests > 0:
+            self.reserved_requests -= 1
+            return
+
+        now = dt.datetime.now(dt.timezone.utc)
+        waited = dt.timedelta(0)
+        while not self.quota.try_acquire(now):
+            wait = self.quota.get_time_until_available(now)
+            # Another container might have grabbed the token we were waiting for.
+            wait = max(wait, dt.timedelta(seconds=1))
+            if waited + wait > self.max_wait:
+                raise RateLimitExceeded(
+                    "The app's shared Strava quota is used up.",
+                    timeout=wait.total_seconds(),
+                )
+            self.sleep(wait.total_seconds())
+            waited += wait
+            now = dt.datetime.now(dt.timezone.utc)
@@ -0,0 +1,141 @@
+"""
+The things both entry points (backend.api and backend.worker) need: the AWS tables
+and buckets, the app's Strava quota, and somewhere to send jobs. Each lambda container
+makes them once, when it starts.
+"""
+
+import os
+
+import boto3
+import sentry_sdk
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from mypy_boto3_dynamodb.service_resource import DynamoDBServiceResource, Table
+from mypy_boto3_s3 import S3Client
+from sentry_sdk.integrations.aws_lambda import AwsLambdaIntegration
+from stravalib.util.limiter import RateLimiter
+
+from backend.utils.download_scheduler import (
+    DynamoDBSyncJobQueue,
+    InMemorySyncJobQueue,
+    QuotaTrackingRateLimiter,
+    StravaQuota,
+    SyncJobQueue,
+)
+from backend.utils.dynamodb import DYNAMODB_CLIENT_CONFIG
+from backend.utils.environment_variables import evm
+from backend.utils.jobs import (
+    InProcessJobDispatcher,
+    Job,
+    JobDispatcher,
+    LambdaJobDispatcher,
+)
+from backend.utils.rate_limiter import (
+    DynamoDBTokenBucketStore,
+    InMemoryTokenBucketStore,
+    SharedQuotaRateLimitRule,
+    SharedQuotaSession,
+    SharedStravaQuota,
+)
+
+# Check if the app is running in development mode
+is_dev = os.getenv("ENVIRONMENT", "production") == "development"
+
+if not is_dev:
+    sentry_sdk.init(
+        dsn=evm.get_sentry_server_dsn(),
+        integrations=[AwsLambdaIntegration()],
+        # Set traces_sample_rate to 1.0 to capture 100%
+        # of transactions for tracing.
+        traces_sample_rate=1.0,
+        _experiments={
+            # Set continuous_profiling_auto_start to True
+            # to automatically start the profiler on when
+            # possible.
+            "continuous_profiling_auto_start": True,
+        },
+    )
+
+
+USER_TABLE_NAME = "user-table"
+DOWNLOAD_STATUS_NAME = "download-status-table"
+RATE_LIMIT_TABLE_NAME = "rate-limit-table"
+SYNC_JOB_QUEUE_TABLE_NAME = "sync-job-queue-table"
+
+# All the tables share this resource's client, and its pool of connections.
+dynamodb: DynamoDBServiceResource = boto3.resource(
+    "dynamodb", config=DYNAMODB_CLIENT_CONFIG
+)
+user_table: Table = dynamodb.Table(USER_TABLE_NAME)
+download_status_table: Table = dynamodb.Table(DOWNLOAD_STATUS_NAME)
+
+s3_client: S3Client = boto3.client("s3", region_name="ap-southeast-2")
+
+# The Strava quota, as far as this container knows. It's kept in sync with the app-wide
+# usage Strava reports in its responses.
+strava_quota = StravaQuota()
+
+# Every container spends from the same Strava quota, so in prod it's kept in dynamodb
+# where they can all see it.
+shared_strava_quota = SharedStravaQuota(
+    DynamoDBTokenBucketStore(dynamodb.Table(RATE_LIMIT_TABLE_NAME))
+    if evm.is_production()
+    else InMemoryTokenBucketStore()
+)
+
+# Downloads waiting for quota. In prod they're kept in dynamodb, so whichever container
+# next checks on a download can start them, and they aren't lost with a container.
+sync_job_queue: SyncJobQueue = (
+    DynamoDBSyncJobQueue(dynamodb.Table(SYNC_JOB_QUEUE_TABLE_NAME))
+    if evm.is_production()
+    else InMemorySyncJobQueue()
+)
+
+
+def get_strava_rate_limiter() -> RateLimiter:
+    rate_limiter = QuotaTrackingRateLimiter(strava_quota)
+    rate_limiter.rules.append(SharedQuotaRateLimitRule(shared_strava_quota))
+    return rate_limiter
+
+
+def get_strava_session(reserved_requests: int = 0) -> SharedQuotaSession:
+    # The rate limiter only sees responses, so the session is what takes a token from
+    # the shared quota before each request goes out.
+    return SharedQuotaSession(shared_strava_quota, reserved_requests=reserved_requests)
+
+
+def run_job_in_this_process(job: Job) -> None:
+    # The worker is only imported when a job actually runs, so that the API doesn't
+    # load it all just to start up.
+    from backend.worker import run_job
+
+    run_job(job)
+
+
+# Work that takes too long to do during a request is handed off to the worker as a
+# job. In prod, jobs are sent to the worker lambda, and locally they run on a pool of
+# threads.
+job_dispatcher: JobDispatcher = (
+    LambdaJobDispatcher()
+    if evm.is_production()
+    else InProcessJobDispatcher(run_job_in_this_process)
+)
+
+
+def get_frontend_base_url() -> str:
+    return f"{evm.get_protocol()}://{evm.get_domain()}:{evm.get_frontend_port()}"
+
+
+def get_backend_base_url() -> str:
+    return f"{evm.get_protocol()}://{evm.get_domain()}:{evm.get_backend_port()}"
+
+
+def add_cors_middleware(app: FastAPI) -> None:
+    app.add_middleware(
+        CORSMiddleware,
+        # Default URL of next.js's dev frontend for development
+        allow_origins=[get_frontend_base_url()],
+        allow_credentials=True,
+        allow_methods=["*"],  # Allows all methods (GET, POST, etc.)
+        allow_headers=["*"],  # Allows all headers
+    )
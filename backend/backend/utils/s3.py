@@ -4,14 +4,21 @@ A collection of helpers for all s3 related tasks.
 
 import datetime as dt
 import json
+from typing import Any
 
-import plotly
 from botocore.exceptions import ClientError
 from mypy_boto3_s3 import S3Client
+from mypy_boto3_s3.type_defs import ObjectIdentifierTypeDef
 from stravalib.model import SummaryActivity
 
 BUCKET_NAME = "athlete-data-storage"
 
+# Parts of downloads that haven't finished yet are kept under these prefixes. Pages
+# come from a single sequential download, and windows from a download split up by
+# date range.
+ACTIVITY_PAGES_PREFIX = "download_pages"
+ACTIVITY_WINDOWS_PREFIX = "download_windows"
+
 
 def is_there_any_data_for_athlete(s3_client: S3Client, athlete_id: int) -> bool:
     """
@@ -73,27 +80,101 @@ def save_summary_activities_to_s3(
     Saves all the data for an athlete into s3 under their athlete id. If data
     for that athlete already exists, it is deleted and replaced.
     """
+    # plotly is slow to import, and only needed here to turn dates into JSON.
+    import plotly
+
     # Serialize the activities to JSON
     activities_data = [activity.model_dump() for activity in summary_activities]
     json_data = json.dumps(activities_data, cls=plotly.utils.PlotlyJSONEncoder)
+    save_athlete_data_to_s3(s3_client, athlete_id, json_data)
+
+
+def save_raw_activities_to_s3(
+    s3_client: S3Client, athlete_id: int, raw_activities: list[dict[str, Any]]
+) -> None:
+    """
+    Saves activities exactly as Strava gave them to us. This is the same shape that
+    get_summary_activities_from_s3 reads, but it skips turning every activity into a
+    pydantic model and back just to write it out again.
+    """
+    save_athlete_data_to_s3(s3_client, athlete_id, json.dumps(raw_activities))
 
-    # Remove existing data for the athlete if it exists
-    if is_there_any_data_for_athlete(s3_client, athlete_id):
-        try:
-            # Delete the current athlete's data
-            s3_client.delete_object(Bucket=BUCKET_NAME, Key=str(athlete_id))
-        except ClientError as e:
-            raise RuntimeError(
-                f"Failed to delete existing data for athlete {athlete_id}"
-            ) from e
-
-    # Upload the new data to S3
+
+def save_athlete_data_to_s3(
+    s3_client: S3Client, athlete_id: int, json_data: str
+) -> None:
+    """
+    Replaces the athlete's data in one put. S3 swaps the whole object at once, so
+    anyone reading the athlete's data at the same time gets either the old data or the
+    new data, and never nothing.
+    """
     try:
         s3_client.put_object(Bucket=BUCKET_NAME, Key=str(athlete_id), Body=json_data)
     except ClientError as e:
         raise RuntimeError(f"Failed to save data for athlete {athlete_id}") from e
 
 
+def get_partial_activities_key(prefix: str, athlete_id: int, part: int) -> str:
+    return f"{prefix}/{athlete_id}/{part}"
+
+
+def save_partial_activities_to_s3(
+    s3_client: S3Client,
+    prefix: str,
+    athlete_id: int,
+    part: int,
+    raw_activities: list[dict[str, Any]],
+) -> None:
+    """
+    Saves part of a download that's still in progress (like a single page, or a single
+    date range), so that the download can be split up and put back together later.
+    """
+    try:
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=get_partial_activities_key(prefix, athlete_id, part),
+            Body=json.dumps(raw_activities),
+        )
+    except ClientError as e:
+        raise RuntimeError(
+            f"Failed to save part {part} of data for athlete {athlete_id}"
+        ) from e
+
+
+def get_partial_activities_from_s3(
+    s3_client: S3Client, prefix: str, athlete_id: int, parts: int
+) -> list[dict[str, Any]]:
+    """
+    Returns all the raw activities from the first n parts saved for an athlete, in
+    order.
+    """
+    raw_activities: list[dict[str, Any]] = []
+    for part in range(1, parts + 1):
+        object = s3_client.get_object(
+            Bucket=BUCKET_NAME,
+            Key=get_partial_activities_key(prefix, athlete_id, part),
+        )
+        raw_activities.extend(json.loads(object["Body"].read()))
+    return raw_activities
+
+
+def delete_partial_activities_from_s3(
+    s3_client: S3Client, prefix: str, athlete_id: int
+) -> None:
+    """
+    Deletes all the parts saved for an athlete's in-progress download.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for response in paginator.paginate(
+        Bucket=BUCKET_NAME, Prefix=f"{prefix}/{athlete_id}/"
+    ):
+        objects: list[ObjectIdentifierTypeDef] = [
+            {"Key": obj["Key"]} for obj in response.get("Contents", [])
+        ]
+        if objects:
+            s3_client.delete_objects(Bucket=BUCKET_NAME, Delete={"Objects": objects})
+
+
 def get_summary_activities_from_s3(
     s3_client: S3Client, athlete_id: int
 ) -> list[SummaryActivity]:
@@ -0,0 +1,99 @@
+"""
+Every logged in request needs to know which athlete it's for, and looking the session
+token up in the user table is a trip to dynamodb every time. If SESSION_SIGNING_SECRET
+is set, the session cookie is instead a signed token with the athlete's id (and when it
+expires) baked into it, so the routes which only need the athlete id can check it
+without leaving the lambda.
+
+The athlete's Strava tokens still live in the user table, under a random session id
+which is also in the cookie, and only the download path ever needs to read them.
+"""
+
+import base64
+import dataclasses
+import datetime as dt
+import hashlib
+import hmac
+from typing import Optional
+
+from fastapi.exceptions import HTTPException
+from mypy_boto3_dynamodb.service_resource import Table
+
+from backend.utils.dynamodb import get_athlete_id_from_session_token
+
+SESSION_DURATION = dt.timedelta(minutes=30)
+
+# Signed tokens look like "v1.<athlete id>.<expires at>.<session id>.<signature>". The
+# session ids and signatures are url safe base64, which never has a "." in it.
+SIGNED_SESSION_TOKEN_VERSION = "v1"
+
+
+@dataclasses.dataclass(frozen=True)
+class Session:
+    # The key of the athlete's row in the user table. For old unsigned cookies, this is
+    # just the cookie itself.
+    session_id: str
+    athlete_id: int
+
+
+def create_session_token(
+    session_id: str,
+    athlete_id: int,
+    signing_secret: Optional[str],
+    now: dt.datetime,
+) -> str:
+    """
+    Makes the value of the session cookie. Without a signing secret, the cookie is just
+    the session id, like it's always been.
+    """
+    if signing_secret is None:
+        return session_id
+
+    expires_at = int((now + SESSION_DURATION).timestamp())
+    payload = f"{SIGNED_SESSION_TOKEN_VERSION}.{athlete_id}.{expires_at}.{session_id}"
+    return f"{payload}.{sign(payload, signing_secret)}"
+
+
+def get_session(
+    user_table: Table,
+    session_token: str,
+    signing_secret: Optional[str],
+    now: dt.datetime,
+) -> Session:
+    """
+    Works out who a session cookie belongs to. Signed cookies are checked locally, and
+    anything else is looked up in the user table.
+    """
+    if not session_token.startswith(f"{SIGNED_SESSION_TOKEN_VERSION}."):
+        return Session(
+            session_id=session_token,
+            athlete_id=get_athlete_id_from_session_token(user_table, session_token),
+        )
+
+    parts = session_token.split(".")
+    if len(parts) != 5 or not parts[1].isdigit() or not parts[2].isdigit():
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    _, athlete_id, expires_at, session_id, signature = parts
+
+    # If signing has since been turned off, we can't trust the athlete id in the
+    # cookie, but the session id is still good for looking them up the slow way.
+    if signing_secret is None:
+        return Session(
+            session_id=session_id,
+            athlete_id=get_athlete_id_from_session_token(user_table, session_id),
+        )
+
+    payload = session_token.rsplit(".", 1)[0]
+    if not hmac.compare_digest(signature, sign(payload, signing_secret)):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    if now.timestamp() >= int(expires_at):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    return Session(session_id=session_id, athlete_id=int(athlete_id))
+
+
+def sign(payload: str, signing_secret: str) -> str:
+    digest = hmac.new(
+        signing_secret.encode(), payload.encode(), hashlib.sha256
+    ).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
@@ -0,0 +1,59 @@
+"""
+Working out a tab's data means reading all of the athlete's activities out of s3 and
+crunching through every one of them, and the answer is the same every time until their
+data changes. So each container remembers the tab payloads it has worked out recently,
+keyed by the version of the athlete's data they came from.
+
+When the athlete's data changes (a download finishes, or webhook events are applied),
+its version is bumped, so the old payloads are never looked up again and eventually
+fall out of the cache. While a refresh is still downloading, the version hasn't
+changed, so the athlete keeps getting their old payloads straight from here.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Tab payloads are mostly plotly figures, which can be a few hundred KB each, so only
+# keep this many around.
+DEFAULT_MAX_ENTRIES = 100
+
+
+class TabPayloadCache:
+    """
+    A least recently used cache of tab payloads.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._payloads: OrderedDict[tuple[int, str, int], Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, athlete_id: int, tab_key: str, data_version: int) -> Optional[Any]:
+        key = (athlete_id, tab_key, data_version)
+        with self._lock:
+            if key not in self._payloads:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._payloads.move_to_end(key)
+            return self._payloads[key]
+
+    def put(
+        self, athlete_id: int, tab_key: str, data_version: int, payload: Any
+    ) -> None:
+        key = (athlete_id, tab_key, data_version)
+        with self._lock:
+            self._payloads[key] = payload
+            self._payloads.move_to_end(key)
+            while len(self._payloads) > self.max_entries:
+                self._payloads.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._payloads.clear()
+
+
+tab_payload_cache = TabPayloadCache()
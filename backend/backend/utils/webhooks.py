@@ -0,0 +1,159 @@
+"""
+Strava can push us an event whenever one of our athletes creates, updates or deletes
+an activity (https://developers.strava.com/docs/webhooks/). Instead of waiting a week
+and downloading everything again, we apply those changes straight to the athlete's
+stored data.
+
+Strava gives us about 2 seconds to acknowledge each event, and an activity upload
+usually sends a few events in a row (a create, and then an update or two as the
+athlete renames it). So events aren't applied as they arrive. They're saved against
+the athlete's download status, and a single job applies everything that has piled up
+with one write to s3.
+"""
+
+import datetime as dt
+from typing import Any, Literal, Optional
+
+from mypy_boto3_dynamodb.service_resource import Table
+from mypy_boto3_s3 import S3Client
+from pydantic import BaseModel
+from stravalib.client import Client
+from stravalib.model import SummaryActivity
+
+from backend.utils.download import get_activity
+from backend.utils.dynamodb import (
+    get_download_status_item_from_dynamo,
+    increment_data_version_in_dynamo,
+    take_pending_webhook_events_from_dynamo,
+)
+from backend.utils.s3 import (
+    get_summary_activities_from_s3,
+    is_there_any_data_for_athlete,
+    save_summary_activities_to_s3,
+)
+
+# How long to wait after the first event for any others to arrive, before applying
+# them all together.
+WEBHOOK_BATCH_SECONDS = 5
+
+
+class StravaWebhookEvent(BaseModel):
+    object_type: Literal["activity", "athlete"]
+    object_id: int
+    aspect_type: Literal["create", "update", "delete"]
+    owner_id: int
+    subscription_id: int
+    event_time: int
+    updates: dict[str, Any] = {}
+
+    def is_from_subscription(self, subscription_id: Optional[str]) -> bool:
+        """
+        Anyone can post to the webhook endpoint, so an event is only trusted if it's
+        for our subscription. With no subscription set up, nothing is trusted.
+        """
+        return subscription_id is not None and str(self.subscription_id) == (
+            subscription_id
+        )
+
+    def is_deauthorization(self) -> bool:
+        """
+        When an athlete revokes our access, Strava sends an athlete update event.
+        """
+        return (
+            self.object_type == "athlete" and self.updates.get("authorized") == "false"
+        )
+
+
+def get_latest_event_per_activity(
+    events: list[StravaWebhookEvent],
+) -> dict[int, StravaWebhookEvent]:
+    """
+    Only the last thing that happened to each activity matters. If it was created and
+    then updated, we just need to fetch it once. If it was deleted, nothing else does.
+    """
+    latest_events: dict[int, StravaWebhookEvent] = {}
+    for event in sorted(events, key=lambda event: event.event_time):
+        if event.object_type == "activity":
+            latest_events[event.object_id] = event
+    return latest_events
+
+
+def apply_activity_events(
+    client: Client,
+    activities: list[SummaryActivity],
+    events: list[StravaWebhookEvent],
+) -> list[SummaryActivity]:
+    """
+    Returns the athlete's activities with the events applied. Created and updated
+    activities are fetched from Strava, and deleted ones are removed.
+    """
+    activities_by_id = {activity.id: activity for activity in activities}
+
+    for activity_id, event in get_latest_event_per_activity(events).items():
+        if event.aspect_type == "delete":
+            activities_by_id.pop(activity_id, None)
+            continue
+
+        # The activity might have been deleted since this event was sent, or made
+        # private, in which case we can't see it anymore either.
+        activity = get_activity(client, activity_id)
+        if activity is None:
+            activities_by_id.pop(activity_id, None)
+        else:
+            activities_by_id[activity_id] = activity
+
+    # Keep them in the order Strava would give them to us, newest first.
+    return sorted(
+        activities_by_id.values(),
+        key=lambda activity: activity.start_date
+        or dt.datetime.min.replace(tzinfo=dt.timezone.utc),
+        reverse=True,
+    )
+
+
+def apply_pending_webhook_events(
+    client: Optional[Client],
+    s3_client: S3Client,
+    download_status_table: Table,
+    athlete_id: int,
+) -> bool:
+    """
+    Applies every event waiting for an athlete to their stored data in one go. Returns
+    True if their data changed.
+
+    If they don't have a complete download, the events are dropped, since the download
+    will get the latest version of everything anyway. If client is None, we have no way
+    of fetching activities for them, so the events are dropped too.
+    """
+    events = [
+        StravaWebhookEvent.model_validate(event)
+        for event in take_pending_webhook_events_from_dynamo(
+            download_status_table, athlete_id
+        )
+    ]
+    if not events:
+        return False
+
+    download_status_item = get_download_status_item_from_dynamo(
+        download_status_table, athlete_id
+    )
+    if (
+        client is None
+        or download_status_item is None
+        or not download_status_item.complete
+        or download_status_item.error
+        or not is_there_any_data_for_athlete(s3_client, athlete_id)
+    ):
+        print(f"Dropping {len(events)} events for athlete {athlete_id}.")
+        return False
+
+    activities = get_summary_activities_from_s3(s3_client, athlete_id)
+    activities = apply_activity_events(client, activities, events)
+    save_summary_activities_to_s3(s3_client, athlete_id, activities)
+
+    data_version = increment_data_version_in_dynamo(download_status_table, athlete_id)
+    print(
+        f"Applied {len(events)} events for athlete {athlete_id}, "
+        f"data is now version {data_version}."
+    )
+    return True
@@ -0,0 +1,313 @@
+"""
+Does the slow work, so that the API (backend.api) doesn't have to. That's working out
+the data for each tab, which needs all of plotly and pandas, and running jobs, like
+downloading an athlete's activities or applying webhook events. It's deployed as its
+own lambda, and API Gateway sends it every request for a tab's data (/api/data/...).
+
+Locally, run it together with the API with `fastapi run backend/main.py`, or by itself
+with `fastapi run backend/worker.py`.
+"""
+
+import dataclasses
+import datetime as dt
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from fastapi import FastAPI
+from mangum import Mangum
+from stravalib.client import Client
+from stravalib.exc import RateLimitExceeded
+
+from backend.gui.gui import get_all_tabs
+from backend.utils.download import (
+    download_activities,
+    get_estimated_total_activities,
+)
+from backend.utils.dynamodb import (
+    DownloadStatusItem,
+    UserTableItem,
+    get_user_data_row_for_athlete,
+    get_user_data_row_for_athlete_id,
+    get_user_row_and_download_status_from_dynamo,
+    save_download_error_to_dynamo,
+    save_user_data_to_dynamo,
+)
+from backend.utils.environment_variables import evm
+from backend.utils.fan_out_download import (
+    DateWindow,
+    download_window,
+    should_fan_out,
+    start_fan_out_download,
+)
+from backend.utils.jobs import (
+    ApplyWebhookEventsJob,
+    DownloadJob,
+    DownloadWindowJob,
+    Job,
+    is_job_payload,
+    job_from_payload,
+)
+from backend.utils.resources import (
+    add_cors_middleware,
+    download_status_table,
+    get_strava_rate_limiter,
+    get_strava_session,
+    job_dispatcher,
+    s3_client,
+    user_table,
+)
+from backend.utils.webhooks import (
+    WEBHOOK_BATCH_SECONDS,
+    apply_pending_webhook_events,
+)
+
+logger = logging.getLogger(__name__)
+
+app = FastAPI(debug=not evm.is_production())
+add_cors_middleware(app)
+mangum_handler = Mangum(app)
+
+
+def register_tab_routes(app: FastAPI) -> None:
+    """
+    Before the app starts, we want to generate all the routes for our tabs.
+    """
+    for tab in get_all_tabs():
+        tab.generate_and_register_route(
+            app, evm, user_table, download_status_table, s3_client
+        )
+
+
+register_tab_routes(app)
+
+
+def run_job(
+    job: Job, get_remaining_seconds: Optional[Callable[[], float]] = None
+) -> None:
+    """
+    Runs a job, however it was dispatched. get_remaining_seconds is only given when
+    running in a lambda, which will be killed when it hits zero.
+    """
+    if isinstance(job, DownloadJob):
+        run_download_job(job, get_remaining_seconds)
+    elif isinstance(job, DownloadWindowJob):
+        run_download_window_job(job)
+    elif isinstance(job, ApplyWebhookEventsJob):
+        apply_webhook_events(job.athlete_id)
+    else:
+        raise ValueError(f"Unknown job: {job}")
+
+
+def run_download_job(
+    job: DownloadJob, get_remaining_seconds: Optional[Callable[[], float]] = None
+) -> None:
+    try:
+        # We need both the athlete's tokens and their download status, and we already
+        # know both of their keys, so they're read together.
+        row, download_status_item = get_user_row_and_download_status_from_dynamo(
+            user_table, download_status_table, job.session_token, job.athlete_id
+        )
+        if (
+            job.lease_owner is not None
+            and download_status_item is not None
+            and download_status_item.lease_owner != job.lease_owner
+        ):
+            print(f"Another download has taken over for athlete {job.athlete_id}.")
+            return
+
+        complete = download_data(
+            row,
+            job.resume,
+            get_remaining_seconds,
+            download_status_item,
+            job.reserved_requests,
+        )
+        if not complete:
+            # We ran out of time, so carry on in a fresh invocation. Whatever was
+            # reserved for this job has been used (or its window has ended) by now,
+            # so the next one takes tokens as it goes.
+            job_dispatcher.dispatch(
+                dataclasses.replace(job, resume=True, reserved_requests=0)
+            )
+    except RateLimitExceeded as e:
+        # Not really an error on our part. The download gets queued again the next
+        # time the frontend checks the data status.
+        save_download_error_to_dynamo(
+            download_status_table,
+            job.athlete_id,
+            dt.datetime.now(dt.timezone.utc),
+            "Strava is busy right now. Your download will be retried shortly.",
+            rate_limited=True,
+        )
+        logger.warning("Rate limit exceeded while trying to download data.")
+        logger.exception(e)
+    except Exception as e:
+        save_download_error_to_dynamo(
+            download_status_table,
+            job.athlete_id,
+            dt.datetime.now(dt.timezone.utc),
+            "There was an error while trying to download your data. Please try again later.",  # noqa: E501
+        )
+        logger.error("Exception while trying to download data.")
+        logger.exception(e)
+
+
+def download_data(
+    row: UserTableItem,
+    resume: bool = False,
+    get_remaining_seconds: Optional[Callable[[], float]] = None,
+    download_status_item: Optional[DownloadStatusItem] = None,
+    reserved_requests: int = 0,
+) -> bool:
+    """
+    Downloads the athlete's data, returning True if it finished, or False if it ran
+    out of time and needs to be resumed. reserved_requests were already taken from
+    the shared quota when the download was queued, so they're used up first.
+    """
+    print("Downloading user data...")
+    print(f"Athlete ID is {row.athlete_id}")
+
+    # Set the clients access token for the user.
+    client = Client(
+        access_token=row.access_token,
+        rate_limiter=get_strava_rate_limiter(),
+        requests_session=get_strava_session(reserved_requests),
+    )
+
+    estimated_total_activities = None
+    if not resume:
+        # Athletes with loads of activities get their download split up by date, and
+        # downloaded by lots of jobs at the same time.
+        estimated_total_activities = get_estimated_total_activities(
+            client, row.athlete_id
+        )
+        if estimated_total_activities is not None and should_fan_out(
+            estimated_total_activities
+        ):
+            start_fan_out_download(
+                client,
+                s3_client,
+                download_status_table,
+                row.athlete_id,
+                estimated_total_activities,
+                lambda window: job_dispatcher.dispatch(
+                    DownloadWindowJob(
+                        athlete_id=row.athlete_id,
+                        session_token=row.session_token,
+                        window_index=window.index,
+                        after=int(window.after.timestamp()) if window.after else None,
+                        before=(
+                            int(window.before.timestamp()) if window.before else None
+                        ),
+                        fan_out_id=window.fan_out_id,
+                    )
+                ),
+            )
+            return True
+
+    return download_activities(
+        client,
+        s3_client,
+        download_status_table,
+        row.athlete_id,
+        resume=resume,
+        get_remaining_seconds=get_remaining_seconds,
+        estimated_total_activities=estimated_total_activities,
+        download_status_item=download_status_item,
+    )
+
+
+def run_download_window_job(job: DownloadWindowJob) -> None:
+    if job.fan_out_id is None:
+        # Sent before windows knew which fan out they belonged to, so there's no way
+        # to tell if it's still wanted.
+        print(f"Ignoring window {job.window_index}, which has no fan out id.")
+        return
+
+    window = DateWindow(
+        index=job.window_index,
+        after=(
+            dt.datetime.fromtimestamp(job.after, tz=dt.timezone.utc)
+            if job.after is not None
+            else None
+        ),
+        before=(
+            dt.datetime.fromtimestamp(job.before, tz=dt.timezone.utc)
+            if job.before is not None
+            else None
+        ),
+        fan_out_id=job.fan_out_id,
+    )
+    try:
+        download_window_data(job.session_token, window)
+    except Exception as e:
+        save_download_error_to_dynamo(
+            download_status_table,
+            job.athlete_id,
+            dt.datetime.now(dt.timezone.utc),
+            "There was an error while trying to download your data. Please try again later.",  # noqa: E501
+            rate_limited=isinstance(e, RateLimitExceeded),
+        )
+        logger.error(f"Exception while trying to download window {window.index}.")
+        logger.exception(e)
+
+
+def download_window_data(session_token: str, window: DateWindow) -> None:
+    row = get_user_data_row_for_athlete(user_table, session_token)
+    client = Client(
+        access_token=row.access_token,
+        rate_limiter=get_strava_rate_limiter(),
+        requests_session=get_strava_session(),
+    )
+    download_window(client, s3_client, download_status_table, row.athlete_id, window)
+
+
+def apply_webhook_events(athlete_id: int) -> None:
+    # Give any other events from the same upload a chance to arrive first.
+    time.sleep(WEBHOOK_BATCH_SECONDS)
+    apply_pending_webhook_events(
+        get_client_for_athlete_id(athlete_id),
+        s3_client,
+        download_status_table,
+        athlete_id,
+    )
+
+
+def get_client_for_athlete_id(athlete_id: int) -> Optional[Client]:
+    """
+    Returns a client for an athlete who isn't necessarily logged in, refreshing their
+    access token if it has expired. Returns None if we don't have a token for them.
+    """
+    row = get_user_data_row_for_athlete_id(user_table, athlete_id)
+    if row is None:
+        return None
+
+    client = Client(
+        access_token=row.access_token,
+        rate_limiter=get_strava_rate_limiter(),
+        requests_session=get_strava_session(),
+    )
+    if row.expires_at < time.time():
+        access_info = client.refresh_access_token(
+            client_id=evm.get_strava_client_id(),
+            client_secret=evm.get_strava_client_secret(),
+            refresh_token=row.refresh_token,
+        )
+        save_user_data_to_dynamo(user_table, row.session_token, athlete_id, access_info)
+        client.access_token = access_info["access_token"]
+    return client
+
+
+def handler(event: dict[str, Any], context: Any) -> Any:
+    """
+    The worker lambda's entry point. Jobs are run directly, and anything else is a
+    request for a tab's data.
+    """
+    if is_job_payload(event):
+        run_job(
+            job_from_payload(event),
+            lambda: context.get_remaining_time_in_millis() / 1000,
+        )
+        return None
+    return mangum_handler(event, context)
@@ -0,0 +1,431 @@
+"""
+Measures how long the backend takes to cold start, so it can be compared across
+commits. Run it from the backend folder:
+
+    python -m benchmarks.cold_start --runs 10 --output before.json
+    (make some changes)
+    python -m benchmarks.cold_start --runs 10 --output after.json --compare before.json
+
+Every measurement happens in a fresh interpreter, like a new lambda container would.
+There are two kinds:
+
+1. Imports. `python -X importtime -c "import backend.api"` (and the same for
+   backend.worker) is run a bunch of times, and the total import time is recorded,
+   along with how long each module in the backend package took.
+2. Routes. For each route, a fresh interpreter imports whichever lambda serves it (the
+   worker for tab data, and the API for everything else) and sends a single API
+   Gateway event through its handler, and we time how long it takes until the
+   response comes back. AWS is faked with moto and filled with a test athlete, so
+   this doesn't need an AWS account. Because moto itself imports boto3, the import
+   part of these timings doesn't include boto3. Use the import numbers for that.
+"""
+
+import argparse
+import dataclasses
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from typing import Any, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENV_FILE = os.path.join(BACKEND_DIR, ".example.env")
+ACTIVITIES_FILE = os.path.join(BACKEND_DIR, "tests", "fixtures", "94896104.json")
+
+# The two lambdas, see template.yaml.
+API_ENTRY_POINT = "backend.api"
+WORKER_ENTRY_POINT = "backend.worker"
+ENTRY_POINTS = [API_ENTRY_POINT, WORKER_ENTRY_POINT]
+
+# A cheap route, the route every visitor polls, and a tab which has to crunch through
+# all of an athlete's activities.
+DEFAULT_ROUTES = ["/api/tabs", "/api/data_status", "/api/data/general_trivia"]
+
+SESSION_TOKEN = "benchmark-session"
+ATHLETE_ID = 94896104
+
+
+@dataclasses.dataclass
+class ImportTime:
+    module: str
+    # Both in microseconds, like python reports them.
+    self_us: int
+    cumulative_us: int
+
+
+def parse_import_times(stderr: str) -> list[ImportTime]:
+    """
+    Parses the output of `python -X importtime`, which looks like:
+
+        import time: self [us] | cumulative | imported package
+        import time:       286 |     139179 |   boto3
+    """
+    import_times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, module = line[len("import time:") :].split("|")
+        if not self_us.strip().isdigit():
+            continue  # The header
+        import_times.append(
+            ImportTime(module.strip(), int(self_us), int(cumulative_us))
+        )
+    return import_times
+
+
+def summarise(values: list[float]) -> dict[str, float]:
+    return {
+        "median": round(statistics.median(values), 2),
+        "min": round(min(values), 2),
+        "max": round(max(values), 2),
+    }
+
+
+def get_environment() -> dict[str, str]:
+    """
+    The app won't start without its environment variables, so fill in any that aren't
+    set from the example env file.
+    """
+    env = dict(os.environ)
+    with open(ENV_FILE) as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if "=" in line:
+                key, value = line.split("=", 1)
+                env.setdefault(key.strip(), value.strip())
+    env.setdefault("AWS_DEFAULT_REGION", "ap-southeast-2")
+    return env
+
+
+def get_entry_point(route: str) -> str:
+    return WORKER_ENTRY_POINT if route.startswith("/api/data/") else API_ENTRY_POINT
+
+
+def benchmark_imports(runs: int, module: str) -> dict[str, Any]:
+    totals_ms = []
+    modules_ms: dict[str, list[tuple[float, float]]] = {}
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BACKEND_DIR,
+            env=get_environment(),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        for import_time in parse_import_times(result.stderr):
+            if import_time.module == module:
+                totals_ms.append(import_time.cumulative_us / 1000)
+            if import_time.module.split(".")[0] == "backend":
+                modules_ms.setdefault(import_time.module, []).append(
+                    (import_time.self_us / 1000, import_time.cumulative_us / 1000)
+                )
+
+    return {
+        "module": module,
+        "total_ms": summarise(totals_ms),
+        "modules": {
+            name: {
+                "self_ms": round(statistics.median(t[0] for t in times), 2),
+                "cumulative_ms": round(statistics.median(t[1] for t in times), 2),
+            }
+            for name, times in sorted(modules_ms.items())
+        },
+    }
+
+
+def benchmark_routes(routes: list[str], runs: int) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for route in routes:
+        measurements = []
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.cold_start", "--measure", route],
+                cwd=BACKEND_DIR,
+                env=get_environment(),
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            # The app prints plenty of its own stuff, so our result is the last line.
+            measurements.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        results[route] = {
+            "status_codes": sorted({m["status_code"] for m in measurements}),
+            "import_ms": summarise([m["import_ms"] for m in measurements]),
+            "handler_ms": summarise([m["handler_ms"] for m in measurements]),
+            "first_response_ms": summarise(
+                [m["import_ms"] + m["handler_ms"] for m in measurements]
+            ),
+        }
+    return results
+
+
+def get_api_gateway_event(path: str) -> dict[str, Any]:
+    """
+    The kind of event API Gateway (the REST flavour, which template.yaml uses) sends
+    the lambda.
+    """
+    return {
+        "resource": "/{proxy+}",
+        "path": path,
+        "httpMethod": "GET",
+        "headers": {
+            "Host": "localhost",
+            "Cookie": f"session_token={SESSION_TOKEN}",
+        },
+        "multiValueHeaders": {
+            "Host": ["localhost"],
+            "Cookie": [f"session_token={SESSION_TOKEN}"],
+        },
+        "queryStringParameters": None,
+        "multiValueQueryStringParameters": None,
+        "pathParameters": {"proxy": path.lstrip("/")},
+        "stageVariables": None,
+        "requestContext": {
+            "resourcePath": "/{proxy+}",
+            "httpMethod": "GET",
+            "path": path,
+            "stage": "prod",
+            "identity": {"sourceIp": "127.0.0.1"},
+        },
+        "body": None,
+        "isBase64Encoded": False,
+    }
+
+
+def fill_fake_aws() -> None:
+    """
+    Makes the tables and bucket the app uses, with an athlete who is logged in and has
+    already downloaded their data.
+    """
+    import boto3
+
+    from backend.utils.s3 import BUCKET_NAME
+
+    dynamodb = boto3.resource("dynamodb")
+    tables = {
+        "user-table": ("session_token", "S"),
+        "download-status-table": ("athlete_id", "N"),
+        "rate-limit-table": ("bucket_key", "S"),
+    }
+    for table_name, (key, key_type) in tables.items():
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": key, "AttributeType": key_type}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+    now = int(dt.datetime.now(dt.timezone.utc).timestamp())
+    dynamodb.Table("user-table").put_item(
+        Item={
+            "session_token": SESSION_TOKEN,
+            "athlete_id": ATHLETE_ID,
+            "access_token": "access",
+            "refresh_token": "refresh",
+            "expires_at": now + 6 * 60 * 60,
+        }
+    )
+    dynamodb.Table("download-status-table").put_item(
+        Item={
+            "athlete_id": ATHLETE_ID,
+            "last_download_time": now,
+            "status_message": "Data downloaded.",
+            "time_to_live": now + 7 * 24 * 60 * 60,
+            "download_error": False,
+            "complete": True,
+        }
+    )
+
+    s3_client = boto3.client("s3", region_name="ap-southeast-2")
+    s3_client.create_bucket(
+        Bucket=BUCKET_NAME,
+        CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+    )
+    with open(ACTIVITIES_FILE) as f:
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=str(ATHLETE_ID), Body=f.read())
+
+
+def measure_route(path: str) -> dict[str, Any]:
+    """
+    Runs in a fresh interpreter. Imports the app and sends it a single request.
+    """
+    import importlib
+    import time
+
+    from moto import mock_aws
+
+    with mock_aws():
+        fill_fake_aws()
+
+        start = time.perf_counter()
+        entry_point = importlib.import_module(get_entry_point(path))
+        imported = time.perf_counter()
+        response = entry_point.handler(get_api_gateway_event(path), None)
+        done = time.perf_counter()
+
+    return {
+        "status_code": response["statusCode"],
+        "import_ms": (imported - start) * 1000,
+        "handler_ms": (done - imported) * 1000,
+    }
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(routes: list[str], runs: int) -> dict[str, Any]:
+    return {
+        "commit": get_commit(),
+        "created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "runs": runs,
+        "imports": {module: benchmark_imports(runs, module) for module in ENTRY_POINTS},
+        "routes": benchmark_routes(routes, runs),
+    }
+
+
+def format_change(before: float, after: float) -> str:
+    change = after - before
+    percent = f" ({change / before:+.0%})" if before else ""
+    return f"{before:9.1f} -> {after:9.1f} ms  {change:+9.1f} ms{percent}"
+
+
+def compare_reports(
+    before: dict[str, Any], after: dict[str, Any], top_modules: int = 10
+) -> str:
+    """
+    Describes what changed between two reports, looking at the medians.
+    """
+    lines = [f"Comparing {before.get('commit')} -> {after.get('commit')}", ""]
+    for module, imports in after["imports"].items():
+        if module in before["imports"]:
+            lines.append(
+                f"{'import ' + module:40} "
+                + format_change(
+                    before["imports"][module]["total_ms"]["median"],
+                    imports["total_ms"]["median"],
+                )
+            )
+    for route, result in after["routes"].items():
+        if route in before["routes"]:
+            lines.append(
+                f"{route:40} "
+                + format_change(
+                    before["routes"][route]["first_response_ms"]["median"],
+                    result["first_response_ms"]["median"],
+                )
+            )
+
+    # The modules whose own import time changed the most, wherever they were imported.
+    before_modules = get_slowest_modules(before)
+    after_modules = get_slowest_modules(after)
+    changes = sorted(
+        (
+            (
+                after_modules.get(name, {"self_ms": 0.0})["self_ms"]
+                - before_modules.get(name, {"self_ms": 0.0})["self_ms"],
+                name,
+            )
+            for name in set(before_modules) | set(after_modules)
+        ),
+        key=lambda change: abs(change[0]),
+        reverse=True,
+    )
+    lines += ["", "Biggest changes in module import time (self):"]
+    for change, name in changes[:top_modules]:
+        lines.append(f"  {name:50} {change:+9.1f} ms")
+    return "\n".join(lines)
+
+
+def get_slowest_modules(report: dict[str, Any]) -> dict[str, dict[str, float]]:
+    """
+    Combines the module timings from every entry point. Modules imported by both are
+    counted at whichever was slowest.
+    """
+    modules: dict[str, dict[str, float]] = {}
+    for imports in report["imports"].values():
+        for name, times in imports["modules"].items():
+            if name not in modules or times["self_ms"] > modules[name]["self_ms"]:
+                modules[name] = times
+    return modules
+
+
+def format_report(report: dict[str, Any], top_modules: int = 10) -> str:
+    lines = [
+        f"Commit {report['commit']}, python {report['python']}, "
+        f"{report['runs']} runs each (median, min - max)",
+        "",
+    ]
+    for module, imports in report["imports"].items():
+        total = imports["total_ms"]
+        lines.append(
+            f"{'import ' + module:40} {total['median']:9.1f} ms "
+            f"({total['min']:.1f} - {total['max']:.1f})"
+        )
+    for route, result in report["routes"].items():
+        first_response = result["first_response_ms"]
+        lines.append(
+            f"{route:40} {first_response['median']:9.1f} ms "
+            f"({first_response['min']:.1f} - {first_response['max']:.1f}), "
+            f"status {', '.join(str(code) for code in result['status_codes'])}"
+        )
+
+    slowest = sorted(
+        get_slowest_modules(report).items(),
+        key=lambda module: module[1]["cumulative_ms"],
+        reverse=True,
+    )
+    lines += ["", "Slowest backend modules to import (cumulative, self):"]
+    for name, times in slowest[:top_modules]:
+        lines.append(
+            f"  {name:50} {times['cumulative_ms']:9.1f} ms {times['self_ms']:9.1f} ms"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--route", action="append", dest="routes", help="Can be given more than once."
+    )
+    parser.add_argument("--output", help="Where to save the report, as JSON.")
+    parser.add_argument("--compare", help="A previous report to compare against.")
+    # Used by benchmark_routes to take a single measurement in a fresh interpreter.
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure_route(args.measure)))
+        return
+
+    report = run_benchmark(args.routes or DEFAULT_ROUTES, args.runs)
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print(compare_reports(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+from benchmarks.cold_start import ImportTime, compare_reports, parse_import_times
+
+IMPORT_TIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       286 |     139179 |   boto3
+import time:       502 |    1466430 | backend.main
+"""
+
+
+def test_parse_import_times() -> None:
+    assert parse_import_times(IMPORT_TIME_OUTPUT) == [
+        ImportTime("boto3", 286, 139179),
+        ImportTime("backend.main", 502, 1466430),
+    ]
+
+
+def get_report(commit: str, total_ms: float, tabs_ms: float) -> dict:
+    return {
+        "commit": commit,
+        "imports": {
+            "backend.api": {
+                "total_ms": {"median": total_ms},
+                "modules": {"backend.api": {"self_ms": total_ms / 10}},
+            }
+        },
+        "routes": {"/api/tabs": {"first_response_ms": {"median": tabs_ms}}},
+    }
+
+
+def test_compare_reports() -> None:
+    comparison = compare_reports(get_report("a", 1000, 400), get_report("b", 500, 500))
+
+    assert "Comparing a -> b" in comparison
+    assert "1000.0 ->     500.0 ms     -500.0 ms (-50%)" in comparison
+    assert "400.0 ->     500.0 ms     +100.0 ms (+25%)" in comparison
+    assert "backend.api" in comparison
@@ -1,4 +1,13 @@
+import datetime as dt
+from typing import Any
+
+from backend.gui.tabs import (
+    cumulative_kudos_tab,
+    cumulative_time_tab,
+)
 from backend.statistics.plots import cumulative_anything
+from backend.utils.environment_variables import evm
+from tests.factories.activity_factories import ActivityFactory
 
 
 class TestCumulativeTimeSpent:
@@ -115,3 +124,116 @@ class TestCumulativeKudos:
             cumulative_anything.get_title_for_cumulative_kudos_plot,
         )
         plot_function(real_activities)
+
+
+def test_cumulative_data() -> None:
+    activities = [
+        ActivityFactory(
+            type="Run", start_date_local=dt.datetime(2020, 1, 2, 8), moving_time=3600
+        ),
+        ActivityFactory(
+            type="Ride", start_date_local=dt.datetime(2020, 1, 2, 9), moving_time=1800
+        ),
+        ActivityFactory(
+            type="Run", start_date_local=dt.datetime(2020, 12, 31), moving_time=7200
+        ),
+        ActivityFactory(
+            type="Run", start_date_local=dt.datetime(2021, 1, 1), moving_time=3600
+        ),
+    ]
+
+    plots = {
+        "time": cumulative_anything.CumulativePlot(
+            "moving_time",
+            cumulative_anything.conversion_function_for_timedeltas,
+            "Hours",
+            cumulative_anything.get_title_for_cumulative_time_plot,
+        )
+    }
+    cumulative_data = cumulative_anything.get_cumulative_data(
+        cumulative_anything.get_activity_columns(plots, iter(activities)), "time"
+    )
+
+    assert set(cumulative_data) == {"All", "Run", "Ride"}
+    assert set(cumulative_data["All"]) == {2020, 2021}
+    assert set(cumulative_data["Ride"]) == {2020}
+
+    all_2020 = cumulative_data["All"][2020]
+    assert len(all_2020) == 366
+    assert all_2020[0] == 0
+    assert all_2020[1] == all_2020[364] == 1.5
+    # 2020 was a leap year, so the 31st of December is the 366th day.
+    assert all_2020[365] == 3.5
+    assert cumulative_data["Run"][2020][1] == 1
+    assert cumulative_data["Ride"][2020][365] == 0.5
+    assert list(cumulative_data["Run"][2021][:2]) == [1, 1]
+
+
+def test_shared_plots_match_single_plots(some_basic_runs_and_rides) -> None:
+    plots = {
+        "distance": cumulative_anything.CumulativePlot(
+            "distance",
+            cumulative_anything.conversion_function_for_distance_to_km,
+            "Kilometers",
+            cumulative_anything.get_title_for_cumulative_distance_plot,
+        ),
+        # None of the factory activities have any kudos.
+        "kudos": cumulative_anything.CumulativePlot(
+            "kudos_count",
+            cumulative_anything.conversion_function_for_int,
+            "Kudos",
+            cumulative_anything.get_title_for_cumulative_kudos_plot,
+        ),
+    }
+
+    figures = cumulative_anything.get_shared_plot_function(plots)(
+        iter(some_basic_runs_and_rides)
+    )
+
+    for key, plot in plots.items():
+        single_figure = cumulative_anything.get_plot_function(
+            plot.activity_attribute_name,
+            plot.conversion_function,
+            plot.yaxis_title,
+            plot.plot_title_creator,
+        )(iter(some_basic_runs_and_rides))
+        assert figures[key].to_json() == single_figure.to_json()
+    assert len(figures["kudos"].data) == 0
+
+
+def test_only_the_plots_asked_for_are_worked_out(some_basic_runs_and_rides) -> None:
+    converted: list[str] = []
+
+    def get_plot(attribute_name: str) -> cumulative_anything.CumulativePlot:
+        def convert(value: Any) -> float:
+            converted.append(attribute_name)
+            return float(value)
+
+        return cumulative_anything.CumulativePlot(
+            attribute_name,
+            convert,
+            "Things",
+            cumulative_anything.get_title_for_cumulative_kudos_plot,
+        )
+
+    plot_function = cumulative_anything.get_shared_plot_function(
+        {"kudos": get_plot("kudos_count"), "photos": get_plot("photo_count")}
+    )
+    figures = plot_function(iter(some_basic_runs_and_rides), ["photos"])
+
+    assert list(figures) == ["photos"]
+    assert set(converted) == {"photo_count"}
+
+
+def test_cumulative_tabs_only_make_their_own_plot(some_basic_runs_and_rides) -> None:
+    tab_data = cumulative_time_tab.generate_and_return_shared_tab_data(
+        iter(some_basic_runs_and_rides), evm, 1
+    )
+
+    assert tab_data == {
+        cumulative_time_tab: cumulative_time_tab.generate_and_return_tab_data(
+            iter(some_basic_runs_and_rides), evm, 1
+        )
+    }
+    # The frontend still needs to know to show them as plots.
+    assert cumulative_kudos_tab.get_response_type() == "PlotTab"
@@ -0,0 +1,62 @@
+from typing import Any
+
+from backend.statistics.trivia import AggregateTidbit, TriviaProcessor
+from backend.statistics.trivia.summary_trivia import MostPeopleOnAGroupRunTidbit
+from tests.factories.activity_factories import ActivityFactory
+
+
+class LongestActivityTidbit(AggregateTidbit):
+    def __init__(self) -> None:
+        super().__init__("max", "distance")
+
+    def get_description(self) -> str:
+        return "Longest Activity"
+
+    def format_value(self, value: Any) -> str:
+        return f"{int(value)} meters"
+
+
+class TotalRunDistanceTidbit(AggregateTidbit):
+    def __init__(self) -> None:
+        super().__init__("sum", "distance", "Run")
+
+    def get_description(self) -> str:
+        return "Total Run Distance"
+
+    def format_value(self, value: Any) -> str:
+        return f"{int(value)} meters"
+
+
+def test_aggregate_tidbits_are_mixed_in_with_normal_ones() -> None:
+    processor = TriviaProcessor()
+    processor.register_tidbit(LongestActivityTidbit())
+    processor.register_tidbit(MostPeopleOnAGroupRunTidbit())
+    processor.register_tidbit(TotalRunDistanceTidbit())
+
+    activities = [
+        ActivityFactory(id=1, type="Run", distance=5.0, athlete_count=1),
+        ActivityFactory(id=2, type="Ride", distance=9.0, athlete_count=3),
+        ActivityFactory(id=3, type="Run", distance=7.0, athlete_count=1),
+        # Ties go to whichever came first.
+        ActivityFactory(id=4, type="Ride", distance=9.0, athlete_count=1),
+        ActivityFactory(id=5, type="Run", distance=None, athlete_count=1),
+    ]
+    data = processor.get_data(activity for activity in activities)
+
+    assert [(description, tidbit) for description, tidbit, _ in data] == [
+        ("Longest Activity", "9 meters"),
+        ("Most People on Group Activity", "3 People"),
+        ("Total Run Distance", "12 meters"),
+    ]
+    assert data[0][2].url == "https://www.strava.com/activities/2"
+    assert data[2][2] is None
+
+
+def test_aggregate_tidbits_with_no_activities() -> None:
+    processor = TriviaProcessor()
+    processor.register_tidbit(LongestActivityTidbit())
+    processor.register_tidbit(TotalRunDistanceTidbit())
+
+    assert processor.get_data(_ for _ in []) == [
+        ("Total Run Distance", "0 meters", None)
+    ]
@@ -0,0 +1,117 @@
+import json
+import math
+import random
+
+import pytest
+from stravalib.unit_helper import _Quantity
+
+from backend.statistics.trivia import TriviaProcessor
+from backend.statistics.trivia.percentile_trivia import (
+    DistancePercentilesTidbit,
+    PacePercentilesTidbit,
+    percentile_trivia,
+)
+from backend.statistics.utils.quantiles import QuantileSketch
+from tests.factories.activity_factories import ActivityFactory
+
+QUANTILES = [0.1, 0.5, 0.9]
+
+
+def get_exact_quantiles(values: list[float]) -> list[float]:
+    values = sorted(values)
+    return [values[max(1, math.ceil(q * len(values))) - 1] for q in QUANTILES]
+
+
+def get_rank(values: list[float], value: float) -> float:
+    return sum(1 for v in values if v <= value) / len(values)
+
+
+def test_small_sketches_are_exact() -> None:
+    rng = random.Random(1)
+    values = [rng.uniform(0, 100) for _ in range(150)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.get_quantiles(QUANTILES) == get_exact_quantiles(values)
+
+
+def test_large_sketches_are_close_and_small() -> None:
+    rng = random.Random(2)
+    values = [rng.lognormvariate(0, 1) for _ in range(20_000)]
+    sketch = QuantileSketch()
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.get_size() < 1000
+    for quantile, value in zip(QUANTILES, sketch.get_quantiles(QUANTILES)):
+        assert get_rank(values, value) == pytest.approx(quantile, abs=0.02)
+
+
+def test_merged_sketches() -> None:
+    rng = random.Random(3)
+    values = [rng.uniform(0, 100) for _ in range(5_000)]
+    sketches = [QuantileSketch() for _ in range(4)]
+    for i, value in enumerate(values):
+        sketches[i % 4].add(value)
+
+    merged = QuantileSketch.from_state(json.loads(json.dumps(sketches[0].to_state())))
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+
+    assert merged.count == len(values)
+    for quantile, value in zip(QUANTILES, merged.get_quantiles(QUANTILES)):
+        assert get_rank(values, value) == pytest.approx(quantile, abs=0.02)
+
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(k=100))
+
+
+def test_percentile_tidbits() -> None:
+    processor = TriviaProcessor()
+    processor.register_tidbit(PacePercentilesTidbit("Run"))
+    processor.register_tidbit(PacePercentilesTidbit("Ride"))
+    processor.register_tidbit(DistancePercentilesTidbit("Run"))
+    processor.register_tidbit(DistancePercentilesTidbit("Walk"))
+
+    activities = [
+        ActivityFactory(
+            type=activity_type,
+            # 4, 5 and 6 minute kms.
+            average_speed=_Quantity(1000 / (60 * minutes)),
+            distance=float(minutes * 1000),
+        )
+        for minutes in [4, 5, 6]
+        for activity_type in ["Run", "Ride"]
+    ]
+
+    assert processor.get_data(iter(activities)) == [
+        (
+            "Run Pace (10th / 50th / 90th Percentiles)",
+            "4:00/km / 5:00/km / 6:00/km",
+            None,
+        ),
+        (
+            "Ride Pace (10th / 50th / 90th Percentiles)",
+            "10.0km/h / 12.0km/h / 15.0km/h",
+            None,
+        ),
+        (
+            "Run Distance (10th / 50th / 90th Percentiles)",
+            "4.00km / 5.00km / 6.00km",
+            None,
+        ),
+    ]
+
+
+def test_percentile_trivia_sharded(some_basic_runs_and_rides) -> None:
+    middle = len(some_basic_runs_and_rides) // 2
+
+    state = percentile_trivia.merge_states(
+        percentile_trivia.process_activities(iter(some_basic_runs_and_rides[:middle])),
+        percentile_trivia.process_activities(iter(some_basic_runs_and_rides[middle:])),
+    )
+
+    assert percentile_trivia.get_data_from_state(
+        json.loads(json.dumps(state))
+    ) == percentile_trivia.get_data(iter(some_basic_runs_and_rides))
@@ -0,0 +1,197 @@
+import datetime as dt
+
+from backend.statistics.trivia import TriviaProcessor
+from backend.statistics.trivia.streak_trivia import (
+    CurrentStreakTidbit,
+    LongestGapTidbit,
+    LongestStreakTidbit,
+    LongestWeeklyStreakTidbit,
+    streak_trivia,
+)
+from backend.statistics.utils.streaks import (
+    DayBitset,
+    Streak,
+    get_current_streak,
+    get_longest_gap,
+    get_longest_streak,
+    get_longest_weekly_streak,
+)
+from tests.factories.activity_factories import ActivityFactory
+
+
+def get_days(*dates: dt.date) -> DayBitset:
+    days = DayBitset()
+    for date in dates:
+        days.add(date)
+    return days
+
+
+def date_range(start: dt.date, days: int) -> list[dt.date]:
+    return [start + dt.timedelta(days=i) for i in range(days)]
+
+
+def test_day_bitset_runs() -> None:
+    # Added out of order, and with a duplicate, on purpose.
+    days = get_days(
+        dt.date(2023, 1, 5),
+        dt.date(2023, 1, 1),
+        dt.date(2023, 1, 2),
+        dt.date(2023, 1, 6),
+        dt.date(2023, 1, 2),
+        dt.date(2023, 1, 7),
+    )
+
+    assert len(days) == 5
+    assert dt.date(2023, 1, 6) in days
+    assert dt.date(2023, 1, 3) not in days
+    assert dt.date(2022, 12, 31) not in days
+    assert list(days.get_runs()) == [
+        Streak(dt.date(2023, 1, 1), dt.date(2023, 1, 2)),
+        Streak(dt.date(2023, 1, 5), dt.date(2023, 1, 7)),
+    ]
+
+
+def test_day_bitset_union_and_state() -> None:
+    earlier = get_days(*date_range(dt.date(2023, 1, 1), 3))
+    later = get_days(*date_range(dt.date(2023, 1, 4), 2), dt.date(2023, 2, 1))
+
+    union = DayBitset.from_state(later.to_state()).union(earlier)
+
+    assert list(union.get_runs()) == [
+        Streak(dt.date(2023, 1, 1), dt.date(2023, 1, 5)),
+        Streak(dt.date(2023, 2, 1), dt.date(2023, 2, 1)),
+    ]
+    assert list(DayBitset().union(DayBitset()).get_runs()) == []
+
+
+def test_longest_streak_and_gap() -> None:
+    days = get_days(
+        *date_range(dt.date(2023, 1, 1), 3),
+        *date_range(dt.date(2023, 1, 10), 3),
+        dt.date(2023, 1, 14),
+    )
+
+    # Ties go to the first streak.
+    assert get_longest_streak(days) == Streak(dt.date(2023, 1, 1), dt.date(2023, 1, 3))
+    assert get_longest_gap(days) == Streak(dt.date(2023, 1, 4), dt.date(2023, 1, 9))
+    assert get_longest_streak(DayBitset()) is None
+    assert get_longest_gap(get_days(dt.date(2023, 1, 1))) is None
+
+
+def test_current_streak() -> None:
+    days = get_days(*date_range(dt.date(2023, 1, 1), 4))
+
+    assert get_current_streak(days, dt.date(2023, 1, 4)).days == 4  # type: ignore
+    assert get_current_streak(days, dt.date(2023, 1, 5)).days == 4  # type: ignore
+    assert get_current_streak(days, dt.date(2023, 1, 6)) is None
+    assert get_current_streak(DayBitset(), dt.date(2023, 1, 6)) is None
+
+
+def test_longest_weekly_streak() -> None:
+    # 2023-01-02 is a Monday. The first two weeks have 3 days each, the third only has
+    # 2, and then the fourth and fifth have 3 again.
+    days = get_days(
+        dt.date(2023, 1, 2),
+        dt.date(2023, 1, 4),
+        dt.date(2023, 1, 8),
+        dt.date(2023, 1, 9),
+        dt.date(2023, 1, 10),
+        dt.date(2023, 1, 11),
+        dt.date(2023, 1, 16),
+        dt.date(2023, 1, 17),
+        *date_range(dt.date(2023, 1, 23), 3),
+        *date_range(dt.date(2023, 1, 30), 3),
+    )
+
+    assert get_longest_weekly_streak(days, 3) == Streak(
+        dt.date(2023, 1, 2), dt.date(2023, 1, 15)
+    )
+    assert get_longest_weekly_streak(days, 2) == Streak(
+        dt.date(2023, 1, 2), dt.date(2023, 2, 5)
+    )
+    assert get_longest_weekly_streak(days, 4) is None
+
+
+def test_streak_tidbits() -> None:
+    processor = TriviaProcessor()
+    processor.register_tidbit(LongestStreakTidbit("Run"))
+    processor.register_tidbit(
+        CurrentStreakTidbit(
+            get_now=lambda: dt.datetime(2023, 1, 12, 12, tzinfo=dt.timezone.utc)
+        )
+    )
+    processor.register_tidbit(LongestWeeklyStreakTidbit(2))
+    processor.register_tidbit(LongestGapTidbit("Ride"))
+
+    activities = [
+        ActivityFactory(type="Run", start_date_local=dt.datetime(2023, 1, 2, 7)),
+        ActivityFactory(type="Run", start_date_local=dt.datetime(2023, 1, 3, 7)),
+        ActivityFactory(type="Ride", start_date_local=dt.datetime(2023, 1, 4, 7)),
+        ActivityFactory(type="Run", start_date_local=dt.datetime(2023, 1, 5, 7)),
+        ActivityFactory(type="Ride", start_date_local=dt.datetime(2023, 1, 11, 7)),
+        ActivityFactory(type="Run", start_date_local=dt.datetime(2023, 1, 12, 7)),
+    ]
+
+    assert processor.get_data(iter(activities)) == [
+        (
+            "Most Consecutive Days of Run Activities",
+            "2 days (2023-01-02 to 2023-01-03)",
+            None,
+        ),
+        ("Current Streak of Activities", "2 days (since 2023-01-11)", None),
+        (
+            "Most Consecutive Weeks With 2+ Days of Activities",
+            "2 weeks (2023-01-02 to 2023-01-15)",
+            None,
+        ),
+        (
+            "Longest Break Between Ride Activities",
+            "6 days (2023-01-05 to 2023-01-10)",
+            None,
+        ),
+    ]
+
+
+def test_current_streak_uses_the_athletes_date() -> None:
+    brisbane = "(GMT+10:00) Australia/Brisbane"
+    activities = [
+        ActivityFactory(
+            start_date=dt.datetime(2023, 1, day, 21, tzinfo=dt.timezone.utc),
+            start_date_local=dt.datetime(2023, 1, day + 1, 7),
+            timezone=brisbane,
+        )
+        for day in [10, 11]
+    ]
+    # It's still the 13th in UTC, but it's the 14th in Brisbane, so there's already
+    # been a whole day since their last activity on the 12th.
+    now = dt.datetime(2023, 1, 13, 15, tzinfo=dt.timezone.utc)
+
+    tidbit = CurrentStreakTidbit(get_now=lambda: now)
+    for activity in activities:
+        tidbit.process_activity(activity)
+    assert tidbit.get_today() == dt.date(2023, 1, 14)
+    assert tidbit.get_tidbit() is None
+
+    # Without a time zone, there's nothing to go on but UTC.
+    tidbit = CurrentStreakTidbit(get_now=lambda: now)
+    for activity in activities:
+        tidbit.process_activity(activity.model_copy(update={"timezone": None}))
+    assert tidbit.get_tidbit() == "2 days (since 2023-01-11)"
+
+
+def test_streak_trivia_sharded(some_basic_runs_and_rides) -> None:
+    """
+    Working out the streaks in two halves and merging them gives the same answer as
+    going through everything at once.
+    """
+    activities = sorted(some_basic_runs_and_rides, key=lambda a: a.start_date_local)
+    middle = len(activities) // 2
+
+    state = streak_trivia.merge_states(
+        streak_trivia.process_activities(iter(activities[:middle])),
+        streak_trivia.process_activities(iter(activities[middle:])),
+    )
+
+    assert streak_trivia.get_data_from_state(state) == streak_trivia.get_data(
+        iter(activities)
+    )
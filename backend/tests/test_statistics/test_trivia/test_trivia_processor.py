@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from stravalib.model import DetailedActivity
+
+from backend.gui.tabs import (
+    general_trivia_tab,
+    min_and_max_distance_activities_tab,
+    min_and_max_elevation_activities_tab,
+)
+from backend.statistics.trivia import (
+    TriviaProcessor,
+    TriviaTidbitBase,
+    get_data_for_processors,
+)
+from backend.statistics.trivia.min_max_summary_trivia import (
+    min_and_max_distance_trivia_processor,
+    min_and_max_elevation_trivia_processor,
+)
+from backend.statistics.trivia.summary_trivia import general_trivia
+from backend.tabs.trivia_tabs import get_trivia_tab_dataframes
+from backend.utils.environment_variables import evm
+from tests.factories.activity_factories import ActivityFactory
+
+
+class ActivityCountTidbit(TriviaTidbitBase):
+    def __init__(self, activity_types: Optional[set[str]] = None) -> None:
+        self.activity_types = activity_types
+        self.count = 0
+
+    def get_activity_types(self) -> Optional[set[str]]:
+        return self.activity_types
+
+    def reset_tidbit(self) -> None:
+        self.count = 0
+
+    def process_activity(self, activity: DetailedActivity) -> None:
+        self.count += 1
+
+    def get_tidbit(self) -> Optional[str]:
+        return f"{self.count}"
+
+    def get_state(self) -> dict[str, Any]:
+        return {"count": self.count}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        self.count = state["count"]
+
+    def merge_state(self, later_state: dict[str, Any]) -> None:
+        self.count += later_state["count"]
+
+    def get_description(self) -> str:
+        return f"{sorted(self.activity_types or [])} Activities"
+
+
+def test_tidbits_are_only_given_the_activity_types_they_want() -> None:
+    processor = TriviaProcessor()
+    processor.register_tidbit(ActivityCountTidbit({"Run"}))
+    processor.register_tidbit(ActivityCountTidbit())
+    processor.register_tidbit(ActivityCountTidbit({"Run", "Ride"}))
+
+    activities = [
+        ActivityFactory(type="Run"),
+        ActivityFactory(type="Ride"),
+        ActivityFactory(type="Run"),
+        ActivityFactory(type="Swim"),
+    ]
+    data = processor.get_data(activity for activity in activities)
+
+    assert [(description, tidbit) for description, tidbit, _ in data] == [
+        ("['Run'] Activities", "2"),
+        ("[] Activities", "4"),
+        ("['Ride', 'Run'] Activities", "3"),
+    ]
+
+
+def test_processors_can_be_run_together(some_basic_runs_and_rides) -> None:
+    processors = [
+        general_trivia,
+        min_and_max_distance_trivia_processor,
+        min_and_max_elevation_trivia_processor,
+    ]
+    expected = [
+        processor.get_data(iter(some_basic_runs_and_rides)) for processor in processors
+    ]
+
+    activities_seen = 0
+
+    def activities():
+        nonlocal activities_seen
+        for activity in some_basic_runs_and_rides:
+            activities_seen += 1
+            yield activity
+
+    assert get_data_for_processors(processors, activities()) == expected
+    assert activities_seen == len(some_basic_runs_and_rides)
+
+    # Each run of a processor has its own tidbits, so the same one can even be run
+    # twice at once.
+    assert get_data_for_processors(
+        [general_trivia, general_trivia], iter(some_basic_runs_and_rides)
+    ) == [expected[0], expected[0]]
+
+
+def test_processors_can_be_run_by_lots_of_threads_at_once() -> None:
+    processor = TriviaProcessor()
+    processor.register_tidbit(ActivityCountTidbit({"Run"}))
+    lots_of_activities = [
+        [ActivityFactory(type="Run") for _ in range(count)] for count in range(50)
+    ]
+
+    def count_runs(activities: list[DetailedActivity]) -> str:
+        return processor.get_data(iter(activities))[0][1]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        counts = list(executor.map(count_runs, lots_of_activities))
+
+    assert counts == [f"{count}" for count in range(50)]
+    # The registered tidbit itself is never touched.
+    assert processor.tidbits[0].count == 0
+
+
+def test_summary_trivia_tabs_only_work_out_their_own_trivia(
+    some_basic_runs_and_rides,
+) -> None:
+    tabs = [
+        general_trivia_tab,
+        min_and_max_distance_activities_tab,
+        min_and_max_elevation_activities_tab,
+    ]
+    for tab in tabs:
+        shared_tab_data = tab.generate_and_return_shared_tab_data(
+            iter(some_basic_runs_and_rides), evm, 1
+        )
+        assert list(shared_tab_data) == [tab]
+
+
+def test_trivia_tabs_can_be_worked_out_together(some_basic_runs_and_rides) -> None:
+    tabs = [
+        general_trivia_tab,
+        min_and_max_distance_activities_tab,
+        min_and_max_elevation_activities_tab,
+    ]
+    dataframes = get_trivia_tab_dataframes(tabs, iter(some_basic_runs_and_rides))
+
+    for tab in tabs:
+        assert dataframes[tab.get_key()].equals(
+            tab.get_table_dataframe(iter(some_basic_runs_and_rides))
+        )
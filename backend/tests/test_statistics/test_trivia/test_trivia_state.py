@@ -0,0 +1,67 @@
+import datetime as dt
+import json
+import random
+
+import pytest
+
+from backend.statistics.trivia import TriviaProcessor
+from backend.statistics.trivia.min_max_summary_trivia import (
+    min_and_max_distance_trivia_processor,
+    min_and_max_elevation_trivia_processor,
+)
+from backend.statistics.trivia.summary_trivia import general_trivia
+from tests.factories.activity_factories import ActivityFactory
+
+
+@pytest.fixture
+def activities():
+    rng = random.Random(4)
+    return [
+        ActivityFactory(
+            id=i,
+            type=rng.choice(["Run", "Ride", "Workout"]),
+            distance=float(rng.choice([0, 1000, rng.randint(1, 20_000)])),
+            total_elevation_gain=float(rng.randint(0, 300)),
+            kudos_count=rng.randint(0, 5),
+            athlete_count=rng.randint(1, 4),
+            max_heartrate=float(rng.choice([150, 160, 170])),
+            average_heartrate=float(rng.choice([120, 130, 140])),
+            start_date_local=dt.datetime(2023, 1, 1)
+            + dt.timedelta(hours=rng.randint(0, 24 * 60)),
+        )
+        for i in range(1, 61)
+    ]
+
+
+@pytest.mark.parametrize(
+    "processor",
+    [
+        general_trivia,
+        min_and_max_distance_trivia_processor,
+        min_and_max_elevation_trivia_processor,
+    ],
+)
+def test_merged_states_match_processing_everything(
+    processor: TriviaProcessor, activities
+) -> None:
+    expected = processor.get_data(activity for activity in activities)
+
+    # Worked out in a few separate lots, saved, and merged back together.
+    states = [
+        json.loads(json.dumps(processor.process_activities(iter(shard))))
+        for shard in [activities[:15], activities[15:40], activities[40:]]
+    ]
+    merged_state = processor.merge_states(
+        processor.merge_states(states[0], states[1]), states[2]
+    )
+    assert processor.get_data_from_state(merged_state) == expected
+
+    # Or just the new activities processed on top of what we had before.
+    state = processor.merge_states(states[0], states[1])
+    assert processor.get_data(iter(activities[40:]), state=state) == expected
+
+
+def test_states_from_other_processors_are_rejected() -> None:
+    state = general_trivia.process_activities(_ for _ in [])
+    with pytest.raises(ValueError):
+        min_and_max_distance_trivia_processor.get_data_from_state(state)
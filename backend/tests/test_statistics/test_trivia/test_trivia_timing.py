@@ -0,0 +1,47 @@
+from backend.statistics.trivia import TriviaTimings, get_data_for_processors
+from backend.statistics.trivia.min_max_summary_trivia import (
+    min_and_max_distance_trivia_processor,
+)
+from backend.statistics.trivia.summary_trivia import (
+    MostConsecutiveDaysOfActivities,
+    general_trivia,
+)
+
+
+def test_timings_dont_change_the_trivia(some_basic_runs_and_rides) -> None:
+    timings = TriviaTimings()
+
+    assert general_trivia.get_data(
+        iter(some_basic_runs_and_rides), timings=timings
+    ) == general_trivia.get_data(iter(some_basic_runs_and_rides))
+
+
+def test_timings_count_calls(some_basic_runs_and_rides) -> None:
+    timings = TriviaTimings()
+    get_data_for_processors(
+        [general_trivia, min_and_max_distance_trivia_processor],
+        iter(some_basic_runs_and_rides),
+        timings=timings,
+    )
+
+    consecutive_days_timings = [
+        timing
+        for timing in timings.timings.values()
+        if timing.name.startswith(MostConsecutiveDaysOfActivities.__name__)
+    ]
+    assert len(consecutive_days_timings) == 1
+    assert consecutive_days_timings[0].process_activity_calls == len(
+        some_basic_runs_and_rides
+    )
+    assert consecutive_days_timings[0].get_tidbit_calls == 1
+
+    # Every tidbit, aggregate or not, gets its tidbit worked out once.
+    tidbit_count = len(general_trivia.tidbits) + len(
+        min_and_max_distance_trivia_processor.tidbits
+    )
+    assert len(timings.timings) == tidbit_count
+    assert all(timing.get_tidbit_calls == 1 for timing in timings.timings.values())
+
+    report = timings.get_report(limit=5)
+    assert len(report) == 6
+    assert report[0].startswith("Aggregate tidbits: ")
@@ -0,0 +1,218 @@
+import json
+from typing import Any
+
+import boto3
+import pytest
+from moto import mock_aws
+from requests.exceptions import HTTPError
+
+from backend.utils.download import PAGE_SIZE, download_activities
+from backend.utils.dynamodb import get_download_status_item_from_dynamo
+from backend.utils.s3 import (
+    ACTIVITY_PAGES_PREFIX,
+    BUCKET_NAME,
+    get_summary_activities_from_s3,
+)
+from tests.fixtures import REAL_DATA
+
+DOWNLOAD_STATUS_NAME = "download-status-table"
+ATHLETE_ID = 1
+
+
+class FakeProtocol:
+    def __init__(self, raw_activities: list[dict[str, Any]]) -> None:
+        self.raw_activities = raw_activities
+        self.requested_pages: list[int] = []
+
+    def get(self, url: str, page: int, per_page: int, **kwargs: Any) -> Any:
+        self.requested_pages.append(page)
+        start = (page - 1) * per_page
+        return self.raw_activities[start : start + per_page]
+
+
+class FakeClient:
+    """
+    Just enough of a stravalib client to serve pages of activities.
+    """
+
+    def __init__(self, raw_activities: list[dict[str, Any]]) -> None:
+        self.protocol = FakeProtocol(raw_activities)
+
+    def get_athlete_stats(self, athlete_id: int) -> Any:
+        raise HTTPError("No stats for you.")
+
+
+@pytest.fixture
+def raw_activities() -> list[dict[str, Any]]:
+    """
+    Enough real activities for a few pages, with unique ids.
+    """
+    with open(REAL_DATA, "r") as f:
+        data = json.load(f)
+
+    activities = []
+    while len(activities) < 2 * PAGE_SIZE + 50:
+        activities.extend(data)
+    activities = activities[: 2 * PAGE_SIZE + 50]
+    return [activity | {"id": i} for i, activity in enumerate(activities)]
+
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb", region_name="ap-southeast-2")
+        dynamodb_client.create_table(
+            TableName=DOWNLOAD_STATUS_NAME,
+            KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "athlete_id", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        s3_client = boto3.client("s3", region_name="ap-southeast-2")
+        s3_client.create_bucket(
+            Bucket=BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+        )
+        download_status_table = boto3.resource("dynamodb").Table(DOWNLOAD_STATUS_NAME)
+        yield s3_client, download_status_table
+
+
+def test_download_in_one_go(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+    client = FakeClient(raw_activities)
+
+    assert download_activities(client, s3_client, download_status_table, ATHLETE_ID)
+
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    assert [activity.id for activity in activities] == list(range(len(raw_activities)))
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.complete
+    assert item.activities_downloaded == len(raw_activities)
+    assert not item.has_checkpoint()
+    assert item.data_version == 1
+
+    # The pages from the in-progress download are cleaned up afterwards.
+    response = s3_client.list_objects_v2(
+        Bucket=BUCKET_NAME, Prefix=ACTIVITY_PAGES_PREFIX
+    )
+    assert "Contents" not in response
+
+
+def test_download_stops_when_out_of_time_and_resumes(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+
+    # Plenty of time for the first page, then we run out.
+    remaining_seconds = iter([300, 10])
+    client = FakeClient(raw_activities)
+    assert not download_activities(
+        client,
+        s3_client,
+        download_status_table,
+        ATHLETE_ID,
+        get_remaining_seconds=lambda: next(remaining_seconds),
+    )
+    assert client.protocol.requested_pages == [1]
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert not item.complete
+    assert item.has_checkpoint()
+    assert item.next_page == 2
+    assert item.pages_persisted == 1
+    assert item.activities_downloaded == PAGE_SIZE
+
+    # A new invocation picks up from page 2, going back a page in case anything
+    # moved in between.
+    client = FakeClient(raw_activities)
+    assert download_activities(
+        client, s3_client, download_status_table, ATHLETE_ID, resume=True
+    )
+    assert client.protocol.requested_pages == [1, 2, 3]
+
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    assert [activity.id for activity in activities] == list(range(len(raw_activities)))
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.complete
+    assert item.activities_downloaded == len(raw_activities)
+
+
+@pytest.mark.parametrize("change", ["upload", "delete"])
+def test_activities_changing_between_invocations(
+    aws, raw_activities, change: str
+) -> None:
+    s3_client, download_status_table = aws
+
+    remaining_seconds = iter([300, 10])
+    download_activities(
+        FakeClient(raw_activities),
+        s3_client,
+        download_status_table,
+        ATHLETE_ID,
+        get_remaining_seconds=lambda: next(remaining_seconds),
+    )
+
+    # Strava's newest activities come first, so uploading or deleting one moves every
+    # page along by one.
+    original_ids = {activity["id"] for activity in raw_activities}
+    if change == "upload":
+        raw_activities = [raw_activities[0] | {"id": -1}] + raw_activities
+    else:
+        raw_activities = raw_activities[1:]
+
+    assert download_activities(
+        FakeClient(raw_activities),
+        s3_client,
+        download_status_table,
+        ATHLETE_ID,
+        resume=True,
+    )
+
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    ids = [activity.id for activity in activities]
+    assert len(ids) == len(set(ids))
+    # The deleted activity was downloaded before it was deleted, but nothing that
+    # moved between pages is lost.
+    assert set(ids) == original_ids | ({-1} if change == "upload" else set())
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.activities_downloaded == len(ids)
+
+
+def test_download_without_resume_starts_again(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+
+    remaining_seconds = iter([300, 10])
+    download_activities(
+        FakeClient(raw_activities),
+        s3_client,
+        download_status_table,
+        ATHLETE_ID,
+        get_remaining_seconds=lambda: next(remaining_seconds),
+    )
+
+    client = FakeClient(raw_activities)
+    assert download_activities(client, s3_client, download_status_table, ATHLETE_ID)
+    assert client.protocol.requested_pages == [1, 2, 3]
+    assert len(get_summary_activities_from_s3(s3_client, ATHLETE_ID)) == len(
+        raw_activities
+    )
+
+
+def test_invalid_activities_are_skipped(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+
+    # Missing an id, a type, and a proper start date.
+    raw_activities[0] = {k: v for k, v in raw_activities[0].items() if k != "id"}
+    raw_activities[1] = {k: v for k, v in raw_activities[1].items() if k != "type"}
+    raw_activities[2] = raw_activities[2] | {"start_date": "yesterday"}
+
+    client = FakeClient(raw_activities)
+    assert download_activities(client, s3_client, download_status_table, ATHLETE_ID)
+
+    # A page with skipped activities in it still isn't mistaken for the last page.
+    assert client.protocol.requested_pages == [1, 2, 3]
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    assert [activity.id for activity in activities] == list(
+        range(3, len(raw_activities))
+    )
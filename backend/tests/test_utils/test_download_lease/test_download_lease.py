@@ -0,0 +1,143 @@
+import datetime as dt
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from backend.utils.download_lease import (
+    DownloadLeaseCounters,
+    try_acquire_download_lease,
+)
+from backend.utils.dynamodb import (
+    DOWNLOAD_LEASE_DURATION,
+    get_download_status_item_from_dynamo,
+    save_download_checkpoint_to_dynamo,
+    save_download_error_to_dynamo,
+    save_download_status_to_dynamo,
+)
+
+DOWNLOAD_STATUS_NAME = "download-status-table"
+ATHLETE_ID = 1
+NOW = dt.datetime(2024, 1, 1, 12, 0, tzinfo=dt.timezone.utc)
+
+
+@pytest.fixture
+def download_status_table():
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb", region_name="ap-southeast-2")
+        dynamodb_client.create_table(
+            TableName=DOWNLOAD_STATUS_NAME,
+            KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "athlete_id", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield boto3.resource("dynamodb").Table(DOWNLOAD_STATUS_NAME)
+
+
+def test_only_one_caller_gets_the_lease(download_status_table) -> None:
+    counters = DownloadLeaseCounters()
+    owners = [
+        try_acquire_download_lease(
+            download_status_table, ATHLETE_ID, NOW, "Starting.", counters
+        )
+        for _ in range(3)
+    ]
+    assert owners[0] is not None
+    assert owners[1:] == [None, None]
+    assert counters == DownloadLeaseCounters(acquired=1, contended=2)
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.lease_owner == owners[0]
+    assert item.lease_expires_at == NOW + DOWNLOAD_LEASE_DURATION
+    assert item.status == "Starting."
+    assert not item.complete
+
+    # Other athletes have their own leases.
+    assert try_acquire_download_lease(
+        download_status_table, 2, NOW, "Starting.", counters
+    )
+
+
+def test_lease_can_be_taken_once_the_download_finishes(download_status_table) -> None:
+    counters = DownloadLeaseCounters()
+    assert try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, NOW, "Starting.", counters
+    )
+
+    save_download_status_to_dynamo(
+        download_status_table,
+        ATHLETE_ID,
+        NOW,
+        "All done.",
+        error=False,
+        complete=True,
+    )
+    assert try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, NOW, "Again.", counters
+    )
+
+    save_download_error_to_dynamo(download_status_table, ATHLETE_ID, NOW, "Oh no.")
+    assert try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, NOW, "Again.", counters
+    )
+    assert counters.contended == 0
+
+
+def test_progress_extends_the_lease(download_status_table) -> None:
+    counters = DownloadLeaseCounters()
+    assert try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, NOW, "Starting.", counters
+    )
+
+    # Just before the lease runs out, the download checkpoints.
+    later = NOW + DOWNLOAD_LEASE_DURATION - dt.timedelta(minutes=1)
+    save_download_checkpoint_to_dynamo(
+        download_status_table,
+        ATHLETE_ID,
+        later,
+        "200 activities downloaded so far.",
+        next_page=2,
+        pages_persisted=1,
+        activities_downloaded=200,
+        estimated_total_activities=None,
+    )
+    just_after_first_lease = NOW + DOWNLOAD_LEASE_DURATION + dt.timedelta(minutes=1)
+    assert not try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, just_after_first_lease, "Hi.", counters
+    )
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert not item.is_lease_expired(just_after_first_lease)
+
+    # Then it stops making progress, and the lease runs out.
+    expired = later + DOWNLOAD_LEASE_DURATION + dt.timedelta(seconds=1)
+    assert item.is_lease_expired(expired)
+    assert try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, expired, "Resuming.", counters
+    )
+
+
+def test_refreshing_lasts_until_the_download_finishes(download_status_table) -> None:
+    counters = DownloadLeaseCounters()
+    assert try_acquire_download_lease(
+        download_status_table, ATHLETE_ID, NOW, "Refreshing.", counters, True
+    )
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.refreshing
+
+    # If the refresh fails, their old data is still there to use.
+    save_download_error_to_dynamo(download_status_table, ATHLETE_ID, NOW, "Oh no.")
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.refreshing
+
+    save_download_status_to_dynamo(
+        download_status_table,
+        ATHLETE_ID,
+        NOW,
+        "All done.",
+        error=False,
+        complete=True,
+    )
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert not item.refreshing
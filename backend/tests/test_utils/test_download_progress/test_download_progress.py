@@ -0,0 +1,103 @@
+import asyncio
+import datetime as dt
+import json
+
+from fastapi.testclient import TestClient
+
+from backend.utils.download_progress import (
+    get_download_progress_message,
+    stream_download_progress,
+)
+from backend.utils.dynamodb import DownloadStatusItem
+
+
+def make_download_status_item(**kwargs) -> DownloadStatusItem:
+    now = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+    defaults = {
+        "athlete_id": 1,
+        "last_download_time": now,
+        "status": "Downloading.",
+        "ttl": now + dt.timedelta(days=7),
+        "error": False,
+        "complete": False,
+    }
+    return DownloadStatusItem(**(defaults | kwargs))
+
+
+def collect_stream(items, **kwargs) -> list[str]:
+    """
+    Runs the stream against a fixed sequence of download status items, returning the
+    raw events.
+    """
+    items = iter(items)
+
+    async def collect() -> list[str]:
+        return [
+            event
+            async for event in stream_download_progress(
+                lambda: next(items), poll_interval=0, **kwargs
+            )
+        ]
+
+    return asyncio.run(collect())
+
+
+def test_percent_complete_is_capped_until_download_completes() -> None:
+    item = make_download_status_item(
+        activities_downloaded=500, estimated_total_activities=400
+    )
+    assert item.get_percent_complete() == 99
+
+    item = make_download_status_item(
+        activities_downloaded=100, estimated_total_activities=400
+    )
+    assert item.get_percent_complete() == 25
+
+    item = make_download_status_item(complete=True)
+    assert item.get_percent_complete() == 100
+
+    assert make_download_status_item().get_percent_complete() is None
+
+
+def test_progress_message_when_download_not_started() -> None:
+    message = get_download_progress_message(None)
+    assert not message.downloaded
+    assert message.percent_complete is None
+
+
+def test_stream_only_sends_changes_and_ends_when_complete() -> None:
+    events = collect_stream(
+        [
+            None,
+            make_download_status_item(activities_downloaded=200),
+            make_download_status_item(activities_downloaded=200),
+            make_download_status_item(activities_downloaded=400),
+            make_download_status_item(activities_downloaded=400, complete=True),
+        ]
+    )
+
+    assert events[0].startswith("retry:")
+    data_events = events[1:]
+    assert len(data_events) == 4
+    assert data_events[-1].startswith("event: done\n")
+
+    final_message = json.loads(data_events[-1].split("data: ")[1])
+    assert final_message["downloaded"]
+    assert final_message["percent_complete"] == 100
+
+
+def test_stream_closes_after_max_duration() -> None:
+    events = collect_stream(
+        (make_download_status_item() for _ in range(1000)), max_stream_seconds=0
+    )
+    assert len(events) == 2
+    assert "event: done" not in events[-1]
+
+
+def test_stream_is_not_served_in_production(monkeypatch) -> None:
+    from backend import api
+
+    # API Gateway would buffer the whole stream, so prod polls instead.
+    monkeypatch.setattr(api.evm.variables, "environment", "production")
+    client = TestClient(api.app, cookies={"session_token": "abc"})
+    assert client.get("/api/data_status_stream").status_code == 404
@@ -0,0 +1,258 @@
+import datetime as dt
+from typing import Optional
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from backend.utils.download_scheduler import (
+    DownloadScheduler,
+    DynamoDBSyncJobQueue,
+    InMemorySyncJobQueue,
+    QuotaTrackingRateLimiter,
+    StravaQuota,
+    SyncJob,
+    SyncJobQueue,
+    SyncPriority,
+    estimate_requests_for_download,
+)
+from backend.utils.rate_limiter import InMemoryTokenBucketStore, SharedStravaQuota
+
+NOW = dt.datetime(2024, 1, 1, 10, 5, tzinfo=dt.timezone.utc)
+SYNC_JOB_QUEUE_TABLE_NAME = "sync-job-queue-table"
+
+
+def make_job(
+    athlete_id: int,
+    priority: SyncPriority = SyncPriority.INTERACTIVE,
+    estimated_requests: int = 5,
+    enqueued_at: dt.datetime = NOW,
+) -> SyncJob:
+    return SyncJob(
+        athlete_id=athlete_id,
+        session_token=f"session_{athlete_id}",
+        priority=priority,
+        enqueued_at=enqueued_at,
+        estimated_requests=estimated_requests,
+    )
+
+
+def test_estimate_requests_for_download() -> None:
+    assert estimate_requests_for_download(0) == 1
+    assert estimate_requests_for_download(200) == 2
+    assert estimate_requests_for_download(201) == 3
+
+
+@pytest.fixture
+def dynamodb_queue():
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb", region_name="ap-southeast-2")
+        dynamodb_client.create_table(
+            TableName=SYNC_JOB_QUEUE_TABLE_NAME,
+            KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "athlete_id", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield DynamoDBSyncJobQueue(
+            boto3.resource("dynamodb").Table(SYNC_JOB_QUEUE_TABLE_NAME)
+        )
+
+
+@pytest.fixture(params=["in_memory", "dynamodb"])
+def queue(request):
+    if request.param == "in_memory":
+        return InMemorySyncJobQueue()
+    return request.getfixturevalue("dynamodb_queue")
+
+
+class TestSyncJobQueue:
+    def test_interactive_jobs_go_first(self, queue) -> None:
+        queue.push(make_job(1, SyncPriority.BACKGROUND))
+        queue.push(
+            make_job(2, SyncPriority.INTERACTIVE, enqueued_at=NOW.replace(minute=6))
+        )
+        queue.push(
+            make_job(3, SyncPriority.INTERACTIVE, enqueued_at=NOW.replace(minute=7))
+        )
+
+        assert [job.athlete_id for job in queue.get_jobs()] == [2, 3, 1]
+        assert queue.pop().athlete_id == 2
+        assert queue.pop().athlete_id == 3
+        assert queue.pop().athlete_id == 1
+        assert queue.pop() is None
+
+    def test_athletes_are_only_queued_once(self, queue) -> None:
+        queue.push(make_job(1, SyncPriority.INTERACTIVE))
+        queue.push(make_job(2, SyncPriority.BACKGROUND))
+        queue.push(
+            make_job(2, SyncPriority.INTERACTIVE, enqueued_at=NOW.replace(minute=9))
+        )
+        queue.push(
+            make_job(1, SyncPriority.BACKGROUND, enqueued_at=NOW.replace(minute=9))
+        )
+
+        jobs = queue.get_jobs()
+        assert len(queue) == 2
+        # Athlete 1 keeps their original place and priority.
+        assert [job.athlete_id for job in jobs] == [1, 2]
+        assert all(job.priority == SyncPriority.INTERACTIVE for job in jobs)
+
+    def test_replacing_a_job_with_the_same_priority(self, queue) -> None:
+        # The replacement ties with the job it replaced on everything it's ordered
+        # by, which used to make the heap compare the jobs themselves.
+        queue.push(make_job(1, estimated_requests=5))
+        queue.push(make_job(1, estimated_requests=6))
+        queue.push(make_job(1, estimated_requests=7))
+
+        assert [job.estimated_requests for job in queue.get_jobs()] == [7]
+        assert queue.pop().athlete_id == 1
+        assert queue.pop() is None
+
+    def test_a_job_can_only_be_removed_once(self, queue) -> None:
+        queue.push(make_job(1))
+        queue.push(make_job(2))
+
+        assert queue.remove(2).athlete_id == 2
+        # Like when another container has already started it.
+        assert queue.remove(2) is None
+        assert [job.athlete_id for job in queue.get_jobs()] == [1]
+
+
+class TestStravaQuota:
+    def test_short_window_resets_on_the_quarter_hour(self) -> None:
+        quota = StravaQuota(short_limit=10, long_limit=100)
+        quota.update_usage(NOW, short_usage=10, long_usage=10)
+        assert quota.get_remaining(NOW.replace(minute=14)) == 0
+        assert quota.get_remaining(NOW.replace(minute=15)) == 10
+
+    def test_time_until_available(self) -> None:
+        quota = StravaQuota(short_limit=10, long_limit=100)
+        quota.update_usage(NOW, short_usage=5, long_usage=5)
+
+        assert quota.get_time_until_available(5, NOW) == dt.timedelta(0)
+        # Needs the next window, which starts at 10:15.
+        assert quota.get_time_until_available(6, NOW) == dt.timedelta(minutes=10)
+        # Needs two more windows.
+        assert quota.get_time_until_available(16, NOW) == dt.timedelta(minutes=25)
+
+    def test_time_until_available_rolls_over_to_the_next_day(self) -> None:
+        quota = StravaQuota(short_limit=10, long_limit=20)
+        quota.update_usage(NOW, short_usage=0, long_usage=20)
+        tomorrow = dt.datetime(2024, 1, 2, tzinfo=dt.timezone.utc)
+        assert quota.get_time_until_available(1, NOW) == tomorrow - NOW
+
+    def test_usage_is_only_refreshed_every_few_seconds(self) -> None:
+        quota = StravaQuota(short_limit=10, long_limit=100)
+        calls: list[dt.datetime] = []
+
+        def get_usage(now: dt.datetime) -> tuple[int, int]:
+            calls.append(now)
+            return 3, 30
+
+        quota.refresh_usage(get_usage, NOW)
+        quota.refresh_usage(get_usage, NOW + dt.timedelta(seconds=1))
+        assert calls == [NOW]
+        assert quota.get_remaining(NOW) == 7
+
+        quota.refresh_usage(get_usage, NOW + dt.timedelta(seconds=10))
+        assert calls == [NOW, NOW + dt.timedelta(seconds=10)]
+
+    def test_rate_limiter_updates_quota_from_headers(self) -> None:
+        quota = StravaQuota()
+        rate_limiter = QuotaTrackingRateLimiter(quota)
+        rate_limiter(
+            {
+                "X-ReadRateLimit-Usage": "40,400",
+                "X-ReadRateLimit-Limit": "100,1000",
+            },
+            "GET",
+        )
+        assert quota.short_usage == 40
+        assert quota.long_usage == 400
+
+
+def make_scheduler(
+    short_limit: int,
+    long_limit: int = 100,
+    queue: Optional[SyncJobQueue] = None,
+    shared_quota: Optional[SharedStravaQuota] = None,
+) -> DownloadScheduler:
+    return DownloadScheduler(
+        queue if queue is not None else InMemorySyncJobQueue(),
+        StravaQuota(short_limit=short_limit, long_limit=long_limit),
+        shared_quota
+        if shared_quota is not None
+        else SharedStravaQuota(InMemoryTokenBucketStore(), short_limit, long_limit),
+    )
+
+
+class TestDownloadScheduler:
+    def test_only_dispatches_jobs_that_fit_in_the_quota(self) -> None:
+        scheduler = make_scheduler(short_limit=10)
+        scheduler.submit(make_job(1, estimated_requests=4))
+        scheduler.submit(make_job(2, estimated_requests=4))
+        scheduler.submit(make_job(3, estimated_requests=4))
+
+        dispatched: list[SyncJob] = []
+        scheduler.dispatch_ready_jobs(dispatched.append, NOW)
+
+        assert [job.athlete_id for job in dispatched] == [1, 2]
+        assert [job.reserved_requests for job in dispatched] == [4, 4]
+        assert scheduler.get_queue_position(3) == 0
+        assert scheduler.get_estimated_start_time(3, NOW) == NOW.replace(minute=15)
+        assert scheduler.get_estimated_start_time(1, NOW) is None
+
+        scheduler.dispatch_ready_jobs(dispatched.append, NOW.replace(minute=15))
+        assert [job.athlete_id for job in dispatched] == [1, 2, 3]
+
+    def test_first_time_users_jump_the_queue(self) -> None:
+        scheduler = make_scheduler(short_limit=6)
+        scheduler.quota.update_usage(NOW, short_usage=6, long_usage=6)
+        scheduler.submit(make_job(1, SyncPriority.BACKGROUND))
+        scheduler.submit(make_job(2, SyncPriority.INTERACTIVE))
+
+        assert scheduler.get_queue_position(2) == 0
+        assert scheduler.get_queue_position(1) == 1
+        assert scheduler.get_estimated_start_time(2, NOW) == NOW.replace(minute=15)
+        assert scheduler.get_estimated_start_time(1, NOW) == NOW.replace(minute=30)
+
+    def test_containers_share_the_queue_and_reservations(self) -> None:
+        # Two containers, each with their own idea of the quota.
+        queue = InMemorySyncJobQueue()
+        shared_quota = SharedStravaQuota(InMemoryTokenBucketStore(), 10, 100)
+        first = make_scheduler(10, queue=queue, shared_quota=shared_quota)
+        second = make_scheduler(10, queue=queue, shared_quota=shared_quota)
+
+        first.submit(make_job(1, estimated_requests=4))
+        first.submit(make_job(2, estimated_requests=4))
+        first.submit(make_job(3, estimated_requests=4))
+        dispatched: list[SyncJob] = []
+        first.dispatch_ready_jobs(dispatched.append, NOW)
+        assert [job.athlete_id for job in dispatched] == [1, 2]
+
+        # The second container's count is refreshed, which used to forget about the
+        # first container's reservations. They're kept in the shared quota now.
+        second.quota.refresh_usage(shared_quota.get_usage, NOW)
+        second.dispatch_ready_jobs(dispatched.append, NOW)
+        assert [job.athlete_id for job in dispatched] == [1, 2]
+
+        # Once there's quota again, it can start the job the first container queued.
+        second.dispatch_ready_jobs(dispatched.append, NOW.replace(minute=15))
+        assert [job.athlete_id for job in dispatched] == [1, 2, 3]
+
+    def test_reservation_is_given_back_if_the_job_was_already_started(self) -> None:
+        class RacingQueue(InMemorySyncJobQueue):
+            def remove(self, athlete_id: int) -> Optional[SyncJob]:
+                # Another container takes the job just before we do.
+                super().remove(athlete_id)
+                return None
+
+        scheduler = make_scheduler(short_limit=10, queue=RacingQueue())
+        scheduler.submit(make_job(1, estimated_requests=4))
+
+        dispatched: list[SyncJob] = []
+        scheduler.dispatch_ready_jobs(dispatched.append, NOW)
+        assert dispatched == []
+        assert scheduler.shared_quota.get_remaining(NOW) == 10
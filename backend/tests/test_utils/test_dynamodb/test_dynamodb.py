@@ -5,9 +5,17 @@ import pytest
 from moto import mock_aws
 
 from backend.utils.dynamodb import (
+    ATHLETE_ID_INDEX_NAME,
+    BatchGetRequest,
+    batch_get_items_from_dynamo,
     get_athlete_id_from_session_token,
+    get_data_version_from_dynamo,
+    get_batch_get_request_items,
     get_download_status_item_from_dynamo,
     get_user_data_row_for_athlete,
+    get_user_data_row_for_athlete_id,
+    get_user_row_and_download_status_from_dynamo,
+    increment_data_version_in_dynamo,
     save_download_status_to_dynamo,
 )
 
@@ -194,3 +202,133 @@ def test_get_user_data_row_for_athlete():
     assert row.access_token == "a"
     assert row.refresh_token == "b"
     assert row.expires_at == 2
+
+
+@mock_aws
+def test_get_user_data_row_for_athlete_id():
+    conn = boto3.client(
+        "dynamodb",
+        region_name="ap-southeast-2",
+        aws_access_key_id="ak",
+        aws_secret_access_key="sk",
+    )
+    conn.create_table(
+        TableName=USER_TABLE_NAME,
+        KeySchema=[{"AttributeName": "session_token", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "session_token", "AttributeType": "S"},
+            {"AttributeName": "athlete_id", "AttributeType": "N"},
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                "IndexName": ATHLETE_ID_INDEX_NAME,
+                "KeySchema": [{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+                "Projection": {"ProjectionType": "ALL"},
+            }
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    # The same athlete logged in twice.
+    for session_token, expires_at in [("old", "2"), ("new", "3")]:
+        conn.put_item(
+            TableName=USER_TABLE_NAME,
+            Item={
+                "session_token": {"S": session_token},
+                "athlete_id": {"N": "1"},
+                "access_token": {"S": f"{session_token}_access_token"},
+                "refresh_token": {"S": "b"},
+                "expires_at": {"N": expires_at},
+            },
+        )
+
+    user_table = boto3.resource("dynamodb").Table(USER_TABLE_NAME)
+    row = get_user_data_row_for_athlete_id(user_table, 1)
+    assert row.session_token == "new"
+    assert row.access_token == "new_access_token"
+    assert get_user_data_row_for_athlete_id(user_table, 2) is None
+
+
+@mock_aws
+def test_user_row_and_download_status_are_read_together() -> None:
+    conn = boto3.client("dynamodb", region_name="ap-southeast-2")
+    conn.create_table(
+        TableName=USER_TABLE_NAME,
+        KeySchema=[{"AttributeName": "session_token", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "session_token", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    conn.create_table(
+        TableName=DOWNLOAD_STATUS_NAME,
+        KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "athlete_id", "AttributeType": "N"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    conn.put_item(
+        TableName=USER_TABLE_NAME,
+        Item={
+            "session_token": {"S": "abc"},
+            "athlete_id": {"N": "1"},
+            "access_token": {"S": "a"},
+            "refresh_token": {"S": "b"},
+            "expires_at": {"N": "2"},
+        },
+    )
+    dynamodb = boto3.resource("dynamodb")
+    user_table = dynamodb.Table(USER_TABLE_NAME)
+    download_status_table = dynamodb.Table(DOWNLOAD_STATUS_NAME)
+
+    # They haven't downloaded anything yet.
+    row, download_status_item = get_user_row_and_download_status_from_dynamo(
+        user_table, download_status_table, "abc", 1
+    )
+    assert row.access_token == "a"
+    assert download_status_item is None
+    assert get_data_version_from_dynamo(download_status_table, 1) == 0
+
+    save_download_status_to_dynamo(
+        download_status_table,
+        1,
+        dt.datetime(2020, 1, 2, tzinfo=dt.timezone.utc),
+        "yeet",
+        error=False,
+        complete=True,
+    )
+    increment_data_version_in_dynamo(download_status_table, 1)
+    _, download_status_item = get_user_row_and_download_status_from_dynamo(
+        user_table, download_status_table, "abc", 1
+    )
+    assert download_status_item.complete
+    assert download_status_item.data_version == 1
+    # Only some attributes are read, but they're everything the item needs.
+    assert download_status_item == get_download_status_item_from_dynamo(
+        download_status_table, 1
+    )
+    assert get_data_version_from_dynamo(download_status_table, 1) == 1
+
+    # Only the attributes that were asked for (and the key) are read.
+    user_item, download_status_attributes = batch_get_items_from_dynamo(
+        [
+            BatchGetRequest(user_table, {"session_token": "abc"}, ["athlete_id"]),
+            BatchGetRequest(
+                download_status_table, {"athlete_id": 1}, ["status_message"]
+            ),
+        ]
+    )
+    assert user_item == {"session_token": "abc", "athlete_id": 1}
+    assert download_status_attributes == {"athlete_id": 1, "status_message": "yeet"}
+
+    # Only the download status is read consistently.
+    request_items = get_batch_get_request_items(
+        [
+            BatchGetRequest(user_table, {"session_token": "abc"}),
+            BatchGetRequest(
+                download_status_table, {"athlete_id": 1}, consistent_read=True
+            ),
+        ]
+    )
+    assert "ConsistentRead" not in request_items[USER_TABLE_NAME]
+    assert request_items[DOWNLOAD_STATUS_NAME]["ConsistentRead"]
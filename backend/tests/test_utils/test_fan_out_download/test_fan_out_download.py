@@ -0,0 +1,234 @@
+import datetime as dt
+import json
+from typing import Any
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from backend.utils.download import PAGE_SIZE
+from backend.utils.dynamodb import get_download_status_item_from_dynamo
+from backend.utils.fan_out_download import (
+    DateWindow,
+    download_window,
+    get_window_count,
+    merge_windows,
+    should_fan_out,
+    split_into_windows,
+    start_fan_out_download,
+)
+from backend.utils.s3 import (
+    ACTIVITY_WINDOWS_PREFIX,
+    BUCKET_NAME,
+    get_summary_activities_from_s3,
+)
+from tests.fixtures import REAL_DATA
+
+DOWNLOAD_STATUS_NAME = "download-status-table"
+ATHLETE_ID = 1
+ATHLETE_CREATED_AT = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+
+
+class FakeProtocol:
+    """
+    Serves pages of activities, filtered by Strava's (exclusive) before and after.
+    """
+
+    def __init__(self, raw_activities: list[dict[str, Any]]) -> None:
+        self.raw_activities = raw_activities
+
+    def get(
+        self,
+        url: str,
+        page: int,
+        per_page: int,
+        before: int | None = None,
+        after: int | None = None,
+    ) -> Any:
+        activities = [
+            activity
+            for activity in self.raw_activities
+            if (before is None or activity["epoch"] < before)
+            and (after is None or activity["epoch"] > after)
+        ]
+        start = (page - 1) * per_page
+        return [
+            {k: v for k, v in activity.items() if k != "epoch"}
+            for activity in activities[start : start + per_page]
+        ]
+
+
+class FakeAthlete:
+    created_at = ATHLETE_CREATED_AT
+
+
+class FakeClient:
+    def __init__(self, raw_activities: list[dict[str, Any]]) -> None:
+        self.protocol = FakeProtocol(raw_activities)
+
+    def get_athlete(self) -> FakeAthlete:
+        return FakeAthlete()
+
+
+@pytest.fixture
+def raw_activities() -> list[dict[str, Any]]:
+    """
+    One real activity every day since the athlete joined, newest first like Strava.
+    """
+    with open(REAL_DATA, "r") as f:
+        data = json.load(f)
+
+    activities = []
+    for i in range(3 * PAGE_SIZE):
+        start_date = ATHLETE_CREATED_AT + dt.timedelta(days=i, hours=12)
+        activities.append(
+            data[i % len(data)]
+            | {
+                "id": i,
+                "start_date": start_date.isoformat(),
+                "epoch": int(start_date.timestamp()),
+            }
+        )
+    return list(reversed(activities))
+
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb", region_name="ap-southeast-2")
+        dynamodb_client.create_table(
+            TableName=DOWNLOAD_STATUS_NAME,
+            KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "athlete_id", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        s3_client = boto3.client("s3", region_name="ap-southeast-2")
+        s3_client.create_bucket(
+            Bucket=BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+        )
+        download_status_table = boto3.resource("dynamodb").Table(DOWNLOAD_STATUS_NAME)
+        yield s3_client, download_status_table
+
+
+def test_should_fan_out() -> None:
+    assert not should_fan_out(None)
+    assert not should_fan_out(500)
+    assert should_fan_out(5000)
+    assert get_window_count(2500) == 3
+    assert get_window_count(1_000_000) == 10
+
+
+def test_split_into_windows() -> None:
+    start = dt.datetime(2020, 1, 1, tzinfo=dt.timezone.utc)
+    end = dt.datetime(2020, 1, 4, tzinfo=dt.timezone.utc)
+    windows = split_into_windows(start, end, 3)
+
+    assert [window.index for window in windows] == [1, 2, 3]
+    # The ends are unbounded, so nothing outside the range gets missed.
+    assert windows[0].after is None
+    assert windows[-1].before is None
+    # Each window starts just before the previous one ends.
+    for previous, window in zip(windows, windows[1:]):
+        assert window.after < previous.before
+
+
+def test_merge_windows_removes_duplicates(raw_activities) -> None:
+    activities = raw_activities[:10]
+    # Windows come back oldest first, and overlap a bit.
+    merged = merge_windows(activities[5:] + activities[:6])
+    assert [activity["id"] for activity in merged] == [
+        activity["id"] for activity in activities
+    ]
+
+
+def test_fan_out_download(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+    client = FakeClient(raw_activities)
+
+    dispatched_windows: list[DateWindow] = []
+    windows = start_fan_out_download(
+        client,
+        s3_client,
+        download_status_table,
+        ATHLETE_ID,
+        2500,
+        dispatched_windows.append,
+    )
+    assert dispatched_windows == windows
+    assert len(windows) == 3
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.windows_total == 3
+    assert item.get_percent_complete() == 0
+
+    # The windows can finish in any order. Only the last one merges them.
+    assert not download_window(
+        client, s3_client, download_status_table, ATHLETE_ID, windows[2]
+    )
+    assert not download_window(
+        client, s3_client, download_status_table, ATHLETE_ID, windows[0]
+    )
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.windows_complete == 2
+    assert not item.complete
+    assert item.get_percent_complete() == 66
+
+    assert download_window(
+        client, s3_client, download_status_table, ATHLETE_ID, windows[1]
+    )
+
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    assert [activity.id for activity in activities] == [
+        activity["id"] for activity in raw_activities
+    ]
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.complete
+    assert not item.error
+    assert item.activities_downloaded == len(raw_activities)
+
+    response = s3_client.list_objects_v2(
+        Bucket=BUCKET_NAME, Prefix=ACTIVITY_WINDOWS_PREFIX
+    )
+    assert "Contents" not in response
+
+
+def test_windows_from_an_earlier_fan_out_are_ignored(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+    client = FakeClient(raw_activities)
+
+    old_windows = start_fan_out_download(
+        client, s3_client, download_status_table, ATHLETE_ID, 2500, lambda _: None
+    )
+    new_windows = start_fan_out_download(
+        client, s3_client, download_status_table, ATHLETE_ID, 2500, lambda _: None
+    )
+    assert old_windows[0].fan_out_id != new_windows[0].fan_out_id
+
+    for window in new_windows[:2]:
+        assert not download_window(
+            client, s3_client, download_status_table, ATHLETE_ID, window
+        )
+    # A window from the first fan out finishing late doesn't count as the new one's
+    # last window.
+    assert not download_window(
+        client, s3_client, download_status_table, ATHLETE_ID, old_windows[2]
+    )
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.windows_complete == 2
+    assert not item.complete
+
+    assert download_window(
+        client, s3_client, download_status_table, ATHLETE_ID, new_windows[2]
+    )
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    assert [activity.id for activity in activities] == [
+        activity["id"] for activity in raw_activities
+    ]
+    response = s3_client.list_objects_v2(
+        Bucket=BUCKET_NAME, Prefix=ACTIVITY_WINDOWS_PREFIX
+    )
+    assert "Contents" not in response
@@ -0,0 +1,109 @@
+import json
+import threading
+from typing import Any
+
+import pytest
+
+from backend.utils.jobs import (
+    ApplyWebhookEventsJob,
+    DownloadJob,
+    DownloadWindowJob,
+    InProcessJobDispatcher,
+    Job,
+    LambdaJobDispatcher,
+    is_job_payload,
+    job_from_payload,
+    job_to_payload,
+)
+
+
+class FakeLambdaClient:
+    def __init__(self) -> None:
+        self.invocations: list[dict[str, Any]] = []
+
+    def invoke(self, **kwargs: Any) -> dict[str, Any]:
+        self.invocations.append(kwargs)
+        return {"StatusCode": 202}
+
+
+@pytest.mark.parametrize(
+    "job",
+    [
+        DownloadJob(athlete_id=1, session_token="abc", resume=True),
+        DownloadWindowJob(
+            athlete_id=1, session_token="abc", window_index=2, after=100, before=None
+        ),
+        ApplyWebhookEventsJob(athlete_id=1),
+    ],
+)
+def test_job_payload_roundtrip(job: Job) -> None:
+    payload = json.loads(json.dumps(job_to_payload(job)))
+    assert is_job_payload(payload)
+    assert job_from_payload(payload) == job
+
+
+def test_api_gateway_events_arent_jobs() -> None:
+    assert not is_job_payload({"path": "/api/data_status", "httpMethod": "GET"})
+
+
+def test_lambda_dispatcher(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "my-function")
+    lambda_client = FakeLambdaClient()
+    dispatcher = LambdaJobDispatcher(lambda_client=lambda_client)
+
+    dispatcher.dispatch(DownloadJob(athlete_id=1, session_token="abc"))
+
+    assert len(lambda_client.invocations) == 1
+    invocation = lambda_client.invocations[0]
+    assert invocation["FunctionName"] == "my-function"
+    assert invocation["InvocationType"] == "Event"
+    assert job_from_payload(json.loads(invocation["Payload"])) == DownloadJob(
+        athlete_id=1, session_token="abc"
+    )
+
+
+def test_lambda_dispatcher_sends_the_same_job_again(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "my-function")
+    lambda_client = FakeLambdaClient()
+    dispatcher = LambdaJobDispatcher(lambda_client=lambda_client)
+
+    # A second lot of webhook events right after the first only gets dispatched if
+    # the first lot has already been taken, so it needs its own job.
+    dispatcher.dispatch(ApplyWebhookEventsJob(athlete_id=1))
+    dispatcher.dispatch(ApplyWebhookEventsJob(athlete_id=1))
+
+    assert len(lambda_client.invocations) == 2
+
+
+def test_lambda_dispatcher_sends_jobs_to_the_worker(monkeypatch) -> None:
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "api-function")
+    monkeypatch.setenv("WORKER_FUNCTION_NAME", "worker-function")
+    lambda_client = FakeLambdaClient()
+    dispatcher = LambdaJobDispatcher(lambda_client=lambda_client)
+
+    dispatcher.dispatch(DownloadJob(athlete_id=1, session_token="abc"))
+    assert lambda_client.invocations[0]["FunctionName"] == "worker-function"
+
+
+def test_in_process_dispatcher_runs_every_job() -> None:
+    release = threading.Event()
+    finished_jobs: list[Job] = []
+
+    def run_job(job: Job) -> None:
+        if job.athlete_id == 1:
+            release.wait(timeout=5)
+        finished_jobs.append(job)
+
+    # With one worker, anything dispatched while athlete 1's job runs has to wait.
+    dispatcher = InProcessJobDispatcher(run_job, max_workers=1)
+    dispatcher.dispatch(ApplyWebhookEventsJob(athlete_id=1))
+    dispatcher.dispatch(ApplyWebhookEventsJob(athlete_id=2))
+    dispatcher.dispatch(ApplyWebhookEventsJob(athlete_id=2))
+
+    release.set()
+    dispatcher.wait_for_jobs()
+    assert finished_jobs == [
+        ApplyWebhookEventsJob(athlete_id=1),
+        ApplyWebhookEventsJob(athlete_id=2),
+        ApplyWebhookEventsJob(athlete_id=2),
+    ]
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+
+from backend.gui.gui import get_all_tabs
+from backend.utils.lazy import Lazy
+
+
+def test_lazy_only_makes_things_once() -> None:
+    calls = []
+    lazy = Lazy(lambda: calls.append(1) or len(calls))
+
+    assert not lazy.is_made()
+    assert lazy.get() == 1
+    assert lazy.get() == 1
+    assert lazy.is_made()
+    assert calls == [1]
+
+
+def test_listing_tabs_does_not_import_the_plotting_stack() -> None:
+    # Has to run in a fresh interpreter, since other tests import all of these.
+    script = (
+        "import sys\n"
+        "from backend.gui.gui import get_all_tabs\n"
+        "get_all_tabs()\n"
+        "print([m for m in ('plotly', 'pandas', 'PIL', 'polyline') "
+        "if m in sys.modules])\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_every_tab_can_load_what_it_needs() -> None:
+    for tab in get_all_tabs():
+        for value in vars(tab).values():
+            if isinstance(value, Lazy):
+                assert value.get() is not None
@@ -0,0 +1,201 @@
+import datetime as dt
+
+import boto3
+import pytest
+import requests
+from moto import mock_aws
+from stravalib.exc import RateLimitExceeded
+from stravalib.util.limiter import RequestRate
+
+from backend.utils.rate_limiter import (
+    DynamoDBTokenBucketStore,
+    InMemoryTokenBucketStore,
+    SharedQuotaRateLimitRule,
+    SharedQuotaSession,
+    SharedStravaQuota,
+    TokenBucket,
+    TokenBucketState,
+)
+
+RATE_LIMIT_TABLE_NAME = "rate-limit-table"
+NOW = dt.datetime(2024, 1, 1, 12, 0, tzinfo=dt.timezone.utc)
+
+
+@pytest.fixture
+def dynamodb_store():
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb", region_name="ap-southeast-2")
+        dynamodb_client.create_table(
+            TableName=RATE_LIMIT_TABLE_NAME,
+            KeySchema=[{"AttributeName": "bucket_key", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "bucket_key", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield DynamoDBTokenBucketStore(
+            boto3.resource("dynamodb").Table(RATE_LIMIT_TABLE_NAME)
+        )
+
+
+@pytest.fixture(params=["in_memory", "dynamodb"])
+def store(request):
+    if request.param == "in_memory":
+        return InMemoryTokenBucketStore()
+    return request.getfixturevalue("dynamodb_store")
+
+
+def test_compare_and_swap(store) -> None:
+    assert store.get("bucket") is None
+    assert store.compare_and_swap("bucket", None, TokenBucketState(5, 0, version=0))
+    # Someone else already created it.
+    assert not store.compare_and_swap("bucket", None, TokenBucketState(4, 0))
+    assert store.compare_and_swap("bucket", 0, TokenBucketState(4, 1, version=1))
+    # Written based on an old read.
+    assert not store.compare_and_swap("bucket", 0, TokenBucketState(3, 2, version=1))
+    assert store.get("bucket") == TokenBucketState(4, 1, version=1)
+
+
+def get_end_of_minute(now: dt.datetime) -> dt.datetime:
+    return now.replace(second=0, microsecond=0) + dt.timedelta(minutes=1)
+
+
+def test_token_bucket_shared_between_containers(store) -> None:
+    # Two containers with their own bucket objects, backed by the same store.
+    first = TokenBucket(store, "bucket", 3, get_end_of_minute)
+    second = TokenBucket(store, "bucket", 3, get_end_of_minute)
+
+    assert first.try_acquire(NOW)
+    assert second.try_acquire(NOW)
+    assert first.try_acquire(NOW)
+    assert not second.try_acquire(NOW)
+    assert first.get_remaining(NOW) == 0
+    assert first.get_time_until_available(NOW) == dt.timedelta(minutes=1)
+
+    # Nothing comes back until the window ends, and then it all does.
+    almost = NOW + dt.timedelta(seconds=59)
+    assert not second.try_acquire(almost)
+    later = NOW + dt.timedelta(minutes=1)
+    assert first.get_remaining(later) == 3
+    assert second.try_acquire(later)
+    assert first.get_remaining(later) == 2
+
+
+def test_quota_resets_on_stravas_windows() -> None:
+    quota = SharedStravaQuota(InMemoryTokenBucketStore(), short_limit=2, long_limit=3)
+    just_before_quarter = dt.datetime(2024, 1, 1, 12, 14, 59, tzinfo=dt.timezone.utc)
+    assert quota.try_acquire(just_before_quarter)
+    assert quota.try_acquire(just_before_quarter)
+    assert not quota.try_acquire(just_before_quarter)
+    assert quota.get_time_until_available(just_before_quarter) == dt.timedelta(
+        seconds=1
+    )
+
+    # A second later is a new 15 minute window, but still the same day.
+    quarter = dt.datetime(2024, 1, 1, 12, 15, tzinfo=dt.timezone.utc)
+    assert quota.try_acquire(quarter)
+    assert not quota.try_acquire(quarter)
+
+    # The whole daily limit comes back at midnight UTC.
+    midnight = dt.datetime(2024, 1, 2, tzinfo=dt.timezone.utc)
+    assert quota.get_usage(midnight) == (0, 0)
+
+
+def test_shared_quota_follows_strava_headers() -> None:
+    quota = SharedStravaQuota(InMemoryTokenBucketStore())
+    assert quota.get_remaining(NOW) == 100
+
+    quota.update_from_rates(
+        RequestRate(short_usage=95, long_usage=200, short_limit=100, long_limit=1000),
+        NOW,
+    )
+    assert quota.get_remaining(NOW) == 5
+    assert quota.get_usage(NOW) == (95, 200)
+
+    # Strava saying there's more left than we think doesn't give any tokens back.
+    quota.update_from_rates(
+        RequestRate(short_usage=0, long_usage=0, short_limit=100, long_limit=1000),
+        NOW,
+    )
+    assert quota.get_remaining(NOW) == 5
+
+
+def test_session_takes_a_token_before_each_request(monkeypatch) -> None:
+    quota = SharedStravaQuota(InMemoryTokenBucketStore(), short_limit=1)
+    sleeps: list[float] = []
+    session = SharedQuotaSession(
+        quota, max_wait=dt.timedelta(seconds=5), sleep=sleeps.append
+    )
+    sent: list[str] = []
+    monkeypatch.setattr(
+        requests.Session,
+        "request",
+        lambda self, method, url, **kwargs: sent.append(url),
+    )
+
+    session.get("https://www.strava.com/api/v3/athlete")
+    assert sent == ["https://www.strava.com/api/v3/athlete"]
+    assert sleeps == []
+
+    # The only token is gone, and the next one doesn't come back until the end of
+    # the 15 minute window, so the request is never sent.
+    with pytest.raises(RateLimitExceeded):
+        session.get("https://www.strava.com/api/v3/athlete")
+    assert len(sent) == 1
+
+
+def test_rate_limit_rule_follows_strava_headers() -> None:
+    quota = SharedStravaQuota(InMemoryTokenBucketStore())
+    rule = SharedQuotaRateLimitRule(quota)
+
+    rule({}, "GET")
+    assert quota.get_usage(dt.datetime.now(dt.timezone.utc)) == (0, 0)
+
+    rule(
+        {
+            "X-ReadRateLimit-Limit": "100,1000",
+            "X-ReadRateLimit-Usage": "40,400",
+        },
+        "GET",
+    )
+    assert quota.get_usage(dt.datetime.now(dt.timezone.utc)) == (40, 400)
+
+
+def test_refusals_dont_use_up_the_daily_quota(store) -> None:
+    quota = SharedStravaQuota(store, short_limit=2)
+    assert quota.try_acquire(NOW)
+    assert quota.try_acquire(NOW)
+
+    # The 15 minute limit is used up, and a waiting request keeps asking.
+    for _ in range(5):
+        assert not quota.try_acquire(NOW)
+
+    assert quota.get_usage(NOW) == (2, 2)
+
+
+def test_reserving_uses_up_the_shared_quota(store) -> None:
+    quota = SharedStravaQuota(store, short_limit=10, long_limit=100)
+    assert quota.try_reserve(6, NOW) == 6
+    assert quota.get_remaining(NOW) == 4
+    assert quota.try_reserve(6, NOW) is None
+    # Nothing is taken from the daily limit when the reservation doesn't fit.
+    assert quota.get_usage(NOW) == (6, 6)
+
+    quota.release(6, NOW)
+    assert quota.get_remaining(NOW) == 10
+
+
+def test_jobs_bigger_than_a_window_can_start_in_a_fresh_window() -> None:
+    quota = SharedStravaQuota(InMemoryTokenBucketStore(), short_limit=10)
+    assert quota.try_reserve(25, NOW) == 10
+    assert quota.try_reserve(1, NOW) is None
+
+
+def test_session_uses_reserved_requests_first(monkeypatch) -> None:
+    quota = SharedStravaQuota(InMemoryTokenBucketStore(), short_limit=10)
+    session = SharedQuotaSession(quota, reserved_requests=2)
+    monkeypatch.setattr(requests.Session, "request", lambda *args, **kwargs: None)
+
+    for _ in range(3):
+        session.get("https://www.strava.com/api/v3/athlete")
+    assert quota.get_remaining(dt.datetime.now(dt.timezone.utc)) == 9
@@ -0,0 +1,78 @@
+import datetime as dt
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from fastapi.exceptions import HTTPException
+from moto import mock_aws
+
+from backend.utils.sessions import (
+    SESSION_DURATION,
+    Session,
+    create_session_token,
+    get_session,
+)
+
+USER_TABLE_NAME = "user-table"
+SECRET = "some-secret"
+NOW = dt.datetime(2024, 1, 1, 12, 0, tzinfo=dt.timezone.utc)
+
+
+def test_signed_sessions_are_checked_without_dynamodb() -> None:
+    user_table = MagicMock()
+    session_token = create_session_token("abc-_123", 42, SECRET, NOW)
+
+    assert get_session(user_table, session_token, SECRET, NOW) == Session(
+        session_id="abc-_123", athlete_id=42
+    )
+    assert not user_table.method_calls
+
+
+@pytest.mark.parametrize(
+    "session_token, secret, now",
+    [
+        # Someone else's athlete id.
+        (
+            create_session_token("abc", 42, SECRET, NOW).replace(".42.", ".43."),
+            SECRET,
+            NOW,
+        ),
+        # Signed with a different secret.
+        (create_session_token("abc", 42, "other-secret", NOW), SECRET, NOW),
+        # Expired.
+        (create_session_token("abc", 42, SECRET, NOW), SECRET, NOW + SESSION_DURATION),
+        # Garbage.
+        ("v1.what", SECRET, NOW),
+    ],
+)
+def test_bad_signed_sessions_are_unauthorized(
+    session_token: str, secret: str, now: dt.datetime
+) -> None:
+    with pytest.raises(HTTPException) as e:
+        get_session(MagicMock(), session_token, secret, now)
+    assert e.value.status_code == 401
+
+
+@mock_aws
+def test_unsigned_sessions_are_looked_up() -> None:
+    client = boto3.client("dynamodb", region_name="ap-southeast-2")
+    client.create_table(
+        TableName=USER_TABLE_NAME,
+        KeySchema=[{"AttributeName": "session_token", "KeyType": "HASH"}],
+        AttributeDefinitions=[
+            {"AttributeName": "session_token", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    client.put_item(
+        TableName=USER_TABLE_NAME,
+        Item={"session_token": {"S": "abc"}, "athlete_id": {"N": "42"}},
+    )
+    user_table = boto3.resource("dynamodb").Table(USER_TABLE_NAME)
+
+    # Old cookies from before signing was turned on.
+    assert get_session(user_table, "abc", SECRET, NOW) == Session("abc", 42)
+
+    # And signed cookies from before it was turned off again.
+    session_token = create_session_token("abc", 42, SECRET, NOW)
+    assert get_session(user_table, session_token, None, NOW) == Session("abc", 42)
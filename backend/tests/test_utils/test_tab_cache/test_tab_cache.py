@@ -0,0 +1,38 @@
+import datetime as dt
+
+from backend.gui.tabs import general_trivia_tab, streaks_tab
+from backend.utils.tab_cache import TabPayloadCache
+
+
+def test_payloads_are_kept_per_data_version() -> None:
+    cache = TabPayloadCache()
+    cache.put(1, "trivia", 0, {"tab_data": "old"})
+
+    assert cache.get(1, "trivia", 0) == {"tab_data": "old"}
+    # Once their data changes, the old payload is never handed out.
+    assert cache.get(1, "trivia", 1) is None
+    assert cache.get(1, "heatmap", 0) is None
+    assert cache.get(2, "trivia", 0) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_least_recently_used_payloads_are_dropped() -> None:
+    cache = TabPayloadCache(max_entries=2)
+    cache.put(1, "a", 0, "a")
+    cache.put(1, "b", 0, "b")
+    cache.get(1, "a", 0)
+    cache.put(1, "c", 0, "c")
+
+    assert cache.get(1, "a", 0) == "a"
+    assert cache.get(1, "b", 0) is None
+    assert cache.get(1, "c", 0) == "c"
+
+
+def test_date_dependent_tabs_are_cached_per_quarter_hour() -> None:
+    def at(hour: int, minute: int) -> dt.datetime:
+        return dt.datetime(2023, 1, 1, hour, minute, tzinfo=dt.timezone.utc)
+
+    assert general_trivia_tab.get_cache_key(at(13, 59)) == "general_trivia"
+    assert streaks_tab.get_cache_key(at(14, 0)) == streaks_tab.get_cache_key(at(14, 14))
+    # 14:00 UTC is midnight somewhere, like Brisbane.
+    assert streaks_tab.get_cache_key(at(13, 59)) != streaks_tab.get_cache_key(at(14, 0))
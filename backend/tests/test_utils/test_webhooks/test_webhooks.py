@@ -0,0 +1,285 @@
+import datetime as dt
+import json
+from typing import Any
+
+import boto3
+import pytest
+from fastapi.testclient import TestClient
+from moto import mock_aws
+from stravalib.exc import ObjectNotFound
+from stravalib.model import SummaryActivity
+
+from backend.utils.dynamodb import (
+    WEBHOOK_FLUSH_TIMEOUT,
+    add_pending_webhook_event_to_dynamo,
+    get_download_status_item_from_dynamo,
+    release_webhook_flush_in_dynamo,
+    save_download_status_to_dynamo,
+)
+from backend.utils.s3 import (
+    BUCKET_NAME,
+    get_summary_activities_from_s3,
+    save_summary_activities_to_s3,
+)
+from backend.utils.webhooks import (
+    StravaWebhookEvent,
+    apply_pending_webhook_events,
+    get_latest_event_per_activity,
+)
+from tests.fixtures import REAL_DATA
+
+DOWNLOAD_STATUS_NAME = "download-status-table"
+ATHLETE_ID = 1
+NOW = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+
+
+class FakeProtocol:
+    def __init__(self, raw_activities: dict[int, dict[str, Any]]) -> None:
+        self.raw_activities = raw_activities
+        self.requested_ids: list[int] = []
+
+    def get(self, url: str, id: int) -> Any:
+        self.requested_ids.append(id)
+        if id not in self.raw_activities:
+            raise ObjectNotFound("Not found.")
+        return self.raw_activities[id]
+
+
+class FakeClient:
+    """
+    Just enough of a stravalib client to fetch single activities.
+    """
+
+    def __init__(self, raw_activities: dict[int, dict[str, Any]]) -> None:
+        self.protocol = FakeProtocol(raw_activities)
+
+
+def make_event(
+    activity_id: int, aspect_type: str, event_time: int
+) -> StravaWebhookEvent:
+    return StravaWebhookEvent(
+        object_type="activity",
+        object_id=activity_id,
+        aspect_type=aspect_type,
+        owner_id=ATHLETE_ID,
+        subscription_id=1,
+        event_time=event_time,
+    )
+
+
+@pytest.fixture
+def raw_activities() -> list[dict[str, Any]]:
+    with open(REAL_DATA, "r") as f:
+        data = json.load(f)
+    return [activity | {"id": i} for i, activity in enumerate(data[:5])]
+
+
+@pytest.fixture
+def aws():
+    with mock_aws():
+        dynamodb_client = boto3.client("dynamodb", region_name="ap-southeast-2")
+        dynamodb_client.create_table(
+            TableName=DOWNLOAD_STATUS_NAME,
+            KeySchema=[{"AttributeName": "athlete_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[
+                {"AttributeName": "athlete_id", "AttributeType": "N"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        s3_client = boto3.client("s3", region_name="ap-southeast-2")
+        s3_client.create_bucket(
+            Bucket=BUCKET_NAME,
+            CreateBucketConfiguration={"LocationConstraint": "ap-southeast-2"},
+        )
+        download_status_table = boto3.resource("dynamodb").Table(DOWNLOAD_STATUS_NAME)
+        yield s3_client, download_status_table
+
+
+def test_get_latest_event_per_activity() -> None:
+    events = [
+        make_event(1, "update", 3),
+        make_event(1, "create", 1),
+        make_event(2, "create", 2),
+        make_event(2, "delete", 4),
+    ]
+    latest_events = get_latest_event_per_activity(events)
+    assert latest_events[1].aspect_type == "update"
+    assert latest_events[2].aspect_type == "delete"
+
+
+def test_events_are_only_trusted_from_our_subscription() -> None:
+    event = make_event(1, "create", 1)
+    assert event.is_from_subscription("1")
+    assert not event.is_from_subscription("2")
+    assert not event.is_from_subscription(None)
+
+
+def test_webhook_rejects_events_from_other_subscriptions(monkeypatch) -> None:
+    from backend import api
+
+    deleted_athletes: list[int] = []
+    monkeypatch.setattr(
+        api.evm.variables, "strava_webhook_subscription_id", "2", raising=False
+    )
+    monkeypatch.setattr(
+        api,
+        "delete_athlete_data",
+        lambda s3_client, athlete_id: deleted_athletes.append(athlete_id),
+    )
+
+    # A made up deauthorization, which would delete the athlete's data.
+    event = make_event(1, "update", 1).model_copy(
+        update={"object_type": "athlete", "updates": {"authorized": "false"}}
+    )
+    response = TestClient(api.app).post("/api/strava_webhook", json=event.model_dump())
+
+    assert response.status_code == 403
+    assert deleted_athletes == []
+
+
+def test_events_for_athlete_without_data_are_ignored(aws) -> None:
+    _, download_status_table = aws
+    assert not add_pending_webhook_event_to_dynamo(
+        download_status_table,
+        ATHLETE_ID,
+        make_event(1, "create", 1).model_dump(),
+        NOW,
+    )
+    assert get_download_status_item_from_dynamo(download_status_table, 1) is None
+
+
+def test_apply_pending_webhook_events(aws, raw_activities) -> None:
+    s3_client, download_status_table = aws
+
+    # The athlete has already downloaded their first three activities.
+    save_summary_activities_to_s3(
+        s3_client,
+        ATHLETE_ID,
+        [SummaryActivity.model_validate(raw) for raw in raw_activities[:3]],
+    )
+    save_download_status_to_dynamo(
+        download_status_table,
+        ATHLETE_ID,
+        dt.datetime.now(dt.timezone.utc),
+        "All 3 activities saved to s3.",
+        error=False,
+        complete=True,
+    )
+
+    events = [
+        # A new activity, which is then renamed.
+        make_event(3, "create", 1),
+        make_event(3, "update", 2),
+        # An old activity is updated, and another is deleted.
+        make_event(0, "update", 3),
+        make_event(1, "delete", 4),
+        # Created and deleted before we got around to it.
+        make_event(4, "create", 5),
+    ]
+    # Only the first event needs to start a job to apply them.
+    scheduled = [
+        add_pending_webhook_event_to_dynamo(
+            download_status_table, ATHLETE_ID, event.model_dump(), NOW
+        )
+        for event in events
+    ]
+    assert scheduled == [True, False, False, False, False]
+
+    renamed_activity = raw_activities[3] | {"name": "Renamed"}
+    client = FakeClient({0: raw_activities[0], 3: renamed_activity})
+    assert apply_pending_webhook_events(
+        client, s3_client, download_status_table, ATHLETE_ID
+    )
+
+    # Each activity is only fetched once, no matter how many events it had.
+    assert sorted(client.protocol.requested_ids) == [0, 3, 4]
+
+    activities = get_summary_activities_from_s3(s3_client, ATHLETE_ID)
+    assert sorted(activity.id for activity in activities) == [0, 2, 3]
+    assert next(a for a in activities if a.id == 3).name == "Renamed"
+
+    item = get_download_status_item_from_dynamo(download_status_table, ATHLETE_ID)
+    assert item.data_version == 1
+
+    # Once applied, the next event needs a new job.
+    assert add_pending_webhook_event_to_dynamo(
+        download_status_table, ATHLETE_ID, make_event(2, "delete", 6).model_dump(), NOW
+    )
+
+
+def save_complete_download_status(download_status_table) -> None:
+    save_download_status_to_dynamo(
+        download_status_table,
+        ATHLETE_ID,
+        NOW,
+        "All done.",
+        error=False,
+        complete=True,
+    )
+
+
+def test_lost_webhook_jobs_are_sent_again(aws) -> None:
+    _, download_status_table = aws
+    save_complete_download_status(download_status_table)
+
+    def add_event(now: dt.datetime) -> bool:
+        return add_pending_webhook_event_to_dynamo(
+            download_status_table,
+            ATHLETE_ID,
+            make_event(1, "create", 1).model_dump(),
+            now,
+        )
+
+    assert add_event(NOW)
+    # The job should be on its way.
+    assert not add_event(NOW + WEBHOOK_FLUSH_TIMEOUT)
+    # It never took the events, so it must have been lost.
+    assert add_event(NOW + WEBHOOK_FLUSH_TIMEOUT + dt.timedelta(seconds=1))
+
+
+def test_webhook_job_claim_is_released_if_it_cant_be_sent(aws, monkeypatch) -> None:
+    from backend import api
+
+    _, download_status_table = aws
+    save_complete_download_status(download_status_table)
+
+    class BrokenDispatcher:
+        def dispatch(self, job) -> None:
+            raise Exception("Couldn't invoke the worker.")
+
+    monkeypatch.setattr(
+        api.evm.variables, "strava_webhook_subscription_id", "1", raising=False
+    )
+    monkeypatch.setattr(api, "download_status_table", download_status_table)
+    monkeypatch.setattr(api, "job_dispatcher", BrokenDispatcher())
+
+    event = make_event(1, "create", 1)
+    response = TestClient(api.app, raise_server_exceptions=False).post(
+        "/api/strava_webhook", json=event.model_dump()
+    )
+    assert response.status_code == 500
+
+    # When Strava sends the event again, it can start the job itself.
+    assert add_pending_webhook_event_to_dynamo(
+        download_status_table, ATHLETE_ID, event.model_dump(), dt.datetime.now(dt.UTC)
+    )
+
+
+def test_only_the_latest_claim_is_released(aws) -> None:
+    _, download_status_table = aws
+    save_complete_download_status(download_status_table)
+    later = NOW + WEBHOOK_FLUSH_TIMEOUT * 2
+
+    def add_event(now: dt.datetime) -> bool:
+        return add_pending_webhook_event_to_dynamo(
+            download_status_table,
+            ATHLETE_ID,
+            make_event(1, "create", 1).model_dump(),
+            now,
+        )
+
+    assert add_event(NOW)
+    assert add_event(later)
+    # The first claim was taken over, so releasing it does nothing.
+    release_webhook_flush_in_dynamo(download_status_table, ATHLETE_ID, NOW)
+    assert not add_event(later)
@@ -26,6 +26,8 @@ export async function generateStaticParams() {
     { key: 'min_and_max_distance_activities' },
     { key: 'min_and_max_elevation_activities' },
     { key: 'general_trivia' },
+    { key: 'streaks' },
+    { key: 'percentiles' },
     { key: 'flagged_activities' },
     { key: 'top_100_longest_runs' },
     { key: 'top_100_longest_rides' },
@@ -9,6 +9,8 @@ import { wrappedFetch } from "../lib/fetch";
 interface DataStatus {
   message: string;
   downloaded: boolean;
+  // Their data is being downloaded again, but they can use their old data meanwhile.
+  refreshing?: boolean;
 }
 
 interface HomeContextType {
@@ -45,6 +47,24 @@ export default function HomeLayout({ children }: { children: React.ReactNode })
     }
 
     let intervalId: NodeJS.Timeout | null = null;
+    let eventSource: EventSource | null = null;
+
+    const onDownloaded = (data: DataStatus) => {
+      setDisabledSidebarSteps([]);
+      if (data.refreshing) {
+        // Keep checking until the refresh is done, so the status stays up to date.
+        startPolling();
+        return;
+      }
+      if (intervalId) {
+        clearInterval(intervalId); // Stop polling
+        intervalId = null;
+      }
+      if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+      }
+    };
 
     const pollDataStatus = () => {
       wrappedFetch(
@@ -54,11 +74,7 @@ export default function HomeLayout({ children }: { children: React.ReactNode })
           setDataStatus(data);
 
           if (data.downloaded) {
-            setDisabledSidebarSteps([]);
-            if (intervalId) {
-              clearInterval(intervalId); // Stop polling
-              intervalId = null;
-            }
+            onDownloaded(data);
           }
         },
         (error: any) => {
@@ -68,13 +84,79 @@ export default function HomeLayout({ children }: { children: React.ReactNode })
       );
     };
 
-    intervalId = setInterval(pollDataStatus, 3000); // Poll every 3 seconds
-    pollDataStatus(); // Initial fetch
+    const startPolling = () => {
+      if (!intervalId) {
+        intervalId = setInterval(pollDataStatus, 3000); // Poll every 3 seconds
+      }
+    };
+
+    // Rather than polling, listen to the download progress stream. The browser
+    // reconnects by itself when the server closes the stream early. If the stream
+    // can't be opened at all, fall back to polling. The stream is only served locally,
+    // since API Gateway can't stream responses, so prod always polls.
+    const canStream = process.env.NEXT_PUBLIC_STREAM_DATA_STATUS !== "false";
+    const streamDataStatus = () => {
+      eventSource = new EventSource(`${apiUrl}/api/data_status_stream`, {
+        withCredentials: true,
+      });
+
+      const onMessage = (event: MessageEvent) => {
+        const data: DataStatus = JSON.parse(event.data);
+        setDataStatus(data);
+        if (data.downloaded) {
+          onDownloaded(data);
+        }
+      };
+
+      eventSource.onmessage = onMessage;
+      eventSource.addEventListener("done", (event) => {
+        onMessage(event as MessageEvent);
+        // The download finished, but possibly with an error. Ask data_status again
+        // so it can kick off a new download if it needs to.
+        if (eventSource) {
+          eventSource.close();
+          eventSource = null;
+          pollDataStatus();
+          startPolling();
+        }
+      });
+      eventSource.onerror = () => {
+        if (eventSource && eventSource.readyState === EventSource.CLOSED) {
+          console.error("Data status stream failed, falling back to polling.");
+          eventSource = null;
+          startPolling();
+        }
+      };
+    };
+
+    // The initial fetch starts a download if one is needed, and only then do we
+    // listen for progress.
+    wrappedFetch(
+      `${apiUrl}/api/data_status`,
+      (data: DataStatus) => {
+        setDataStatus(data);
+        if (data.downloaded) {
+          onDownloaded(data);
+        } else if (canStream) {
+          streamDataStatus();
+        } else {
+          startPolling();
+        }
+      },
+      (error: any) => {
+        console.error("Error fetching data status:", error);
+        startPolling();
+      },
+      router
+    );
 
     return () => {
       if (intervalId) {
         clearInterval(intervalId); // Cleanup interval on unmount
       }
+      if (eventSource) {
+        eventSource.close();
+      }
     };
   }, [router]);
 
@@ -62,7 +62,7 @@ function DownloadDataCard() {
           </div>
           <div className="h-2" />
           <div className="text-8xl">
-            {dataStatus.downloaded ? "✅" : <Spinner />}
+            {dataStatus.downloaded ? (dataStatus.refreshing ? "🔄" : "✅") : <Spinner />}
           </div>
           <div className="h-2" />
         </div>